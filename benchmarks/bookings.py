@@ -0,0 +1,70 @@
+"""
+Measures the booking engine (bookings.BookingEngine) on a 10k-spot lot holding a week of bookings
+(a few per spot and per day) : conflict checks, "find a spot free from 9:00 to 17:00" queries
+and the timer heap driving the holds and no-show expiries, one simulated minute at a time.
+
+Usage : python benchmarks/bookings.py [spots] [bookings_per_spot]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bookings import HELD, HOLD, Booking, BookingEngine
+from models import ParkingSpot
+
+DAY = 24 * 3600
+
+def bookings(spots, per_spot, seed=0):
+    """Non-overlapping bookings of 1 to 9 hours, spread over a week"""
+    rng = random.Random(seed)
+    result = []
+    for spot in spots:
+        t = rng.randrange(0, DAY)
+        for _ in range(per_spot):
+            duration = rng.randrange(3600, 9 * 3600)
+            result.append(Booking(len(result) + 1, spot, f"PRE-{rng.randrange(10 ** 5):05}", t, t + duration))
+            t += duration + rng.randrange(0, 2 * DAY)
+    return result
+
+def timed(label, count, function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1000:>8.1f} ms   {count / elapsed:>12,.0f} /s")
+    return result
+
+def main():
+    spot_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    per_spot = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    spots = [ParkingSpot(id, id) for id in range(1, spot_count + 1)]
+    engine = BookingEngine()
+    booked = bookings(spots, per_spot)
+    print(f"{spot_count} spots, {len(booked)} bookings")
+    timed("load", len(booked), lambda: engine.load(booked))
+
+    rng = random.Random(1)
+    windows = [(spot.id, t, t + rng.randrange(600, 4 * 3600)) for spot in spots for t in [rng.randrange(0, 7 * DAY)]]
+    timed("conflict checks", len(windows), lambda: [engine.conflict(*window) for window in windows])
+    days = range(1, 7)
+    found = timed("find 9:00-17:00 spot", len(days), lambda: [engine.find_free_spot(spots, day * DAY + 9 * 3600, day * DAY + 17 * 3600) for day in days])
+    print(f"{'':<24} first free spots : {[spot.id if spot else None for spot in found]}")
+
+    def run_timers():
+        events = 0
+        for now in range(0, 10 * DAY, 60):
+            for event, booking in engine.due(now):
+                events += 1
+                if event == HOLD:
+                    booking.status = HELD
+                else:
+                    engine.close(booking, "expired")
+        return events
+    minutes = 10 * DAY // 60
+    events = timed("timers (per minute)", minutes, run_timers)
+    print(f"{'':<24} {events} holds and expiries, {len(engine)} bookings left")
+
+if __name__ == "__main__":
+    main()
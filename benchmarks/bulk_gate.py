@@ -0,0 +1,59 @@
+"""
+Measures how many buffered gate events per second ParkingController can replay, one call per event
+(new_entry / new_exit, one transaction each) and in batches (new_entries_bulk / new_exits_bulk,
+one executemany transaction per batch).
+
+Usage : python benchmarks/bulk_gate.py [number_of_cars] [batch_size]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import DatabaseController, ParkingController
+from controllers.connection_manager import ConnectionManager
+
+def setup(directory, name, cars):
+    db = DatabaseController(os.path.join(directory, f"{name}.db"))
+    db.init_database()
+    with db.connect() as conn:
+        conn.executemany("INSERT INTO ParkingSpots (floor_number, row_number, spot_number) VALUES (1, 1, ?)",
+                         [(n,) for n in range(1, cars + 1)])
+    return ParkingController(db=db)
+
+def per_event(controller, events):
+    start = time.perf_counter()
+    for event in events:
+        controller.new_entry(*event)
+    entries = time.perf_counter() - start
+    start = time.perf_counter()
+    for event in events:
+        controller.new_exit(*event)
+    return entries, time.perf_counter() - start
+
+def batched(batch_size):
+    def run(controller, events):
+        start = time.perf_counter()
+        for i in range(0, len(events), batch_size):
+            controller.new_entries_bulk(events[i:i + batch_size])
+        entries = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, len(events), batch_size):
+            controller.new_exits_bulk(events[i:i + batch_size])
+        return entries, time.perf_counter() - start
+    return run
+
+def main():
+    cars = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    events = [(1, 1, n, f"CAR-{n}") for n in range(1, cars + 1)]
+    with tempfile.TemporaryDirectory() as directory:
+        for label, run in (("per event", per_event), (f"bulk ({batch_size} per batch)", batched(batch_size))):
+            entries, exits = run(setup(directory, label.split()[0], cars), events)
+            print(f"{label:<24} {cars / entries:>10.0f} entries/s {cars / exits:>10.0f} exits/s")
+        ConnectionManager.close_all_managers()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Load-test client for the gate server (src/gate_server.py).
+Opens many concurrent gate connections, each parking cars on any free spot (entry_auto) and then
+letting them out by plate (exit_plate), and reports the throughput and the latency of the requests.
+Without --connect, a server is started in this process on a temporary database.
+
+Usage : python benchmarks/gate_load.py [--gates N] [--cars N] [--spots N] [--connect HOST:PORT]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import DatabaseController
+from controllers.connection_manager import ConnectionManager
+from gate_server import GateServer
+
+async def gate(host, port, gate_number, cars, latencies):
+    """One gate : cars entries then cars exits, one request at a time like a real barrier"""
+    reader, writer = await asyncio.open_connection(host, port)
+    errors = 0
+    plates = [f"G{gate_number}-{n}" for n in range(cars)]
+    requests = [{"action": "entry_auto", "plate": plate} for plate in plates] + [{"action": "exit_plate", "plate": plate} for plate in plates]
+    for id, request in enumerate(requests):
+        request["id"] = id
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        errors += not response["ok"]
+    writer.close()
+    await writer.wait_closed()
+    return errors
+
+async def run(host, port, gates, cars):
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(gate(host, port, g, cars, latencies) for g in range(gates)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{gates} gates, {len(latencies)} requests in {elapsed:.2f} s : {len(latencies) / elapsed:.0f} requests/s, {sum(errors)} errors")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.2f} ms   p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+async def run_local(gates, cars, spots):
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseController(os.path.join(directory, "gate_load.db"))
+        db.init_database()
+        with db.connect() as conn:
+            conn.executemany("INSERT INTO ParkingSpots (floor_number, row_number, spot_number) VALUES (?, ?, ?)",
+                             [(n // 1000, n // 50 % 20 + 1, n % 50 + 1) for n in range(spots)])
+        server = GateServer(db, port=0)
+        host, port = await server.start()
+        try:
+            await run(host, port, gates, cars)
+        finally:
+            await server.close()
+            ConnectionManager.close_all_managers()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gates", type=int, default=50)
+    parser.add_argument("--cars", type=int, default=100, help="Cars per gate")
+    parser.add_argument("--spots", type=int, default=10000, help="Spots of the temporary lot")
+    parser.add_argument("--connect", default=None, help="HOST:PORT of a running park-ease-gate")
+    args = parser.parse_args()
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        asyncio.run(run(host, int(port), args.gates, args.cars))
+    else:
+        asyncio.run(run_local(args.gates, args.cars, args.spots))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures how many entries/exits per second ParkingController can register, with the pooled
+connections of DatabaseController ("after") and with one fresh sqlite3 connection per query,
+as every DatabaseController method used to do ("before").
+
+Usage : python benchmarks/gate_throughput.py [number_of_cars]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import DatabaseController, ParkingController
+from controllers.connection_manager import ConnectionManager
+
+class UnpooledDatabaseController(DatabaseController):
+    """Opens (and closes) a new default connection for every call, like the original implementation"""
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    transaction = connect
+
+def run(db_class, directory, cars):
+    db = db_class(os.path.join(directory, f"{db_class.__name__}.db"))
+    db.init_database()
+    with db.transaction():
+        for spot_number in range(1, cars + 1):
+            db.create_parking_spot(1, 1, spot_number)
+    controller = ParkingController(db=db)
+
+    start = time.perf_counter()
+    for spot_number in range(1, cars + 1):
+        controller.new_entry(1, 1, spot_number, f"CAR-{spot_number}")
+    entries = cars / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for spot_number in range(1, cars + 1):
+        controller.new_exit(1, 1, spot_number, f"CAR-{spot_number}")
+    exits = cars / (time.perf_counter() - start)
+    return entries, exits
+
+def main():
+    cars = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as directory:
+        for label, db_class in (("before (connect per query)", UnpooledDatabaseController),
+                                ("after (pooled connections)", DatabaseController)):
+            entries, exits = run(db_class, directory, cars)
+            print(f"{label:<28} {entries:>10.0f} entries/s {exits:>10.0f} exits/s")
+        ConnectionManager.close_all_managers()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Measures the occupancy engine (occupancy.occupancy_statistics) on a month of synthetic sessions
+for a 10k-spot lot (about 3 sessions per spot and per day), with the pure Python sweep and,
+if NumPy is installed, the vectorized one.
+
+Usage : python benchmarks/occupancy.py [spots] [days]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import occupancy
+from occupancy import occupancy_statistics
+
+def sessions(spots, days, floors=5, seed=0):
+    rng = random.Random(seed)
+    end = days * 24 * 3600
+    usages = []
+    for spot in range(spots):
+        floor_number = spot % floors
+        t = rng.randrange(0, 8 * 3600)
+        while t < end:
+            duration = rng.randrange(15 * 60, 6 * 3600)
+            usages.append((floor_number, t, t + duration if t + duration < end else None))
+            t += duration + rng.randrange(0, 10 * 3600)
+    return usages, end
+
+def main():
+    spots = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    usages, end = sessions(spots, days)
+    print(f"{spots} spots, {days} days, {len(usages)} sessions")
+    paths = [("python", False)] + ([("numpy", True)] if occupancy.numpy is not None else [])
+    for label, use_numpy in paths:
+        start = time.perf_counter()
+        stats = occupancy_statistics(usages, 0, end, 3600, use_numpy=use_numpy)
+        print(f"{label:<7} {(time.perf_counter() - start) * 1000:>8.0f} ms   peak {stats['peak']} cars at {stats['peak_time']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures the report exports on a year of synthetic traffic (see suite.py) : rows per second and peak
+resident memory of a usage and a payment export, to CSV and to the columnar format.
+Each export runs in its own process so its peak RSS isn't hidden by the generation of the history.
+
+Usage : python benchmarks/reports.py [--floors N] [--rows N] [--spots N] [--days N] [--chunk-size N] [--seed N]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import AnalyticsController, DatabaseController
+from controllers.connection_manager import ConnectionManager
+from suite import Traffic, populate
+
+def peak_rss() -> float:
+    """Peak resident memory of this process in MB. ru_maxrss survives exec on Linux, VmHWM doesn't"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KB on Linux
+
+def export(db_path, kind, format, output, chunk_size):
+    """Runs one export in the current process, prints its statistics as JSON"""
+    analytics = AnalyticsController(None, db=DatabaseController(db_path))
+    generate = analytics.generate_usage_report if kind == "usages" else analytics.generate_payment_report
+    baseline = peak_rss()
+    start = time.perf_counter()
+    message = generate("1970-01-01", "2100-01-01", output, format, chunk_size)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss()
+    rows = int(message.split()[1])
+    print(json.dumps({"rows": rows, "seconds": elapsed, "peak_rss_mb": peak, "baseline_rss_mb": baseline,
+                      "file_mb": os.path.getsize(output) / 2 ** 20}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--floors", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--spots", type=int, default=25, help="Spots per row")
+    parser.add_argument("--days", type=int, default=365, help="Days of history")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--export", nargs=4, metavar=("DB", "KIND", "FORMAT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.export:
+        export(*args.export, args.chunk_size)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseController(os.path.join(directory, "reports.db"))
+        db.init_database()
+        start = time.perf_counter()
+        positions, sessions = populate(db, Traffic(args.seed), args)
+        ConnectionManager.close_all_managers()
+        print(f"{len(positions)} spots, {sessions} sessions generated in {time.perf_counter() - start:.1f} s")
+        print(f"{'export':<20} {'rows':>10} {'rows/s':>12} {'peak RSS':>10} {'(idle)':>8} {'file':>9}")
+        for kind in ("usages", "payments"):
+            for format in ("csv", "columnar"):
+                output = os.path.join(directory, f"{kind}.{format}")
+                result = json.loads(subprocess.run([sys.executable, __file__, "--export", db.path, kind, format, output,
+                                                    "--chunk-size", str(args.chunk_size)],
+                                                   capture_output=True, text=True, check=True).stdout)
+                print(f"{kind + ' ' + format:<20} {result['rows']:>10} {result['rows'] / result['seconds']:>12,.0f} "
+                      f"{result['peak_rss_mb']:>7.1f} MB {result['baseline_rss_mb']:>5.1f} MB {result['file_mb']:>6.1f} MB")
+
+if __name__ == "__main__":
+    main()
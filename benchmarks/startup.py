@@ -0,0 +1,79 @@
+"""
+Measures ParkingController startup (fetch_parking_data) for lots of 1k, 10k and 100k spots,
+with the single-query hydration ("bulk") and with the original per-spot queries ("per spot").
+Half of the spots are occupied and every spot has a few closed usages in its history.
+
+Usage : python benchmarks/startup.py [size ...] [--per-spot-max N]
+        The per-spot hydration is only measured up to N spots (default 10000), it is quadratic
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import DatabaseController, ParkingController
+from controllers.connection_manager import ConnectionManager
+from models import ParkingLot, PremiumCar, StandardCar
+
+HISTORY_PER_SPOT = 3
+
+class PerSpotParkingController(ParkingController):
+    """Original hydration : one usage query and one premium query per spot"""
+    def fetch_parking_data(self):
+        self.parking_lot = ParkingLot(1)
+        for id, spot_number, row_number, floor_number in self.db.fetch_all_parking_spots():
+            self.parking_lot.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
+            spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
+            registration_plate, status = self.check_spot_status(id)
+            if status != "free":
+                car_class = PremiumCar if self.db.is_premium(registration_plate) else StandardCar
+                spot.linked_car = car_class(registration_plate)
+            spot.status = status
+
+def populate(db, size, spots_per_row=50, rows_per_floor=20):
+    """Fills db with size spots, HISTORY_PER_SPOT closed usages per spot and one open usage every other spot"""
+    spots, usages = [], []
+    for i in range(size):
+        id = i + 1
+        floor_number, rest = divmod(i, spots_per_row * rows_per_floor)
+        row_number, spot_number = divmod(rest, spots_per_row)
+        spots.append((id, spot_number + 1, row_number + 1, floor_number))
+        for h in range(HISTORY_PER_SPOT):
+            usages.append((id, f"OLD-{id}-{h}", f"2024-01-0{h + 1} 08:00:00", f"2024-01-0{h + 1} 10:00:00"))
+        if i % 2 == 0:
+            usages.append((id, f"CAR-{id}", "2024-02-01 08:00:00", None))
+    with db.connect() as conn:
+        conn.executemany("INSERT INTO ParkingSpots (id, spot_number, row_number, floor_number) VALUES (?, ?, ?, ?)", spots)
+        conn.executemany("INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time, exit_time) VALUES (?, ?, ?, ?)", usages)
+        conn.executemany("INSERT INTO PremiumCars (registration_plate) VALUES (?)", [(f"CAR-{i}",) for i in range(1, size + 1, 10)])
+
+def measure(controller_class, db):
+    start = time.perf_counter()
+    controller_class(db=db)
+    return time.perf_counter() - start
+
+def main():
+    args = sys.argv[1:]
+    per_spot_max = 10000
+    if "--per-spot-max" in args:
+        index = args.index("--per-spot-max")
+        per_spot_max = int(args[index + 1])
+        del args[index:index + 2]
+    sizes = [int(a) for a in args] or [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            db = DatabaseController(os.path.join(directory, f"lot_{size}.db"))
+            db.init_database()
+            populate(db, size)
+            bulk = measure(ParkingController, db)
+            line = f"{size:>7} spots   bulk {bulk * 1000:>9.1f} ms"
+            if size <= per_spot_max:
+                per_spot = measure(PerSpotParkingController, db)
+                line += f"   per spot {per_spot * 1000:>10.1f} ms"
+            print(line)
+        ConnectionManager.close_all_managers()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Synthetic-traffic benchmark suite. Generates a lot of floors x rows x spots, a history of realistic
+sessions (busier during the day, short and long stays, regular customers, some of them premium),
+then measures :
+    - startup : ParkingController hydration from the database
+    - gate : new_entry / new_exit throughput, replaying an interleaved entry/exit trace
+    - model : ParkingLot.add_spot / remove_spot cost and str(ParkingLot) rendering
+    - analytics : usage history streaming, occupancy statistics and payment summary
+The results are written as JSON, and compared with a previous run when --baseline is given,
+so regressions can be tracked between releases.
+
+Usage : python benchmarks/suite.py [--floors N] [--rows N] [--spots N] [--days N] [--events N]
+                                   [--seed N] [--repeat N] [--output FILE] [--baseline FILE] [--tolerance PCT]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from controllers import AnalyticsController, DatabaseController, ParkingController, PaymentsController
+from controllers.connection_manager import ConnectionManager
+from models import ParkingLot
+
+# Share of the daily arrivals per hour of the day
+HOURLY_PROFILE = [1, 1, 1, 1, 1, 2, 5, 9, 10, 8, 6, 6, 7, 6, 6, 7, 8, 9, 7, 5, 4, 3, 2, 1]
+
+def spot_positions(floors, rows, spots):
+    """Yields every (floor_number, row_number, spot_number) of the lot, floors numbered from 0"""
+    for floor_number in range(floors):
+        for row_number in range(1, rows + 1):
+            for spot_number in range(1, spots + 1):
+                yield floor_number, row_number, spot_number
+
+class Traffic:
+    """Random but reproducible plates, stays and traces"""
+
+    def __init__(self, seed, regulars=2000, premium_share=0.1):
+        self.rng = random.Random(seed)
+        self.regulars = [f"REG-{i:05d}" for i in range(regulars)]
+        self.premium = self.regulars[:int(regulars * premium_share)]
+        self.visitors = 0
+
+    def plate(self):
+        """60 % of the cars are regular customers"""
+        if self.rng.random() < 0.6:
+            return self.rng.choice(self.regulars)
+        self.visitors += 1
+        return f"VIS-{self.visitors:07d}"
+
+    def stay(self):
+        """Duration of a stay in seconds : mostly short shopping stays, some full working days"""
+        if self.rng.random() < 0.2:
+            return int(self.rng.uniform(7, 10) * 3600)
+        return int(min(self.rng.lognormvariate(7.6, 0.7), 6 * 3600))
+
+    def history(self, spot_ids, days, turnover=3):
+        """
+        Returns closed sessions (spot_id, plate, entry, exit) over the last days, about turnover sessions
+        per spot and per day, with arrivals following HOURLY_PROFILE
+        """
+        now = int(time.time())
+        start_day = now - days * 86400
+        sessions = []
+        weights = HOURLY_PROFILE
+        for day in range(days):
+            for spot_id in spot_ids:
+                free_at = 0
+                for hour in sorted(self.rng.choices(range(24), weights, k=turnover)):
+                    entry = start_day + day * 86400 + hour * 3600 + self.rng.randrange(3600)
+                    entry = max(entry, free_at)
+                    exit = entry + self.stay()
+                    if exit >= now:
+                        break
+                    sessions.append((spot_id, self.plate(), entry, exit))
+                    free_at = exit + 60
+        return sessions
+
+    def trace(self, positions, events, occupancy=0.7):
+        """
+        Returns events gate events ("entry" or "exit", floor, row, spot, plate), interleaved so the lot
+        hovers around the given occupancy
+        """
+        free = list(positions)
+        self.rng.shuffle(free)
+        parked = []
+        target = int(len(free) * occupancy)
+        trace = []
+        while len(trace) < events:
+            if parked and (not free or self.rng.random() < len(parked) / (2 * target)):
+                position, plate = parked.pop(self.rng.randrange(len(parked)))
+                free.append(position)
+                trace.append(("exit", *position, plate))
+            else:
+                position = free.pop()
+                plate = self.plate()
+                parked.append((position, plate))
+                trace.append(("entry", *position, plate))
+        return trace
+
+def populate(db, traffic, args):
+    """Creates the spots, the premium subscriptions and the history of the lot"""
+    positions = list(spot_positions(args.floors, args.rows, args.spots))
+    with db.connect() as conn:
+        conn.executemany("INSERT INTO ParkingSpots (floor_number, row_number, spot_number) VALUES (?, ?, ?)", positions)
+        conn.executemany("INSERT INTO PremiumCars (registration_plate) VALUES (?)", [(plate,) for plate in traffic.premium])
+        spot_ids = [id for id, in conn.execute("SELECT id FROM ParkingSpots ORDER BY id")]
+    sessions = traffic.history(spot_ids, args.days)
+    premium = set(traffic.premium)
+    with db.connect() as conn:
+        conn.executemany("""INSERT INTO ParkingUsage (id, spot_id, registration_plate, entry_time, exit_time)
+                            VALUES (?, ?, ?, DATETIME(?, 'unixepoch'), DATETIME(?, 'unixepoch'))""",
+                         ((i, *session) for i, session in enumerate(sessions, 1)))
+        conn.executemany("""INSERT INTO Payments (usage_id, registration_plate, amount, paid_at)
+                            VALUES (?, ?, ?, DATETIME(?, 'unixepoch'))""",
+                         ((i, plate, round((exit - entry) / 3600 * (1.5 if plate in premium else 2.5), 2), exit)
+                          for i, (spot_id, plate, entry, exit) in enumerate(sessions, 1)))
+    return positions, len(sessions)
+
+def best_of(repeat, function):
+    """Runs function repeat times, returns the shortest duration in seconds and the last result"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(args):
+    results = {}
+    def record(name, value, unit, higher_is_better=False):
+        results[name] = {"value": round(value, 3), "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{name:<32} {value:>14.3f} {unit}", file=sys.stderr)
+
+    traffic = Traffic(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseController(os.path.join(directory, "suite.db"))
+        db.init_database()
+        positions, sessions = populate(db, traffic, args)
+        record("history.sessions", sessions, "sessions")
+
+        elapsed, controller = best_of(args.repeat, lambda: ParkingController(db=db))
+        record("startup.hydration", elapsed * 1000, "ms")
+
+        trace = traffic.trace(positions, args.events)
+        start = time.perf_counter()
+        for action, floor_number, row_number, spot_number, plate in trace:
+            if action == "entry":
+                controller.new_entry(floor_number, row_number, spot_number, plate)
+            else:
+                controller.new_exit(floor_number, row_number, spot_number, plate)
+        elapsed = time.perf_counter() - start
+        record("gate.events_per_second", len(trace) / elapsed, "events/s", True)
+
+        lot = ParkingLot(1)
+        spots = [{"id": id, "floor_number": f, "row_number": r, "spot_number": s} for id, (f, r, s) in enumerate(positions, 1)]
+        start = time.perf_counter()
+        for spot in spots:
+            lot.add_spot(spot)
+        record("model.add_spot", (time.perf_counter() - start) / len(spots) * 1e6, "us/spot")
+        elapsed, _ = best_of(args.repeat, lambda: str(controller.parking_lot))
+        record("model.render", elapsed * 1000, "ms")
+        start = time.perf_counter()
+        for floor_number, row_number, spot_number in positions:
+            lot.remove_spot({"floor_number": floor_number, "row_number": row_number, "spot_number": spot_number})
+        record("model.remove_spot", (time.perf_counter() - start) / len(spots) * 1e6, "us/spot")
+
+        analytics = AnalyticsController(None, db=db)
+        payments = PaymentsController(None, db=db)
+        elapsed, count = best_of(args.repeat, lambda: sum(1 for _ in analytics.iter_usages()))
+        record("analytics.stream_usages", count / elapsed, "rows/s", True)
+        elapsed, _ = best_of(args.repeat, lambda: analytics.fetch_usage_statistics())
+        record("analytics.occupancy_30_days", elapsed * 1000, "ms")
+        elapsed, _ = best_of(args.repeat, lambda: payments.generate_payment_summary())
+        record("analytics.payment_summary", elapsed * 1000, "ms")
+        ConnectionManager.close_all_managers()
+    return results
+
+def compare(results, baseline, tolerance):
+    """Prints the change of every metric against baseline, returns the names of the regressions"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None or not previous["value"] or name == "history.sessions":
+            continue
+        change = (result["value"] - previous["value"]) / previous["value"] * 100
+        worse = -change if result["higher_is_better"] else change
+        flag = "REGRESSION" if worse > tolerance else ""
+        print(f"{name:<32} {previous['value']:>12.3f} -> {result['value']:>12.3f} {result['unit']:<9} {change:>+7.1f} % {flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--floors", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=50, help="Spots per row")
+    parser.add_argument("--days", type=int, default=14, help="Days of history")
+    parser.add_argument("--events", type=int, default=5000, help="Gate events replayed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the read benchmarks, the best one is kept")
+    parser.add_argument("--output", default=None, help="JSON file of the results (default : standard output)")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Slowdown in percent reported as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "config": {key: getattr(args, key) for key in ("floors", "rows", "spots", "days", "events", "seed", "repeat")},
+        "results": run(args),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("config") != report["config"]:
+            print("Warning : the baseline was run with another configuration", file=sys.stderr)
+        if compare(report["results"], baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Measures the tariff engine (tariffs.Tariff) on a day of end-of-day billing : sessions of a few minutes
+to a few weeks, priced one by one with price() and in one batch with price_many(), with and without NumPy.
+
+Usage : python benchmarks/tariffs.py [sessions]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import tariffs
+from tariffs import WEEKDAYS, WEEKEND, Tariff
+
+DAY = 24 * 3600
+
+def timed(label, count, function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed * 1000:>8.1f} ms   {count / elapsed:>12,.0f} /s")
+    return result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tariff = Tariff("city", [(WEEKDAYS, 0, 480, 1.0), (WEEKDAYS, 480, 1080, 4.0), (WEEKDAYS, 1080, 1440, 1.0), (WEEKEND, 0, 1440, 2.0)], daily_cap=20)
+    rng = random.Random(0)
+    exits = [1_700_000_000 + rng.randrange(DAY) for _ in range(count)]
+    entries = [exit - int(rng.expovariate(1 / (4 * 3600))) for exit in exits]
+    print(f"{count} sessions")
+    timed("compile", 1, lambda: Tariff("city", tariff.bands, tariff.daily_cap))
+    single = timed("price() one by one", count, lambda: [tariff.price(entry, exit) for entry, exit in zip(entries, exits)])
+    timed("price_many() Python", count, lambda: tariff.price_many(entries, exits, use_numpy=False))
+    if tariffs.numpy is not None:
+        batch = timed("price_many() NumPy", count, lambda: tariff.price_many(entries, exits, use_numpy=True))
+        print(f"{'':<24} same amounts : {batch == single}")
+    print(f"{'':<24} total billed : {sum(single):,.2f}")
+
+if __name__ == "__main__":
+    main()
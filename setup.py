@@ -10,6 +10,7 @@ setup(
     entry_points={
         "console_scripts": [
             "park-ease = main:main",
+            "park-ease-gate = gate_server:main",
         ],
     },
 )
\ No newline at end of file
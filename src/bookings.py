@@ -0,0 +1,247 @@
+"""
+Bookings of parking spots by premium customers, for a time window [start, end) (UNIX timestamps).
+
+The bookings of a spot never overlap, so each spot keeps them sorted by start in a SpotSchedule :
+a window can only conflict with the booking starting right before its end, found by bisection in
+O(log n). Finding a spot free for a window walks the spots in allocation order and stops at the
+first one whose schedule has no conflict, most spots having no booking at all.
+
+A booking goes through these statuses :
+    active    : stored, its window hasn't started yet
+    held      : its window started, the spot is "booked" for the customer (see ParkingSpot.book())
+    fulfilled : the customer parked on the spot
+    cancelled : cancelled by the customer, or no spot could be held for it
+    expired   : the customer didn't arrive within NO_SHOW_GRACE seconds after the start (no-show)
+The transitions that depend on time are driven by a heap of timers (hold at the start, expiry after
+the grace period or at the end, removal from the schedule at the end) : due() pops the expired timers in
+O(log n) each, without scanning the bookings. Timers of a booking closed in the meantime are skipped.
+"""
+import bisect
+import heapq
+import itertools
+
+ACTIVE, HELD, FULFILLED, CANCELLED, EXPIRED = "active", "held", "fulfilled", "cancelled", "expired"
+OPEN_STATUSES = (ACTIVE, HELD)
+
+# Timer events, yielded by BookingEngine.due() (except END, handled by the engine itself)
+HOLD, EXPIRE, END = range(3)
+
+class Booking:
+    """A booking of spot (a ParkingSpot) by registration_plate from start to end"""
+
+    __slots__ = ("id", "spot", "registration_plate", "start", "end", "status")
+
+    def __init__(self, id: int, spot, registration_plate: str, start: float, end: float, status: str = ACTIVE):
+        self.id = id
+        self.spot = spot
+        self.registration_plate = registration_plate
+        self.start = start
+        self.end = end
+        self.status = status
+
+    def __repr__(self):
+        return f"Booking({self.id}, spot {self.spot.id}, {self.registration_plate}, {self.start}-{self.end}, {self.status})"
+
+class SpotSchedule:
+    """The bookings of one spot, sorted by start. They never overlap, so their ends are sorted too"""
+
+    __slots__ = ("_starts", "_bookings")
+
+    def __init__(self):
+        self._starts = []
+        self._bookings = []
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def __iter__(self):
+        return iter(self._bookings)
+
+    def conflict(self, start: float, end: float):
+        """Returns in O(log n) a booking overlapping [start, end), None if there is none"""
+        i = bisect.bisect_left(self._starts, end) # Bookings [0, i) start before end, the last one ends the latest
+        if i and self._bookings[i - 1].end > start:
+            return self._bookings[i - 1]
+        return None
+
+    def add(self, booking: Booking):
+        """
+        PRE : booking doesn't overlap any booking of the schedule
+        RAISES : ValueError otherwise
+        """
+        if self.conflict(booking.start, booking.end) is not None:
+            raise ValueError(f"{booking} overlaps {self.conflict(booking.start, booking.end)}")
+        i = bisect.bisect_left(self._starts, booking.start)
+        self._starts.insert(i, booking.start)
+        self._bookings.insert(i, booking)
+
+    def remove(self, booking: Booking):
+        """Removes booking from the schedule. Does nothing if it isn't in it"""
+        i = bisect.bisect_left(self._starts, booking.start)
+        if i < len(self._bookings) and self._bookings[i] is booking:
+            del self._starts[i]
+            del self._bookings[i]
+
+class BookingEngine:
+    """In-memory index of the open bookings of a parking lot : one SpotSchedule per booked spot, and the timer heap"""
+
+    NO_SHOW_GRACE = 30 * 60 # Seconds after the start before a booking whose customer didn't arrive expires
+    EARLY_ARRIVAL = 15 * 60 # Seconds before the start from which the customer may already park on the spot
+
+    def __init__(self, no_show_grace: float = NO_SHOW_GRACE):
+        self.no_show_grace = no_show_grace
+        self._schedules = {} # ParkingSpot id -> SpotSchedule
+        self._bookings = {} # Booking id -> Booking, until its window ends or it is cancelled/expired
+        self._by_plate = {} # Registration plate -> {Booking id: Booking} of its open bookings
+        self._timers = [] # Heap of (time, sequence, event, booking id)
+        self._sequence = itertools.count() # Keeps the heap stable for timers due at the same time
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def get(self, booking_id: int):
+        """Returns the booking booking_id, None if it is closed or unknown"""
+        return self._bookings.get(booking_id)
+
+    def conflict(self, spot_id: int, start: float, end: float):
+        """Returns a booking of spot_id overlapping [start, end), None if there is none"""
+        schedule = self._schedules.get(spot_id)
+        return schedule.conflict(start, end) if schedule is not None else None
+
+    def find_free_spot(self, spots, start: float, end: float):
+        """
+        PRE : spots is an iterable of ParkingSpot, in the order they should be picked
+        RETURNS : The first spot of spots without any booking overlapping [start, end), None if there is none
+        """
+        schedules = self._schedules
+        for spot in spots:
+            schedule = schedules.get(spot.id)
+            if schedule is None or schedule.conflict(start, end) is None:
+                return spot
+        return None
+
+    def bookings_of(self, registration_plate: str) -> list:
+        """Returns the open bookings of registration_plate, ordered by start"""
+        return sorted(self._by_plate.get(registration_plate, {}).values(), key=lambda booking: booking.start)
+
+    def bookings_of_spot(self, spot_id: int) -> list:
+        """Returns the bookings of spot_id whose window isn't over, ordered by start"""
+        schedule = self._schedules.get(spot_id)
+        return list(schedule) if schedule is not None else []
+
+    def arriving(self, registration_plate: str, now: float):
+        """Returns the open booking of registration_plate the customer may park for at now
+           (from EARLY_ARRIVAL seconds before its start to its end), None if there is none"""
+        for booking in self.bookings_of(registration_plate):
+            if booking.start - self.EARLY_ARRIVAL <= now < booking.end:
+                return booking
+        return None
+
+    def add(self, booking: Booking):
+        """
+        PRE : booking is open (active or held), or fulfilled and its window isn't over
+        POST : booking is indexed, and its timers are set
+        RAISES : ValueError if it overlaps another booking of its spot or if its window is empty
+        """
+        if booking.end <= booking.start:
+            raise ValueError("A booking must end after it starts")
+        self._index(booking)
+        for timer in self._timers_of(booking):
+            heapq.heappush(self._timers, timer)
+
+    def load(self, bookings):
+        """Indexes every booking of bookings (see add()) and builds the timer heap once, in O(n)"""
+        for booking in bookings:
+            if booking.end <= booking.start:
+                raise ValueError("A booking must end after it starts")
+            self._index(booking)
+            self._timers.extend(self._timers_of(booking))
+        heapq.heapify(self._timers)
+
+    def move(self, booking: Booking, spot):
+        """
+        PRE : booking is open, spot has no booking overlapping it
+        POST : booking is booked on spot instead of its previous spot
+        RAISES : ValueError if spot has an overlapping booking, booking is left on its previous spot
+        """
+        conflict = self.conflict(spot.id, booking.start, booking.end)
+        if conflict is not None:
+            raise ValueError(f"{booking} overlaps {conflict}")
+        self._unschedule(booking)
+        booking.spot = spot
+        self._schedules.setdefault(spot.id, SpotSchedule()).add(booking)
+
+    def fulfil(self, booking: Booking):
+        """The customer parked : booking keeps its spot until its end, but has no more timers to act on"""
+        booking.status = FULFILLED
+        self._unindex_plate(booking)
+
+    def close(self, booking: Booking, status: str):
+        """
+        PRE : status is CANCELLED or EXPIRED
+        POST : booking is forgotten, its spot may be booked again for its window
+        """
+        booking.status = status
+        self._forget(booking)
+        if len(self._timers) > 6 * len(self._bookings) + 64:
+            # At most 3 live timers per booking, so mostly timers of closed bookings : rebuilt instead of letting them pile up
+            self._timers = [timer for timer in self._timers if timer[3] in self._bookings]
+            heapq.heapify(self._timers)
+
+    def next_due(self):
+        """Returns the time of the next timer, None if there is none"""
+        return self._timers[0][0] if self._timers else None
+
+    def due(self, now: float):
+        """
+        POST : Pops every timer due at now, in order. The bookings whose window ended are forgotten
+        YIELDS : (HOLD, booking) for each active booking whose window started, and (EXPIRE, booking) for each held
+                 booking whose customer didn't arrive in time. The caller updates the spot, the database and
+                 then the booking (close(), fulfil()) before the next one is popped
+        """
+        timers = self._timers
+        while timers and timers[0][0] <= now:
+            time, sequence, event, booking_id = heapq.heappop(timers)
+            booking = self._bookings.get(booking_id)
+            if booking is None:
+                continue # Closed since the timer was set
+            if event == HOLD and booking.status == ACTIVE:
+                yield HOLD, booking
+            elif event == EXPIRE and booking.status == HELD:
+                yield EXPIRE, booking
+            elif event == END and booking.status not in OPEN_STATUSES:
+                self._forget(booking)
+
+    def _index(self, booking: Booking):
+        schedule = self._schedules.get(booking.spot.id)
+        if schedule is None:
+            schedule = self._schedules[booking.spot.id] = SpotSchedule()
+        schedule.add(booking)
+        self._bookings[booking.id] = booking
+        if booking.status in OPEN_STATUSES:
+            self._by_plate.setdefault(booking.registration_plate, {})[booking.id] = booking
+
+    def _timers_of(self, booking: Booking) -> list:
+        """The timers of an open booking. It expires at the end of its window at the latest, before it is forgotten"""
+        timers = [(booking.start, HOLD)] if booking.status == ACTIVE else []
+        timers += [(min(booking.start + self.no_show_grace, booking.end), EXPIRE), (booking.end, END)]
+        return [(time, next(self._sequence), event, booking.id) for time, event in timers]
+
+    def _unschedule(self, booking: Booking):
+        schedule = self._schedules.get(booking.spot.id)
+        if schedule is not None:
+            schedule.remove(booking)
+            if not schedule:
+                del self._schedules[booking.spot.id]
+
+    def _unindex_plate(self, booking: Booking):
+        bookings = self._by_plate.get(booking.registration_plate)
+        if bookings is not None:
+            bookings.pop(booking.id, None)
+            if not bookings:
+                del self._by_plate[booking.registration_plate]
+
+    def _forget(self, booking: Booking):
+        self._unschedule(booking)
+        self._unindex_plate(booking)
+        self._bookings.pop(booking.id, None)
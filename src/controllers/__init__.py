@@ -1,5 +1,25 @@
-from .parking_controller import ParkingController
-from .payments_controller import PaymentsController
-from .premium_cars_controller import PremiumCarsController
-from .analytics_controller import AnalyticsController
-from .database_controller import DatabaseController
\ No newline at end of file
+"""
+The controllers are imported on first use (PEP 562 module __getattr__), so importing one of them
+doesn't load the others : a headless process only pays for the modules it actually uses
+"""
+_CONTROLLERS = {
+    "ParkingController": "parking_controller",
+    "PaymentsController": "payments_controller",
+    "PremiumCarsController": "premium_cars_controller",
+    "AnalyticsController": "analytics_controller",
+    "DatabaseController": "database_controller",
+    "StatsController": "stats_controller",
+}
+
+__all__ = list(_CONTROLLERS)
+
+def __getattr__(name):
+    if name not in _CONTROLLERS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    controller = getattr(import_module(f".{_CONTROLLERS[name]}", __name__), name)
+    globals()[name] = controller # Next lookups don't go through __getattr__
+    return controller
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
\ No newline at end of file
@@ -1,22 +1,60 @@
+import time
+from datetime import datetime, timezone
 from .database_controller import DatabaseController
+from occupancy import occupancy_statistics
+from reports import PAYMENT_COLUMNS, USAGE_COLUMNS, write_report
 
 class AnalyticsController:
-    def __init__(self, root):
+    def __init__(self, root, db: DatabaseController = None):
         self.root = root
+        self.db = db if db is not None else DatabaseController()
+
+    @staticmethod
+    def format_usage(usage) -> str:
+        usage_id, spot_id, registration_plate, entry_time, exit_time = usage
+        return f"#{usage_id} : Spot {spot_id} - {registration_plate} in @ {entry_time} / out @ {exit_time}"
 
     def fetch_all_usages(self):
-        db = DatabaseController()
-        usages = []
-        for usage_id, spot_id, registration_plate, entry_time, exit_time in db.fetch_all_usages():
-            usages.append(f"#{usage_id} : Spot {spot_id} - {registration_plate} in @ {entry_time} / out @ {exit_time}")
-        return usages
+        return list(self.iter_usages())
+
+    def iter_usages(self):
+        """Yields the complete parking history, formatted, without loading it all in memory"""
+        for usage in self.db.iter_usages():
+            yield self.format_usage(usage)
+
+    def fetch_usages_page(self, after_id: int = 0, page_size: int = 200):
+        """
+        Retrieves one page of the parking history
+        PRE : after_id is 0 for the first page, then the cursor returned with the previous page
+        POST : Returns (usages, cursor) : the formatted usages of the page, and the after_id of the next page (None if this was the last one)
+        """
+        page = self.db.fetch_usages_page(after_id, page_size)
+        cursor = page[-1][0] if len(page) == page_size else None
+        return [self.format_usage(usage) for usage in page], cursor
 
-    def fetch_usage_statistics(self):
+    def fetch_usage_statistics(self, start_date=None, end_date=None, step: int = 3600):
         """
-        Calcule des statistiques sur l'utilisation du parking.
+        Calcule des statistiques sur l'utilisation du parking : occupation moyenne et maximale par heure et par étage,
+        pic d'occupation et durée moyenne de stationnement (voir occupancy.occupancy_statistics()).
+        :param start_date: début de la période (datetime ou "YYYY-MM-DD HH:MM:SS" UTC), 30 jours avant end_date par défaut
+        :param end_date: fin de la période (exclue), maintenant par défaut
+        :param step: durée d'un intervalle des courbes, en secondes
         :return: dict contenant les statistiques d'utilisation
         """
-        pass
+        end = self.to_timestamp(end_date) if end_date is not None else int(time.time())
+        start = self.to_timestamp(start_date) if start_date is not None else end - 30 * 24 * 3600
+        return occupancy_statistics(self.db.iter_sessions_between(start, end), start, end, step)
+
+    @staticmethod
+    def to_timestamp(date) -> int:
+        """Converts a datetime, a date or a "YYYY-MM-DD[ HH:MM:SS]" string (UTC, like the database) to a UNIX timestamp"""
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date)
+        elif not isinstance(date, datetime):
+            date = datetime(date.year, date.month, date.day)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return int(date.timestamp())
 
     def fetch_payment_statistics(self):
         """
@@ -32,20 +70,33 @@ class AnalyticsController:
         """
         pass
 
-    def generate_usage_report(self, start_date, end_date):
+    def generate_usage_report(self, start_date, end_date, path: str, format: str = "csv", chunk_size: int = 10000) -> str:
         """
-        Génère un rapport détaillé sur l'utilisation du parking.
-        :param start_date: date de début de la période
-        :param end_date: date de fin de la période
-        :return: rapport sous forme de chaîne de caractères ou de fichier
+        Génère un rapport détaillé sur l'utilisation du parking : une ligne par stationnement commencé pendant la période
+        (colonnes : voir reports.USAGE_COLUMNS). Les lignes sont lues et écrites par blocs de chunk_size,
+        la mémoire utilisée ne dépend donc pas de la longueur de la période.
+        :param start_date: date de début de la période (datetime, date ou "YYYY-MM-DD[ HH:MM:SS]" UTC)
+        :param end_date: date de fin de la période (exclue)
+        :param path: fichier du rapport
+        :param format: "csv" ou "columnar" (format binaire compact, voir reports.py)
+        :return: message indiquant le nombre de lignes exportées
+        :raises ValueError: si le format n'est pas supporté
         """
-        pass
+        chunks = self.db.iter_usage_chunks(self.to_timestamp(start_date), self.to_timestamp(end_date), chunk_size)
+        rows = write_report(chunks, USAGE_COLUMNS, path, format)
+        return f"[REPORT] {rows} parking usages exported to {path}"
 
-    def generate_payment_report(self, start_date, end_date):
+    def generate_payment_report(self, start_date, end_date, path: str, format: str = "csv", chunk_size: int = 10000) -> str:
         """
-        Génère un rapport détaillé sur les paiements.
-        :param start_date: date de début de la période
-        :param end_date: date de fin de la période
-        :return: rapport sous forme de chaîne de caractères ou de fichier
+        Génère un rapport détaillé sur les paiements : une ligne par paiement effectué pendant la période
+        (colonnes : voir reports.PAYMENT_COLUMNS), écrite par blocs de chunk_size comme generate_usage_report().
+        :param start_date: date de début de la période (datetime, date ou "YYYY-MM-DD[ HH:MM:SS]" UTC)
+        :param end_date: date de fin de la période (exclue)
+        :param path: fichier du rapport
+        :param format: "csv" ou "columnar" (format binaire compact, voir reports.py)
+        :return: message indiquant le nombre de lignes exportées
+        :raises ValueError: si le format n'est pas supporté
         """
-        pass
\ No newline at end of file
+        chunks = self.db.iter_payment_chunks(self.to_timestamp(start_date), self.to_timestamp(end_date), chunk_size)
+        rows = write_report(chunks, PAYMENT_COLUMNS, path, format)
+        return f"[REPORT] {rows} payments exported to {path}"
@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class ConnectionManager:
+    """
+    Keeps the SQLite connections to a database file open for the whole lifetime of the process.
+    Every DatabaseController pointing to the same file shares the same manager (see for_path()).
+    sqlite3 connections can't safely be used by two threads at once, so each thread gets its own
+    connection, which is opened on first use and then reused by every following query
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL", # Readers don't block the writer and commits only append to the log
+        "PRAGMA synchronous = NORMAL", # Safe with WAL, avoids an fsync on every commit
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -8000", # 8 MB page cache per connection
+        "PRAGMA busy_timeout = 5000", # Waits for a concurrent writer instead of failing right away
+    )
+    STATEMENT_CACHE_SIZE = 256 # Prepared statements kept per connection
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+    _trace_callback = None # Installed on every connection, see set_trace_callback()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = {} # Thread -> connection, used to close everything on shutdown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path: str) -> "ConnectionManager":
+        """
+        PRE : path is the path of a SQLite database file
+        POST : Returns the manager shared by every controller using that file (created on first call)
+        """
+        with cls._managers_lock:
+            manager = cls._managers.get(path)
+            if manager is None:
+                manager = cls._managers[path] = cls(path)
+            return manager
+
+    @classmethod
+    def close_all_managers(cls) -> None:
+        """Closes every pooled connection of every manager (used on shutdown and by tests)"""
+        with cls._managers_lock:
+            managers = list(cls._managers.values())
+            cls._managers.clear()
+        for manager in managers:
+            manager.close_all()
+
+    @classmethod
+    def set_trace_callback(cls, callback) -> None:
+        """
+        PRE : callback is None or a function called with the text of every SQL statement run
+        POST : callback is installed on every open connection and on the ones opened later (None removes it)
+        """
+        with cls._managers_lock:
+            cls._trace_callback = callback
+            managers = list(cls._managers.values())
+        for manager in managers:
+            with manager._lock:
+                for conn in manager._connections.values():
+                    conn.set_trace_callback(callback)
+
+    def _open(self) -> sqlite3.Connection:
+        """Opens and tunes a new connection for the current thread"""
+        conn = sqlite3.connect(self.path,
+                               cached_statements=self.STATEMENT_CACHE_SIZE,
+                               check_same_thread=False) # Only its own thread uses it, but close_all() may run elsewhere
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        conn.set_trace_callback(self._trace_callback)
+        with self._lock:
+            # Forgets the connections of threads that are gone
+            for thread in [t for t in self._connections if not t.is_alive()]:
+                self._connections.pop(thread).close()
+            self._connections[threading.current_thread()] = conn
+        return conn
+
+    def get(self) -> sqlite3.Connection:
+        """Returns the connection of the current thread, opening it if needed"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding the connection of the current thread.
+        PRE : None
+        POST : The outermost block commits when it exits normally and rolls back if an exception is raised.
+               Nested blocks (e.g. several DatabaseController calls inside transaction()) join the
+               outermost transaction, so they are committed all at once
+        """
+        conn = self.get()
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            if self._local.depth == 1:
+                conn.rollback()
+            raise
+        else:
+            if self._local.depth == 1:
+                conn.commit()
+        finally:
+            self._local.depth -= 1
+
+    transaction = connection
+
+    def close(self) -> None:
+        """Closes the connection of the current thread, if any"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._lock:
+                self._connections.pop(threading.current_thread(), None)
+            conn.close()
+            self._local.conn = None
+
+    def close_all(self) -> None:
+        """Closes the connections of every thread"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
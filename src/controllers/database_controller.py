@@ -1,58 +1,134 @@
 import os
 import sqlite3
+from .connection_manager import ConnectionManager
+from .migrations import MIGRATIONS
+from .premium_cache import PremiumCache
+from .tariff_cache import TariffCache
+from .usage_archive import UNARCHIVED_PAYMENT, UNARCHIVED_USAGE, UsageArchive
 
 class DatabaseController:
-    def __init__(self):
-        self.directory = os.path.join(os.path.expanduser("~/.parkease"))
-        self.path = os.path.join(self.directory, "parking_lot.db")
+    MAX_VARIABLES = 500 # Parameters bound per IN (...) query, well below SQLite's limit
+
+    def __init__(self, path: str = None):
+        if path is None:
+            self.directory = os.path.join(os.path.expanduser("~/.parkease"))
+            self.path = os.path.join(self.directory, "parking_lot.db")
+        else:
+            self.directory = os.path.dirname(os.path.abspath(path))
+            self.path = path
+        self.connections = ConnectionManager.for_path(self.path) # Shared with every controller using this file
+        self.premium_cache = PremiumCache.for_connections(self.connections) # Same sharing, loaded on first premium check
+        self.tariffs = TariffCache.for_connections(self.connections) # Same sharing, compiled on first pricing
+        self.archive = UsageArchive(self) # Old history, queried along with the live tables by the analytics and reports
+
+    def connect(self):
+        """Returns a context manager yielding this thread's pooled connection. Commits when the block exits"""
+        return self.connections.connection()
+
+    def transaction(self):
+        """Groups every DatabaseController call made inside the block into a single transaction"""
+        return self.connections.transaction()
 
     def init_database(self):
         """Initializes all the relations needed to manage the parking lot
            ParkingSpots : Stores all existing spots with an id and their physical position
            ParkingUsage : History of every entry/exit. If someone is occupying the spot, entry_time is the corresponding TIMESTAMP, and exit_time is NULL
-           Payments : Links payments data to the corresponding ParkingUsage"""
+           Payments : Links payments data to the corresponding ParkingUsage
+           The relations are created by the migrations (see migrations.py)"""
 
-        with sqlite3.connect(self.path) as conn:
+        self.migrate()
+
+    def schema_version(self) -> int:
+        """Returns the version of the last migration applied to the database (0 if none was)"""
+
+        with self.connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""CREATE TABLE ParkingSpots (
-                              id INTEGER PRIMARY KEY,
-                              spot_number INTEGER NOT NULL,
-                              row_number INTEGER NOT NULL,
-                              floor_number INTEGER NOT NULL)""")
-            cursor.execute("""CREATE TABLE ParkingUsage (
-                              id INTEGER PRIMARY KEY,
-                              spot_id INTEGER NOT NULL,
-                              registration_plate VARCHAR(10) NOT NULL,
-                              entry_time TIMESTAMP,
-                              exit_time TIMESTAMP,
-                              FOREIGN KEY(spot_id) REFERENCES ParkingSpots(id)
-                              )""")
-            cursor.execute("""CREATE TABLE Payments (
-                              usage_id INTEGER PRIMARY KEY,
-                              registration_plate VARCHAR(10) NOT NULL,
-                              amount DECIMAL(5, 2) NOT NULL,
-                              FOREIGN KEY(usage_id) REFERENCES ParkingUsage(id)
-                              )""")
-            cursor.execute("""CREATE TABLE PremiumCars (
-                              premium_id INTEGER PRIMARY KEY,
-                              registration_plate VARCHAR(20) UNIQUE)""")
-            conn.commit()
+            cursor.execute("""CREATE TABLE IF NOT EXISTS SchemaVersion (
+                              version INTEGER PRIMARY KEY,
+                              description TEXT NOT NULL,
+                              applied_at TIMESTAMP NOT NULL DEFAULT current_timestamp)""")
+            cursor.execute("""SELECT COALESCE(MAX(version), 0)
+                              FROM SchemaVersion""")
+            return cursor.fetchone()[0]
+
+    def migrate(self) -> list:
+        """
+        Upgrades the database in place to the latest schema
+        PRE : The directory of the database exists
+        POST : Every migration newer than schema_version() is applied in order, each one in its own transaction,
+               and recorded in the SchemaVersion table. Returns the list of the versions applied
+        RAISES : sqlite3.DatabaseError if a migration fails. The database is left at the previous version
+        """
+        applied = []
+        current = self.schema_version()
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            with self.connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN") # DDL statements don't open a transaction implicitly
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute("""INSERT INTO SchemaVersion (version, description)
+                                  VALUES (?, ?)""", (version, description))
+            applied.append(version)
+        return applied
 
     def fetch_all_parking_spots(self):
         """Retrieves every existing spot
            Returns : A list of lists (each spot is a 4 items long list)"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""SELECT id, spot_number, row_number, floor_number
                               FROM ParkingSpots""")
             return cursor.fetchall()
 
+    def count_free_spots(self) -> int:
+        """Returns the number of spots without an open session"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT COUNT(*)
+                              FROM ParkingSpots s
+                              WHERE NOT EXISTS (SELECT 1
+                                                FROM ParkingUsage u
+                                                WHERE u.spot_id = s.id AND u.exit_time IS NULL)""")
+            return cursor.fetchone()[0]
+
+    def fetch_parking_lot_state(self):
+        """Retrieves every existing spot along with its current occupant, in a single query
+           Returns : A list of tuples (id, spot_number, row_number, floor_number, registration_plate, is_premium).
+                     registration_plate is None and is_premium is 0 if the spot is free"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT s.id, s.spot_number, s.row_number, s.floor_number,
+                                     u.registration_plate, p.premium_id IS NOT NULL
+                              FROM ParkingSpots s
+                              LEFT JOIN (SELECT spot_id, registration_plate, MAX(entry_time)
+                                         FROM ParkingUsage
+                                         WHERE exit_time IS NULL AND entry_time IS NOT NULL
+                                         GROUP BY spot_id) u ON u.spot_id = s.id
+                              LEFT JOIN PremiumCars p ON p.registration_plate = u.registration_plate""")
+            return cursor.fetchall()
+
+    def fetch_data_version(self, name: str) -> int:
+        """Returns the change counter of name in the DataVersions table ('ParkingLot', 'PremiumCars'), 0 if there is none"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT version
+                              FROM DataVersions
+                              WHERE name = ?""", (name,))
+            row = cursor.fetchone()
+            return row[0] if row is not None else 0
+
     def fetch_last_spot_usage(self, spot_id):
         """Retrieves information concerning the current spot's usage
            Returns : A list containing the registration plate, and the timestamps of last entry time. If exit_time is NULL, the spot is occupied, if not, it is free"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""SELECT registration_plate, entry_time, exit_time
                               FROM ParkingUsage
@@ -62,7 +138,7 @@ class DatabaseController:
 
     def fetch_last_usage_time(self, spot_id):
         """Retrieves the amount of time the last car was parked on the spot"""
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""SELECT id, (JULIANDAY(current_timestamp) - JULIANDAY(entry_time)) * 24
                               FROM ParkingUsage
@@ -73,19 +149,18 @@ class DatabaseController:
     def create_parking_spot(self, floor_number, row_number, spot_number):
         """Adds a new entry to the ParkingSpots table"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""INSERT INTO ParkingSpots (floor_number, row_number, spot_number)
                               VALUES (?, ?, ?)
                               RETURNING id""", (floor_number, row_number, spot_number))
             id = cursor.fetchone()
-            conn.commit()
             return id
 
     def delete_parking_spot(self, floor_number, row_number, spot_number):
         """Deletes an existing ParkingSpots entry"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""DELETE
                               FROM ParkingSpots
@@ -94,50 +169,285 @@ class DatabaseController:
     def new_entry_visitor(self, spot_id, registration_plate):
         """Adds a new entry to the ParkingUsage table. The entry time is set to the current timestamp"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time)
                               VALUES (?, ?, current_timestamp)""", (spot_id, registration_plate))
-            conn.commit()
 
-    def new_entry_booking(self, spot_id, registration_plate):
-        """Updates entry_time to a spot that was previously booked by the same client. entry_time is set to current_timestamp"""
-        # WARNING : Not needed for MVP
-        pass
+    def new_entry_booking(self, spot_id, registration_plate, booking_id):
+        """Adds a new entry to the ParkingUsage table for the customer of booking_id, and marks the booking fulfilled,
+           in one transaction. The entry time is set to the current timestamp"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""UPDATE Bookings
+                              SET status = 'fulfilled'
+                              WHERE id = ?""", (booking_id,))
+            cursor.execute("""INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time)
+                              VALUES (?, ?, current_timestamp)""", (spot_id, registration_plate))
 
     def new_exit(self, spot_id, registration_plate):
         """Updates exit_time (set to current_timestamp) to the corresponding spot."""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""UPDATE ParkingUsage
                               SET exit_time = current_timestamp
                               WHERE spot_id = ? AND registration_plate = ? AND exit_time IS NULL""", (spot_id, registration_plate))
-            conn.commit()
 
-    def new_booking(self, spot_id, registration_plate):
-        """Creates a new entry to the ParkingUsage. entry_time and exit_time are set to NULL"""
-        # WARNING : Not needed for MVP
-        pass
+    def new_entries_bulk(self, entries):
+        """Adds one ParkingUsage entry per (spot_id, registration_plate) tuple of entries with a single executemany.
+           Every entry time is set to the current timestamp"""
+
+        with self.connect() as conn:
+            conn.executemany("""INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time)
+                                VALUES (?, ?, current_timestamp)""", entries)
+
+    def new_exits_bulk(self, exits):
+        """Sets exit_time (current_timestamp) on the open sessions matching the (spot_id, registration_plate) tuples of exits"""
+
+        with self.connect() as conn:
+            conn.executemany("""UPDATE ParkingUsage
+                                SET exit_time = current_timestamp
+                                WHERE spot_id = ? AND registration_plate = ? AND exit_time IS NULL""", exits)
+
+    def fetch_open_usages(self, spot_ids):
+        """Retrieves the open session of each spot of spot_ids
+           Returns : A dict {spot_id: (usage_id, entry_time, now)}, the times as UNIX timestamps read from the clock of the database
+                     (the one new_exit() dates the exit with). Spots without an open session are left out"""
+
+        spot_ids = list(spot_ids)
+        open_usages = {}
+        with self.connect() as conn:
+            for i in range(0, len(spot_ids), self.MAX_VARIABLES):
+                chunk = spot_ids[i:i + self.MAX_VARIABLES]
+                cursor = conn.execute(f"""SELECT spot_id, id, CAST(STRFTIME('%s', entry_time) AS INTEGER), CAST(STRFTIME('%s', current_timestamp) AS INTEGER)
+                                          FROM ParkingUsage
+                                          WHERE exit_time IS NULL AND spot_id IN ({", ".join("?" * len(chunk))})""", chunk)
+                for spot_id, usage_id, entry_time, now in cursor:
+                    open_usages[spot_id] = (usage_id, entry_time, now)
+        return open_usages
+
+    def new_booking(self, spot_id, registration_plate, start: int, end: int):
+        """Adds a new active booking of spot_id by registration_plate from start to end (UNIX timestamps),
+           unless an active, held or fulfilled booking of the spot overlaps that window (as in BookingEngine : a fulfilled
+           booking keeps its window until it ends). The check and the insert are a single statement, so two processes
+           booking the same spot can't both succeed
+           Returns : The id of the booking, None if the window overlaps another booking"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""INSERT INTO Bookings (spot_id, registration_plate, start_time, end_time)
+                              SELECT ?, ?, DATETIME(?, 'unixepoch'), DATETIME(?, 'unixepoch')
+                              WHERE NOT EXISTS (SELECT 1
+                                                FROM Bookings
+                                                WHERE spot_id = ? AND status IN ('active', 'held', 'fulfilled')
+                                                  AND start_time < DATETIME(?, 'unixepoch') AND end_time > DATETIME(?, 'unixepoch'))
+                              RETURNING id""", (spot_id, registration_plate, start, end, spot_id, end, start))
+            row = cursor.fetchone()
+            return row[0] if row is not None else None
+
+    def update_booking(self, booking_id, status, spot_id=None):
+        """Sets the status of booking_id ('held', 'cancelled', 'expired'), and moves it to spot_id unless it is None"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""UPDATE Bookings
+                              SET status = ?, spot_id = COALESCE(?, spot_id)
+                              WHERE id = ?""", (status, spot_id, booking_id))
+
+    def fulfil_bookings(self, booking_ids):
+        """Marks every booking of booking_ids as fulfilled (their customer parked), with a single executemany"""
 
-    def fetch_all_payments(self):
-        """Retrieves all rows in the Payments table
-           Returns : A list of list (each payment is a 3 items long list"""
+        with self.connect() as conn:
+            conn.executemany("""UPDATE Bookings
+                                SET status = 'fulfilled'
+                                WHERE id = ?""", [(booking_id,) for booking_id in booking_ids])
+
+    def fetch_open_bookings(self):
+        """Retrieves the bookings whose window isn't over yet and that weren't cancelled or expired
+           Returns : A list of tuples (id, spot_id, registration_plate, start, end, status), start and end being UNIX timestamps"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT id, spot_id, registration_plate,
+                                     CAST(STRFTIME('%s', start_time) AS INTEGER), CAST(STRFTIME('%s', end_time) AS INTEGER), status
+                              FROM Bookings
+                              WHERE status IN ('active', 'held', 'fulfilled') AND end_time > current_timestamp
+                              ORDER BY id""")
+            return cursor.fetchall()
+
+    def fetch_bookings_by_registration_plate(self, registration_plate):
+        """Retrieves every booking of registration_plate
+           Returns : A list of tuples (id, spot_id, start_time, end_time, status) ordered by start_time"""
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""SELECT usage_id, registration_plate, amount
-                              FROM Payments""")
+            cursor.execute("""SELECT id, spot_id, start_time, end_time, status
+                              FROM Bookings
+                              WHERE registration_plate = ?
+                              ORDER BY start_time""", (registration_plate,))
             return cursor.fetchall()
 
+    def fetch_all_payments(self):
+        """Retrieves every payment, archived ones included
+           Returns : A list of tuples (usage_id, registration_plate, amount) ordered by usage_id"""
+
+        return list(self.iter_payments())
+
+    def fetch_payments_page(self, after_usage_id: int = 0, limit: int = 500):
+        """Retrieves at most limit payments whose usage_id is greater than after_usage_id (keyset pagination), archived ones included
+           Returns : A list of tuples (usage_id, registration_plate, amount) ordered by usage_id.
+                     The last usage_id is the after_usage_id of the next page"""
+
+        with self.connect() as conn:
+            page = []
+            for schema, pending, min_id in self.archive.partitions(conn, "payments > 0 AND max_id > ?", (after_usage_id,), "min_id", live_first=True):
+                if min_id is not None and len(page) == limit and min_id > page[-1][0]:
+                    break # The archives left only hold greater ids
+                cursor = conn.execute(f"""SELECT p.usage_id, p.registration_plate, p.amount
+                                          FROM {schema}.Payments p
+                                          WHERE p.usage_id > ? {UNARCHIVED_PAYMENT if pending else ""}
+                                          ORDER BY p.usage_id
+                                          LIMIT ?""", (after_usage_id, limit))
+                page = sorted(page + cursor.fetchall())[:limit]
+            return page
+
+    def iter_payments(self, chunk_size: int = 1000):
+        """Yields every payment ordered by usage_id, fetching chunk_size rows at a time.
+           Each chunk is a separate short query, so no read transaction stays open between two chunks"""
+
+        after_usage_id = 0
+        while page := self.fetch_payments_page(after_usage_id, chunk_size):
+            yield from page
+            after_usage_id = page[-1][0]
+
     def new_payment(self, usage_id, registration_plate, amount):
-        """Creates a new entry to the Payments table"""
+        """Creates a new entry to the Payments table, paid_at is set to current_timestamp.
+           The DailyRevenue rollup is updated by a trigger"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""INSERT INTO Payments (usage_id, registration_plate, amount, paid_at)
+                              VALUES (?, ?, ?, current_timestamp)""", (usage_id, registration_plate, amount))
+
+    def new_payments_bulk(self, payments):
+        """Adds one Payments entry per (usage_id, registration_plate, amount) tuple of payments with a single executemany"""
+
+        with self.connect() as conn:
+            conn.executemany("""INSERT INTO Payments (usage_id, registration_plate, amount, paid_at)
+                                VALUES (?, ?, ?, current_timestamp)""", payments)
+
+    def fetch_payments_by_date(self, start_date, end_date):
+        """Retrieves the payments made between start_date and end_date (both included, dates as 'YYYY-MM-DD' or datetime.date), archived ones included
+           Returns : A list of tuples (usage_id, registration_plate, amount, paid_at) ordered by paid_at"""
+
+        payments = []
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "first_paid < DATE(?, '+1 day') AND last_paid >= DATE(?)",
+                                                              (str(end_date), str(start_date))):
+                cursor = conn.execute(f"""SELECT p.usage_id, p.registration_plate, p.amount, p.paid_at
+                                          FROM {schema}.Payments p
+                                          WHERE p.paid_at >= DATE(?) AND p.paid_at < DATE(?, '+1 day') {UNARCHIVED_PAYMENT if pending else ""}""",
+                                      (str(start_date), str(end_date)))
+                payments.extend(cursor)
+        payments.sort(key=lambda payment: payment[3])
+        return payments
+
+    def fetch_payments_by_registration_plate(self, registration_plate):
+        """Retrieves every payment made by registration_plate, archived ones included
+           Returns : A list of tuples (usage_id, registration_plate, amount, paid_at) ordered by paid_at"""
+
+        payments = []
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "payments > 0"):
+                cursor = conn.execute(f"""SELECT p.usage_id, p.registration_plate, p.amount, p.paid_at
+                                          FROM {schema}.Payments p
+                                          WHERE p.registration_plate = ? {UNARCHIVED_PAYMENT if pending else ""}""", (registration_plate,))
+                payments.extend(cursor)
+        payments.sort(key=lambda payment: payment[3])
+        return payments
+
+    def fetch_revenue_totals(self, start_date=None, end_date=None):
+        """Aggregates the DailyRevenue rollup, over the whole history or between two dates (both included)
+           Returns : A tuple (number of payments, total revenue)"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT COALESCE(SUM(payments), 0), COALESCE(SUM(total), 0)
+                              FROM DailyRevenue
+                              WHERE (? IS NULL OR day >= DATE(?)) AND (? IS NULL OR day <= DATE(?))""",
+                           (start_date, str(start_date), end_date, str(end_date)))
+            return cursor.fetchone()
+
+    def fetch_daily_revenue(self, start_date=None, end_date=None):
+        """Retrieves the DailyRevenue rollup, over the whole history or between two dates (both included)
+           Returns : A list of tuples (day, number of payments, total revenue) ordered by day"""
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT day, payments, total
+                              FROM DailyRevenue
+                              WHERE (? IS NULL OR day >= DATE(?)) AND (? IS NULL OR day <= DATE(?))
+                              ORDER BY day""",
+                           (start_date, str(start_date), end_date, str(end_date)))
+            return cursor.fetchall()
 
-        with sqlite3.connect(self.path) as conn:
+    def fetch_tariffs(self):
+        """Retrieves every tariff along with its bands
+           Returns : A list of tuples (name, daily_cap, utc_offset, bands) ordered by name, bands being a list of tuples
+                     (days, start_minute, end_minute, hourly_rate) ordered by start_minute (see tariffs.py)"""
+
+        with self.connect() as conn:
+            bands = {}
+            for name, *band in conn.execute("""SELECT tariff, days, start_minute, end_minute, hourly_rate
+                                                FROM TariffBands
+                                                ORDER BY start_minute, days"""):
+                bands.setdefault(name, []).append(tuple(band))
+            cursor = conn.execute("""SELECT name, daily_cap, utc_offset
+                                     FROM Tariffs
+                                     ORDER BY name""")
+            return [(name, daily_cap, utc_offset, bands.get(name, [])) for name, daily_cap, utc_offset in cursor]
+
+    def set_tariff(self, name: str, bands, daily_cap: float = None, utc_offset: int = 0) -> None:
+        """
+        Creates or replaces the tariff name, in one transaction
+        PRE : bands is a list of tuples (days, start_minute, end_minute, hourly_rate), see tariffs.Tariff
+        POST : The tariff is stored with exactly these bands, every controller prices with it from now on
+        RAISES : ValueError if the bands are invalid (see tariffs.Tariff), nothing is written then
+        """
+        from tariffs import Tariff
+        Tariff(name, bands, daily_cap, utc_offset) # Validates the bands before anything is written
+
+        with self.connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("""INSERT INTO Payments
-                              VALUES (?, ?, ?)""", (usage_id, registration_plate, amount))
-            conn.commit()
+            cursor.execute("""INSERT INTO Tariffs (name, daily_cap, utc_offset)
+                              VALUES (?, ?, ?)
+                              ON CONFLICT(name) DO UPDATE SET daily_cap = excluded.daily_cap, utc_offset = excluded.utc_offset""",
+                           (name, daily_cap, utc_offset))
+            cursor.execute("""DELETE FROM TariffBands
+                              WHERE tariff = ?""", (name,))
+            cursor.executemany("""INSERT INTO TariffBands (tariff, days, start_minute, end_minute, hourly_rate)
+                                  VALUES (?, ?, ?, ?, ?)""", [(name, *band) for band in bands])
+        self.tariffs.invalidate()
+
+    def iter_paid_session_chunks(self, start: int, end: int, chunk_size: int = 10000):
+        """Yields the payments made during [start, end[ (UNIX timestamps) along with their session, in lists of chunk_size rows at most,
+           archived ones included. A payment made after its session was archived is left out
+           Each row is a tuple (usage_id, registration_plate, amount, entry_time, exit_time), the times as UNIX timestamps"""
+
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "first_paid < DATETIME(?, 'unixepoch') AND last_paid >= DATETIME(?, 'unixepoch')",
+                                                              (end, start)):
+                cursor = conn.execute(f"""SELECT p.usage_id, p.registration_plate, p.amount,
+                                                 CAST(STRFTIME('%s', u.entry_time) AS INTEGER), CAST(STRFTIME('%s', u.exit_time) AS INTEGER)
+                                          FROM {schema}.Payments p
+                                          JOIN {schema}.ParkingUsage u ON u.id = p.usage_id
+                                          WHERE p.paid_at >= DATETIME(?, 'unixepoch') AND p.paid_at < DATETIME(?, 'unixepoch')
+                                                {UNARCHIVED_PAYMENT if pending else ""}
+                                          ORDER BY p.paid_at""", (start, end))
+                while rows := cursor.fetchmany(chunk_size):
+                    yield rows
 
     def fetch_all_premium_subscriptions(self):
         """
@@ -146,7 +456,7 @@ class DatabaseController:
         POST : Returns a list of one-item lists, each representing a premium car
         """
 
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""SELECT registration_plate
                               FROM PremiumCars""")
@@ -159,12 +469,15 @@ class DatabaseController:
         POST : Returns True if the car owns a premium subscription, False if not
         """
 
-        with sqlite3.connect(self.path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""SELECT registration_plate
-                              FROM PremiumCars
-                              WHERE registration_plate = ?""", (registration_plate,))
-            return cursor.fetchone() is not None
+        return registration_plate in self.premium_cache # Hash lookup, see PremiumCache
+
+    def fetch_premium_plates(self, registration_plates) -> set:
+        """
+        Verifies several registration plates at once
+        PRE : registration_plates is an iterable of registration plates
+        POST : Returns the set of the plates of registration_plates that own a premium subscription
+        """
+        return {plate for plate in registration_plates if plate in self.premium_cache}
 
     def add_premium_subscription(self, registration_plate: str) -> None:
         """
@@ -173,11 +486,11 @@ class DatabaseController:
         POST : registration_plate is added as a new entry to the PremiumCars table
         RAISES : sqlite3.IntegrityError if the entry already exists (UNIQUE constraint failed)
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""INSERT INTO PremiumCars (registration_plate)
                               VALUES (?)""", (registration_plate,))
-            conn.commit()
+        self.premium_cache.added(registration_plate)
 
     def delete_premium_subscription(self, registration_plate: str) -> None:
         """
@@ -185,52 +498,134 @@ class DatabaseController:
         PRE : None
         POST : The entry matching registration_plate is deleted from the PremiumCars table
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""DELETE
                                   FROM PremiumCars
                                   WHERE registration_plate = ?""", (registration_plate,))
-            conn.commit()
+        self.premium_cache.removed(registration_plate)
 
     def fetch_all_usages(self):
-        """Retrieves the complete parking history"""
-        
-        with sqlite3.connect(self.path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""SELECT id, spot_id, registration_plate, entry_time, exit_time
-                              FROM ParkingUsage""")
-            return cursor.fetchall()
+        """Retrieves the complete parking history, archived sessions included, ordered by id"""
+
+        return list(self.iter_usages())
+
+    def fetch_usages_page(self, after_id: int = 0, limit: int = 500):
+        """Retrieves at most limit usages whose id is greater than after_id (keyset pagination), archived ones included
+           Returns : A list of tuples (id, spot_id, registration_plate, entry_time, exit_time) ordered by id.
+                     The last id is the after_id of the next page"""
+
+        with self.connect() as conn:
+            page = []
+            for schema, pending, min_id in self.archive.partitions(conn, "usages > 0 AND max_id > ?", (after_id,), "min_id", live_first=True):
+                if min_id is not None and len(page) == limit and min_id > page[-1][0]:
+                    break # The archives left only hold greater ids
+                cursor = conn.execute(f"""SELECT u.id, u.spot_id, u.registration_plate, u.entry_time, u.exit_time
+                                          FROM {schema}.ParkingUsage u
+                                          WHERE u.id > ? {UNARCHIVED_USAGE if pending else ""}
+                                          ORDER BY u.id
+                                          LIMIT ?""", (after_id, limit))
+                page = sorted(page + cursor.fetchall())[:limit]
+            return page
+
+    def iter_usages(self, chunk_size: int = 1000):
+        """Yields the complete parking history ordered by id, fetching chunk_size rows at a time.
+           Each chunk is a separate short query, so no read transaction stays open between two chunks"""
+
+        after_id = 0
+        while page := self.fetch_usages_page(after_id, chunk_size):
+            yield from page
+            after_id = page[-1][0]
+
+    def iter_sessions_between(self, start: int, end: int, chunk_size: int = 10000):
+        """Yields every parking session overlapping the period [start, end[ (UNIX timestamps), archived ones included
+           Yields : tuples (floor_number, entry_time, exit_time) as UNIX timestamps, exit_time is None if the car is still parked"""
+
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "first_entry < DATETIME(?, 'unixepoch') AND last_exit >= DATETIME(?, 'unixepoch')",
+                                                              (end, start)):
+                statement = f"""SELECT s.floor_number, CAST(STRFTIME('%s', u.entry_time) AS INTEGER), CAST(STRFTIME('%s', u.exit_time) AS INTEGER)
+                                FROM {schema}.ParkingUsage u
+                                JOIN main.ParkingSpots s ON s.id = u.spot_id
+                                WHERE u.exit_time >= DATETIME(?, 'unixepoch') AND u.entry_time < DATETIME(?, 'unixepoch')
+                                      {UNARCHIVED_USAGE if pending else ""}"""
+                params = (start, end)
+                if schema == "main": # The archives only hold closed sessions
+                    statement += """ UNION ALL
+                                     SELECT s.floor_number, CAST(STRFTIME('%s', u.entry_time) AS INTEGER), NULL
+                                     FROM main.ParkingUsage u
+                                     JOIN main.ParkingSpots s ON s.id = u.spot_id
+                                     WHERE u.exit_time IS NULL AND u.entry_time < DATETIME(?, 'unixepoch')"""
+                    params += (end,)
+                cursor = conn.execute(statement, params)
+                while rows := cursor.fetchmany(chunk_size):
+                    yield from rows
+
+    def iter_usage_chunks(self, start: int, end: int, chunk_size: int = 10000):
+        """Yields the parking sessions that started during [start, end[ (UNIX timestamps), in lists of chunk_size rows at most :
+           the archived ones first, month by month, then the ones of the live table, each ordered by id
+           Each row is a tuple (id, spot_id, floor_number, row_number, spot_number, registration_plate, entry_time, exit_time),
+           the times as UNIX timestamps. exit_time is None if the car is still parked, the position is None if the spot was deleted"""
+
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "first_entry < DATETIME(?, 'unixepoch') AND last_entry >= DATETIME(?, 'unixepoch')",
+                                                              (end, start)):
+                cursor = conn.execute(f"""SELECT u.id, u.spot_id, s.floor_number, s.row_number, s.spot_number, u.registration_plate,
+                                                 CAST(STRFTIME('%s', u.entry_time) AS INTEGER), CAST(STRFTIME('%s', u.exit_time) AS INTEGER)
+                                          FROM {schema}.ParkingUsage u
+                                          LEFT JOIN main.ParkingSpots s ON s.id = u.spot_id
+                                          WHERE +u.entry_time >= DATETIME(?, 'unixepoch') AND +u.entry_time < DATETIME(?, 'unixepoch')
+                                                {UNARCHIVED_USAGE if pending else ""}
+                                          ORDER BY u.id""", (start, end)) # An archive holds one month : scanning it in id order beats its entry index and a sort
+                while rows := cursor.fetchmany(chunk_size):
+                    yield rows
+
+    def iter_payment_chunks(self, start: int, end: int, chunk_size: int = 10000):
+        """Yields the payments made during [start, end[ (UNIX timestamps), in lists of chunk_size rows at most :
+           the archived ones first, month by month, then the ones of the live table, each ordered by date
+           Each row is a tuple (usage_id, registration_plate, amount, paid_at), paid_at as a UNIX timestamp"""
+
+        with self.connect() as conn:
+            for schema, pending, _ in self.archive.partitions(conn, "first_paid < DATETIME(?, 'unixepoch') AND last_paid >= DATETIME(?, 'unixepoch')",
+                                                              (end, start)):
+                cursor = conn.execute(f"""SELECT p.usage_id, p.registration_plate, p.amount, CAST(STRFTIME('%s', p.paid_at) AS INTEGER)
+                                          FROM {schema}.Payments p
+                                          WHERE p.paid_at >= DATETIME(?, 'unixepoch') AND p.paid_at < DATETIME(?, 'unixepoch')
+                                                {UNARCHIVED_PAYMENT if pending else ""}
+                                          ORDER BY p.paid_at""", (start, end))
+                while rows := cursor.fetchmany(chunk_size):
+                    yield rows
 
     def cancel_booking(self, spot_id, registration_plate):
         """
-        Annule une réservation pour une place spécifique dans la base de données.
+        Annule les réservations ouvertes (actives ou en cours) d'une place spécifique dans la base de données.
 
         Paramètres :
             spot_id (int) : L'identifiant unique de la place de parking.
             registration_plate (str) : La plaque d'immatriculation associée à la réservation.
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             try:
                 cursor = conn.cursor()
-                cursor.execute("""DELETE FROM ParkingUsage
-                                  WHERE spot_id = ? AND registration_plate = ? AND entry_time IS NULL AND exit_time IS NULL""",
+                cursor.execute("""UPDATE Bookings
+                                  SET status = 'cancelled'
+                                  WHERE spot_id = ? AND registration_plate = ? AND status IN ('active', 'held')""",
                                (spot_id, registration_plate))
-                conn.commit()
             except sqlite3.DatabaseError as e:
                 print(f"[Error] Unable to cancel booking for spot {spot_id}: {e}")
 
     def fetch_reserved_spots(self):
         """
-        Récupère toutes les places de parking réservées mais non occupées.
+        Récupère toutes les places de parking réservées mais non occupées (réservations dont la période a commencé).
         Retourne :
             list : Une liste de tuples contenant l'identifiant de la place et la plaque d'immatriculation.
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute("""SELECT spot_id, registration_plate
-                                  FROM ParkingUsage
-                                  WHERE entry_time IS NULL AND exit_time IS NULL""")
+                                  FROM Bookings
+                                  WHERE status = 'held'""")
                 return cursor.fetchall()
             except sqlite3.DatabaseError as e:
                 print(f"[Error] Unable to fetch reserved spots: {e}")
@@ -242,7 +637,7 @@ class DatabaseController:
         Retourne :
             list : Une liste de tuples contenant l'identifiant de la place et la plaque d'immatriculation des véhicules garés.
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute("""SELECT spot_id, registration_plate
@@ -261,7 +656,7 @@ class DatabaseController:
         Retourne :
             float : La durée d'utilisation en heures, ou None si une erreur survient.
         """
-        with sqlite3.connect(self.path) as conn:
+        with self.connect() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute("""SELECT (JULIANDAY(current_timestamp) - JULIANDAY(entry_time)) * 24
@@ -0,0 +1,181 @@
+"""
+Opt-in instrumentation of the hot paths : call counts and latency histograms for every
+DatabaseController method and for the ParkingController operations, plus a log of the slow calls
+with the SQL they ran.
+
+Nothing is wrapped while it is disabled : enable() replaces the methods of the classes by timed
+wrappers and disable() puts the original functions back, so the disabled cost is zero.
+The SQL text is captured with sqlite3's trace callback, installed on the pooled connections
+only while the instrumentation is enabled.
+
+Usage : INSTRUMENTATION.enable(), then INSTRUMENTATION.snapshot() or INSTRUMENTATION.export(path).
+        Setting the PARKEASE_INSTRUMENTATION environment variable enables it when the application starts
+"""
+import bisect
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from .connection_manager import ConnectionManager
+from .database_controller import DatabaseController
+from .parking_controller import ParkingController
+
+logger = logging.getLogger("parkease.slow_queries")
+
+# Upper bounds of the latency buckets, in microseconds (the last bucket is unbounded)
+BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+PARKING_OPERATIONS = ("fetch_parking_data", "new_entry", "new_exit", "new_entry_auto", "new_exit_by_plate",
+                      "new_entries_bulk", "new_exits_bulk", "create_new_spot", "delete_spot", "checkpoint")
+
+class MethodStats:
+    """Calls and latency histogram of one method"""
+    __slots__ = ("calls", "total", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0 # Seconds
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[bisect.bisect_left(BUCKETS, elapsed * 1e6)] += 1
+
+    def percentile(self, p: float) -> float:
+        """Returns the upper bound (in ms) of the bucket holding the p-th percentile, the max for the last bucket"""
+        rank = p / 100 * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[i] / 1000 if i < len(BUCKETS) else self.max * 1000
+        return 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max * 1000, 3),
+            "histogram_us": dict(zip([f"<={b}" for b in BUCKETS] + [f">{BUCKETS[-1]}"], self.buckets)),
+        }
+
+class Instrumentation:
+    """Collects the statistics of the instrumented classes, see the module docstring"""
+
+    SLOW_QUERIES_KEPT = 100
+
+    def __init__(self, targets, slow_threshold: float = 0.05):
+        """
+        PRE : targets maps each class to instrument to the names of its methods (None for every public method).
+              slow_threshold is the duration in seconds above which a call is logged as slow
+        """
+        self.targets = targets
+        self.slow_threshold = slow_threshold
+        self.enabled = False
+        self._stats = {}
+        self._slow = deque(maxlen=self.SLOW_QUERIES_KEPT)
+        self._originals = [] # (class, name, function) restored by disable()
+        self._lock = threading.Lock()
+        self._local = threading.local() # SQL statements run by the current thread
+
+    def _methods(self, cls, names):
+        if names is None:
+            names = [name for name, member in vars(cls).items()
+                     if inspect.isfunction(member) and not name.startswith("_")
+                     and not inspect.isgeneratorfunction(member) # Their body runs after the call returns
+                     and name not in ("connect", "transaction")]
+        return names
+
+    def _wrap(self, qualified_name, function):
+        stats = self._stats.setdefault(qualified_name, MethodStats())
+        local = self._local
+        def wrapper(*args, **kwargs):
+            statements = getattr(local, "statements", None)
+            outermost = statements is None
+            if outermost:
+                statements = local.statements = []
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    stats.record(elapsed)
+                if outermost:
+                    local.statements = None
+                    if elapsed >= self.slow_threshold:
+                        self._log_slow(qualified_name, elapsed, statements)
+        return functools.update_wrapper(wrapper, function)
+
+    def _trace(self, statement: str):
+        """sqlite3 trace callback : keeps the SQL run inside the current instrumented call"""
+        statements = getattr(self._local, "statements", None)
+        if statements is not None and len(statements) < 50:
+            statements.append(statement)
+
+    def _log_slow(self, name, elapsed, statements):
+        entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "method": name, "ms": round(elapsed * 1000, 3), "sql": statements}
+        with self._lock:
+            self._slow.append(entry)
+        logger.warning("Slow call %s : %.1f ms\n%s", name, elapsed * 1000, "\n".join(statements))
+
+    def enable(self) -> None:
+        """Wraps the methods of the targets and starts capturing the SQL text"""
+        with self._lock:
+            if self.enabled:
+                return
+            for cls, names in self.targets.items():
+                for name in self._methods(cls, names):
+                    function = vars(cls)[name]
+                    self._originals.append((cls, name, function))
+                    setattr(cls, name, self._wrap(f"{cls.__name__}.{name}", function))
+            self.enabled = True
+        ConnectionManager.set_trace_callback(self._trace)
+
+    def disable(self) -> None:
+        """Puts the original methods back, the statistics collected so far are kept"""
+        with self._lock:
+            if not self.enabled:
+                return
+            for cls, name, function in reversed(self._originals):
+                setattr(cls, name, function)
+            self._originals.clear()
+            self.enabled = False
+        ConnectionManager.set_trace_callback(None)
+
+    def reset(self) -> None:
+        """Forgets the statistics and the slow calls"""
+        with self._lock:
+            for stats in self._stats.values():
+                stats.__init__() # In place, the wrappers hold these objects
+            self._slow.clear()
+
+    def snapshot(self) -> dict:
+        """Returns {"enabled", "slow_threshold_ms", "methods": {name: statistics}, "slow_calls": [...]}, busiest methods first"""
+        with self._lock:
+            methods = sorted(((name, stats.as_dict()) for name, stats in self._stats.items() if stats.calls),
+                             key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                "enabled": self.enabled,
+                "slow_threshold_ms": self.slow_threshold * 1000,
+                "methods": dict(methods),
+                "slow_calls": list(self._slow),
+            }
+
+    def export(self, path: str) -> None:
+        """Writes snapshot() to path as JSON"""
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+INSTRUMENTATION = Instrumentation({DatabaseController: None, ParkingController: PARKING_OPERATIONS})
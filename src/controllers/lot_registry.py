@@ -0,0 +1,124 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .database_controller import DatabaseController
+from .parking_controller import ParkingController
+
+class LotRegistry:
+    """
+    Registry of the parking lots operated by ParkEase. Each lot is stored in its own SQLite file (shard),
+    so the lots never contend for the same database lock and can be queried at the same time.
+    Lot 1 keeps the historical file (parking_lot.db), lot n is stored in parking_lot_<n>.db.
+    Operations are routed to a lot with controller(lot_number), cross-lot queries are fanned out
+    to every shard by a thread pool (sqlite3 releases the GIL while a query runs)
+    """
+
+    SHARD_NAME = re.compile(r"^parking_lot(?:_([2-9]\d*|[1-9]\d+))?\.db$") # Lot 1 only has the historical name
+
+    def __init__(self, directory: str = None, max_workers: int = None):
+        """
+        PRE : directory is the folder of the shards (default : ~/.parkease), max_workers the size of the fan-out pool
+        POST : Every shard found in directory is registered, no database is opened yet
+        """
+        self.directory = directory if directory is not None else os.path.expanduser("~/.parkease")
+        self.max_workers = max_workers
+        self._databases = {} # Lot number -> DatabaseController
+        self._controllers = {} # Lot number -> ParkingController, created on first use
+        self._lock = threading.Lock()
+        self._executor = None
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                match = self.SHARD_NAME.match(name)
+                if match:
+                    lot_number = int(match.group(1) or 1)
+                    self._databases[lot_number] = DatabaseController(self.shard_path(lot_number))
+
+    def shard_path(self, lot_number: int) -> str:
+        """Returns the path of the SQLite file of lot_number"""
+        name = "parking_lot.db" if lot_number == 1 else f"parking_lot_{lot_number}.db"
+        return os.path.join(self.directory, name)
+
+    def lots(self) -> list:
+        """Returns the numbers of the registered lots, in ascending order"""
+        return sorted(self._databases)
+
+    def add_lot(self, lot_number: int) -> DatabaseController:
+        """
+        PRE : lot_number is a strictly positive integer
+        POST : The shard of the lot is created (or upgraded) and registered
+        RETURNS : The DatabaseController of the lot
+        RAISES : ValueError if lot_number isn't strictly positive
+        """
+        if lot_number <= 0:
+            raise ValueError("lot_number must be positive")
+        with self._lock:
+            db = self._databases.get(lot_number)
+            if db is None:
+                os.makedirs(self.directory, exist_ok=True)
+                db = DatabaseController(self.shard_path(lot_number))
+            db.migrate()
+            self._databases[lot_number] = db
+            return db
+
+    def db(self, lot_number: int) -> DatabaseController:
+        """
+        Returns the DatabaseController of lot_number
+        RAISES : KeyError if the lot isn't registered
+        """
+        try:
+            return self._databases[lot_number]
+        except KeyError:
+            raise KeyError(f"Parking lot {lot_number} does not exist") from None
+
+    def controller(self, lot_number: int, **kwargs) -> ParkingController:
+        """
+        PRE : kwargs are passed to ParkingController the first time (e.g. write_queue)
+        POST : Returns the ParkingController of lot_number, loaded from its shard on first call
+        RAISES : KeyError if the lot isn't registered
+        """
+        with self._lock:
+            controller = self._controllers.get(lot_number)
+            if controller is None:
+                controller = ParkingController(db=self.db(lot_number), lot_number=lot_number, **kwargs)
+                self._controllers[lot_number] = controller
+            return controller
+
+    def fan_out(self, query, lots=None) -> dict:
+        """
+        PRE : query is a function taking a DatabaseController, lots None (every lot) or a list of registered lot numbers
+        POST : Runs query on the shards of lots at the same time
+        RETURNS : A dict {lot_number: result of query on its shard}
+        """
+        lots = self.lots() if lots is None else list(lots)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="parkease-shard")
+        return dict(zip(lots, self._executor.map(lambda lot_number: query(self._databases[lot_number]), lots)))
+
+    def free_spots(self) -> dict:
+        """
+        Returns {lot_number: number of free spots}. The lots whose controller is loaded are counted in memory,
+        the others in their shard
+        """
+        loaded = {lot: controller.parking_lot.free_spots_count() for lot, controller in list(self._controllers.items())}
+        counts = self.fan_out(DatabaseController.count_free_spots, [lot for lot in self.lots() if lot not in loaded])
+        counts.update(loaded)
+        return counts
+
+    def total_free_spots(self) -> int:
+        """Returns the number of free spots over every lot"""
+        return sum(self.free_spots().values())
+
+    def revenue(self, start_date=None, end_date=None) -> dict:
+        """Returns {lot_number: (number of payments, total revenue)} over the whole history or between two dates (both included)"""
+        return self.fan_out(lambda db: db.fetch_revenue_totals(start_date, end_date))
+
+    def total_revenue(self, start_date=None, end_date=None) -> float:
+        """Returns the revenue of every lot together, over the whole history or between two dates (both included)"""
+        return sum(total for payments, total in self.revenue(start_date, end_date).values())
+
+    def close(self) -> None:
+        """Stops the fan-out pool"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,189 @@
+"""
+Snapshot and journal of the in-memory ParkingLot, so a ParkingController starts without rebuilding
+the whole lot from the database.
+
+    parking_lot.db.snapshot : every spot of the lot with its status, linked plate and premium flag, in a
+                              binary file written atomically, along with the data version it matches
+    parking_lot.db.journal  : one record appended per change of the lot since that snapshot
+                              (spot added, spot removed, status changed)
+
+The 'ParkingLot' counter of the DataVersions table is bumped once per entry, exit, spot created and
+spot deleted, whichever process writes them, and each of these changes the lot exactly once.
+The snapshot and its journal are therefore up to date when the version of the snapshot plus the
+number of journal records equals the counter of the database. Otherwise (a write made by another
+process, a write that failed, a corrupt or truncated file) restore() returns None and the lot is
+hydrated from the database again.
+"""
+import os
+import struct
+import weakref
+import zlib
+from models import ParkingLot, ParkingSpot, PremiumCar, StandardCar
+
+class LotSnapshot:
+    """Writes and restores the snapshot of one database file, and journals the changes of the lot attached to it"""
+
+    MAGIC = b"PKES"
+    FORMAT = 1
+    HEADER = struct.Struct("<4sHqqII") # Magic, format, lot number, data version, spots, linked spots
+    SPOT = struct.Struct("<qiii") # id, spot_number, row_number, floor_number
+    LINK = struct.Struct("<IBB") # Index of the spot in the SPOT section, status code, premium. Plates follow, \0 separated
+    RECORD = struct.Struct("<BqiiiBBH") # Event, id, spot_number, row_number, floor_number, status code, premium, plate length
+    CRC = struct.Struct("<I") # crc32 after the snapshot, before each journal record
+    EVENTS = ("added", "removed", "changed")
+    SNAPSHOT_EVERY = 10000 # Journal records after which a new snapshot is due
+
+    def __init__(self, db_path: str):
+        self.path = db_path + ".snapshot"
+        self.journal_path = db_path + ".journal"
+        self.version = None # Data version of the database once the journaled changes are committed, None when detached
+        self.journal_length = 0
+        self._lot = None
+        self._journal = None
+        self._close_journal = None # Also called when the snapshot is garbage collected while still attached
+
+    @property
+    def due(self) -> bool:
+        """True when the journal is long enough for a new snapshot to be worth writing"""
+        return self.journal_length >= self.SNAPSHOT_EVERY
+
+    def restore(self, lot_number: int, version: int):
+        """
+        PRE : version is the current 'ParkingLot' data version of the database
+        POST : Loads the snapshot and replays the journal
+        RETURNS : The restored ParkingLot, None if there is no snapshot or if it is corrupt or stale
+        """
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        try:
+            with open(self.journal_path, "rb") as file:
+                journal = file.read()
+        except FileNotFoundError:
+            journal = b""
+        try:
+            records = self._read_journal(journal)
+            if self.HEADER.unpack_from(data)[3] + len(records) != version:
+                return None # Checked before the lot is built : the database changed behind the snapshot's back
+            lot, spots = self._load(data, lot_number)
+            self._replay(lot, spots, records)
+        except (ValueError, KeyError, TypeError, AssertionError, struct.error):
+            return None # UnicodeDecodeError is a ValueError
+        self.journal_length = len(records)
+        return lot
+
+    def _load(self, data: bytes, lot_number: int):
+        """Builds the lot stored in data, returns it along with its {id: ParkingSpot} dict"""
+        view = memoryview(data)
+        if len(data) < self.HEADER.size + self.CRC.size or zlib.crc32(view[:-self.CRC.size]) != self.CRC.unpack_from(view, len(data) - self.CRC.size)[0]:
+            raise ValueError("Corrupt snapshot")
+        magic, format, snapshot_lot, version, count, linked = self.HEADER.unpack_from(view)
+        if magic != self.MAGIC or format != self.FORMAT or snapshot_lot != lot_number:
+            raise ValueError("Not a snapshot of this lot")
+        links_start = self.HEADER.size + count * self.SPOT.size
+        plates_start = links_start + linked * self.LINK.size
+        links = list(self.LINK.iter_unpack(view[links_start:plates_start]))
+        plates = str(view[plates_start:-self.CRC.size], "utf-8").split("\0") if linked else []
+        if len(plates) != linked:
+            raise ValueError("Corrupt snapshot")
+        occupied, booked = {}, []
+        for (index, code, premium), registration_plate in zip(links, plates):
+            if code == ParkingSpot.OCCUPIED:
+                occupied[index] = (registration_plate, premium)
+            else:
+                booked.append((index, registration_plate))
+        free = (None, False)
+        lot = ParkingLot(lot_number)
+        positions = self.SPOT.iter_unpack(view[self.HEADER.size:links_start])
+        spots = lot.load_spots((*position, *occupied.get(index, free)) for index, position in enumerate(positions))
+        for index, registration_plate in booked:
+            id = self.SPOT.unpack_from(view, self.HEADER.size + index * self.SPOT.size)[0]
+            spots[id].book(registration_plate, True)
+        return lot, spots
+
+    def _read_journal(self, journal: bytes) -> list:
+        """Returns the (event, id, spot_number, row_number, floor_number, code, premium, plate) records of journal"""
+        records, offset, view = [], 0, memoryview(journal)
+        while offset < len(journal):
+            crc, = self.CRC.unpack_from(view, offset)
+            start = offset + self.CRC.size
+            *record, length = self.RECORD.unpack_from(view, start)
+            end = start + self.RECORD.size + length
+            if end > len(journal) or zlib.crc32(view[start:end]) != crc:
+                raise ValueError("Corrupt journal") # A record cut short by a crash counts as corrupt too
+            records.append((*record, str(view[end - length:end], "utf-8") if length else None))
+            offset = end
+        return records
+
+    def _replay(self, lot: ParkingLot, spots: dict, records: list):
+        """Applies the journal records to lot, in order"""
+        for event, id, spot_number, row_number, floor_number, code, premium, registration_plate in records:
+            event = self.EVENTS[event]
+            if event == "added":
+                spots[id] = lot.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
+            elif event == "removed":
+                lot.remove_spot({"spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
+                del spots[id]
+            elif code == ParkingSpot.FREE:
+                spots[id].status = "free"
+                spots[id].linked_car = None
+            else:
+                spots[id].linked_car = (PremiumCar if premium else StandardCar)(registration_plate)
+                spots[id].status = ParkingSpot.ALLOWED_STATUSES[code]
+
+    def save(self, lot: ParkingLot, version: int) -> None:
+        """
+        PRE : lot matches the database at data version version
+        POST : Replaces the snapshot by the state of lot and empties the journal
+        """
+        positions, links, plates = [], [], []
+        for floor in lot.floors.values():
+            for row in floor.rows.values():
+                for spot in row.spots.values():
+                    if spot.registration_plate is not None and spot.status != "free":
+                        links.append(self.LINK.pack(len(positions), ParkingSpot.ALLOWED_STATUSES.index(spot.status), isinstance(spot.linked_car, PremiumCar)))
+                        plates.append(spot.registration_plate)
+                    positions.append(self.SPOT.pack(spot.id, spot.spot_number, row.row_number, floor.floor_number))
+        data = b"".join([self.HEADER.pack(self.MAGIC, self.FORMAT, lot.lot_number, version, len(positions), len(links)),
+                         *positions, *links, "\0".join(plates).encode()])
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data + self.CRC.pack(zlib.crc32(data)))
+        os.replace(temporary, self.path) # A crash leaves either the old snapshot or the new one
+        # A crash before the journal is emptied leaves a snapshot newer than its journal : restore() sees the mismatch
+        if self._journal is not None:
+            self._journal.truncate(0)
+        else:
+            open(self.journal_path, "wb").close()
+        self.journal_length = 0
+
+    def attach(self, lot: ParkingLot, version: int) -> None:
+        """
+        PRE : The snapshot and the journal match lot, which matches the database at data version version
+        POST : Every following change of lot is appended to the journal
+        """
+        self.detach()
+        self._journal = open(self.journal_path, "ab", buffering=0) # Each record is written right away
+        self._close_journal = weakref.finalize(self, self._journal.close)
+        self._lot, self.version = lot, version
+        lot.add_listener(self._record)
+
+    def detach(self) -> None:
+        """Stops journaling the changes of the attached lot"""
+        if self._lot is not None:
+            self._lot.remove_listener(self._record)
+            self._close_journal()
+        self._lot = self._journal = self._close_journal = self.version = None
+
+    def _record(self, event: str, spot: ParkingSpot):
+        """Listener of the attached lot : appends the change to the journal"""
+        status = spot.status
+        registration_plate = spot.registration_plate if status != "free" else None
+        plate = registration_plate.encode() if registration_plate is not None else b""
+        record = self.RECORD.pack(self.EVENTS.index(event), spot.id, spot.spot_number, spot.row_number, spot.floor_number,
+                                  ParkingSpot.ALLOWED_STATUSES.index(status), isinstance(spot.linked_car, PremiumCar), len(plate)) + plate
+        self._journal.write(self.CRC.pack(zlib.crc32(record)) + record)
+        self.journal_length += 1
+        self.version += 1
@@ -0,0 +1,208 @@
+"""
+Ordered list of the schema versions of the ParkEase database.
+DatabaseController.migrate() applies, in order, every migration whose version is greater than the
+last version recorded in the SchemaVersion table, each one inside its own transaction.
+Existing migrations must never be edited once released : add a new one instead.
+"""
+
+MIGRATIONS = [
+    (1, "Base schema", [
+        """CREATE TABLE IF NOT EXISTS ParkingSpots (
+           id INTEGER PRIMARY KEY,
+           spot_number INTEGER NOT NULL,
+           row_number INTEGER NOT NULL,
+           floor_number INTEGER NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS ParkingUsage (
+           id INTEGER PRIMARY KEY,
+           spot_id INTEGER NOT NULL,
+           registration_plate VARCHAR(10) NOT NULL,
+           entry_time TIMESTAMP,
+           exit_time TIMESTAMP,
+           FOREIGN KEY(spot_id) REFERENCES ParkingSpots(id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS Payments (
+           usage_id INTEGER PRIMARY KEY,
+           registration_plate VARCHAR(10) NOT NULL,
+           amount DECIMAL(5, 2) NOT NULL,
+           FOREIGN KEY(usage_id) REFERENCES ParkingUsage(id)
+           )""",
+        """CREATE TABLE IF NOT EXISTS PremiumCars (
+           premium_id INTEGER PRIMARY KEY,
+           registration_plate VARCHAR(20) UNIQUE)""",
+    ]),
+    (2, "Indexes on spot positions, spot history and open sessions", [
+        # Older databases may hold several open sessions for the same spot : only the latest one is kept open.
+        # Their old booking rows have no entry time, they are closed now
+        """UPDATE ParkingUsage
+           SET exit_time = COALESCE(entry_time, current_timestamp)
+           WHERE exit_time IS NULL
+             AND id NOT IN (SELECT MAX(id) FROM ParkingUsage WHERE exit_time IS NULL GROUP BY spot_id)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS ParkingSpots_position
+           ON ParkingSpots(floor_number, row_number, spot_number)""",
+        """CREATE INDEX IF NOT EXISTS ParkingUsage_spot_entry
+           ON ParkingUsage(spot_id, entry_time)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS ParkingUsage_open_session
+           ON ParkingUsage(spot_id) WHERE exit_time IS NULL""",
+    ]),
+    (3, "Payment timestamps and daily revenue rollup", [
+        """ALTER TABLE Payments ADD COLUMN paid_at TIMESTAMP""",
+        # Payments made before this version are dated by the exit (or entry) of their usage
+        """UPDATE Payments
+           SET paid_at = COALESCE((SELECT COALESCE(u.exit_time, u.entry_time)
+                                   FROM ParkingUsage u
+                                   WHERE u.id = Payments.usage_id), current_timestamp)""",
+        """CREATE INDEX IF NOT EXISTS Payments_paid_at
+           ON Payments(paid_at)""",
+        """CREATE INDEX IF NOT EXISTS Payments_registration_plate
+           ON Payments(registration_plate)""",
+        """CREATE TABLE IF NOT EXISTS DailyRevenue (
+           day DATE PRIMARY KEY,
+           payments INTEGER NOT NULL,
+           total DECIMAL(10, 2) NOT NULL)""",
+        """INSERT INTO DailyRevenue (day, payments, total)
+           SELECT DATE(paid_at), COUNT(*), SUM(amount)
+           FROM Payments
+           GROUP BY DATE(paid_at)""",
+        # Keeps the rollup up to date on every insert (new_payment and bulk inserts alike).
+        # There is deliberately no DELETE trigger : archived payments still count in the history
+        """CREATE TRIGGER IF NOT EXISTS Payments_daily_revenue
+           AFTER INSERT ON Payments
+           BEGIN
+               INSERT INTO DailyRevenue (day, payments, total)
+               VALUES (DATE(NEW.paid_at), 1, NEW.amount)
+               ON CONFLICT(day) DO UPDATE SET payments = payments + 1, total = total + excluded.total;
+           END""",
+    ]),
+    (4, "Index on closed sessions for period queries", [
+        """CREATE INDEX IF NOT EXISTS ParkingUsage_exit_entry
+           ON ParkingUsage(exit_time, entry_time)""",
+    ]),
+    (5, "Version counter of the premium subscriptions", [
+        # Bumped by triggers on every change, whichever process makes it, so PremiumCache knows when to reload
+        """CREATE TABLE IF NOT EXISTS DataVersions (
+           name TEXT PRIMARY KEY,
+           version INTEGER NOT NULL)""",
+        """INSERT OR IGNORE INTO DataVersions (name, version)
+           VALUES ('PremiumCars', 0)""",
+        """CREATE TRIGGER IF NOT EXISTS PremiumCars_version_insert
+           AFTER INSERT ON PremiumCars
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'PremiumCars';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS PremiumCars_version_update
+           AFTER UPDATE ON PremiumCars
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'PremiumCars';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS PremiumCars_version_delete
+           AFTER DELETE ON PremiumCars
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'PremiumCars';
+           END""",
+    ]),
+    (6, "Version counter of the parking lot state", [
+        # Bumped once per spot created or deleted and once per entry or exit, so a lot snapshot
+        # can tell whether the database changed since it was written (see lot_snapshot.py)
+        """INSERT OR IGNORE INTO DataVersions (name, version)
+           VALUES ('ParkingLot', 0)""",
+        """CREATE TRIGGER IF NOT EXISTS ParkingSpots_version_insert
+           AFTER INSERT ON ParkingSpots
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'ParkingLot';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS ParkingSpots_version_delete
+           AFTER DELETE ON ParkingSpots
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'ParkingLot';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS ParkingUsage_version_entry
+           AFTER INSERT ON ParkingUsage
+           WHEN NEW.entry_time IS NOT NULL
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'ParkingLot';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS ParkingUsage_version_exit
+           AFTER UPDATE OF exit_time ON ParkingUsage
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'ParkingLot';
+           END""",
+    ]),
+    (7, "Catalog of the archived parking history", [
+        # One row per monthly archive database, see usage_archive.py. The ranges let the readers attach
+        # only the archives overlapping the period they query
+        """CREATE TABLE IF NOT EXISTS ArchivePartitions (
+           month TEXT PRIMARY KEY,
+           usages INTEGER NOT NULL DEFAULT 0,
+           payments INTEGER NOT NULL DEFAULT 0,
+           min_id INTEGER,
+           max_id INTEGER,
+           first_entry TIMESTAMP,
+           last_entry TIMESTAMP,
+           last_exit TIMESTAMP,
+           first_paid TIMESTAMP,
+           last_paid TIMESTAMP,
+           pending INTEGER NOT NULL DEFAULT 0,
+           archived_at TIMESTAMP)""",
+    ]),
+    (8, "Bookings of spots for a time window", [
+        # One row per booking, see bookings.py. The open ones are loaded into the BookingEngine on start
+        """CREATE TABLE IF NOT EXISTS Bookings (
+           id INTEGER PRIMARY KEY,
+           spot_id INTEGER NOT NULL,
+           registration_plate VARCHAR(10) NOT NULL,
+           start_time TIMESTAMP NOT NULL,
+           end_time TIMESTAMP NOT NULL,
+           status TEXT NOT NULL DEFAULT 'active'
+                  CHECK (status IN ('active', 'held', 'fulfilled', 'cancelled', 'expired')),
+           created_at TIMESTAMP NOT NULL DEFAULT current_timestamp,
+           FOREIGN KEY(spot_id) REFERENCES ParkingSpots(id))""",
+        """CREATE INDEX IF NOT EXISTS Bookings_spot_start
+           ON Bookings(spot_id, start_time)""",
+        # The bookings still to load on start, without reading the whole history
+        """CREATE INDEX IF NOT EXISTS Bookings_open
+           ON Bookings(end_time)
+           WHERE status IN ('active', 'held', 'fulfilled')""",
+        """CREATE INDEX IF NOT EXISTS Bookings_registration_plate
+           ON Bookings(registration_plate)""",
+        # A held booking makes its spot "booked" : holding it or releasing it without an entry changes the lot state
+        """CREATE TRIGGER IF NOT EXISTS Bookings_version_hold
+           AFTER UPDATE OF status ON Bookings
+           WHEN (NEW.status = 'held') <> (OLD.status = 'held') AND NEW.status <> 'fulfilled'
+           BEGIN
+               UPDATE DataVersions SET version = version + 1 WHERE name = 'ParkingLot';
+           END""",
+    ]),
+    (9, "Tariffs with time-of-day bands, weekend rates and daily caps", [
+        # See tariffs.py. A car is priced with the tariff named after its class ('standard' or 'premium')
+        """CREATE TABLE IF NOT EXISTS Tariffs (
+           name TEXT PRIMARY KEY,
+           daily_cap DECIMAL(7, 2),
+           utc_offset INTEGER NOT NULL DEFAULT 0)""",
+        # days is a bitmask of the days of the week the band applies to, bit 0 being Monday (127 : every day)
+        """CREATE TABLE IF NOT EXISTS TariffBands (
+           id INTEGER PRIMARY KEY,
+           tariff TEXT NOT NULL,
+           days INTEGER NOT NULL DEFAULT 127 CHECK (days BETWEEN 1 AND 127),
+           start_minute INTEGER NOT NULL CHECK (start_minute >= 0),
+           end_minute INTEGER NOT NULL CHECK (end_minute > start_minute AND end_minute <= 1440),
+           hourly_rate DECIMAL(5, 2) NOT NULL,
+           FOREIGN KEY(tariff) REFERENCES Tariffs(name))""",
+        """CREATE INDEX IF NOT EXISTS TariffBands_tariff
+           ON TariffBands(tariff)""",
+        # The flat hourly rates the gates charged until this version
+        """INSERT OR IGNORE INTO Tariffs (name)
+           VALUES ('standard'), ('premium')""",
+        """INSERT INTO TariffBands (tariff, start_minute, end_minute, hourly_rate)
+           VALUES ('standard', 0, 1440, 3.0), ('premium', 0, 1440, 2.0)""",
+        # Bumped on every change, so TariffCache knows when to compile the tariffs again
+        """INSERT OR IGNORE INTO DataVersions (name, version)
+           VALUES ('Tariffs', 0)""",
+        *(f"""CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+              AFTER {event} ON {table}
+              BEGIN
+                  UPDATE DataVersions SET version = version + 1 WHERE name = 'Tariffs';
+              END""" for table in ("Tariffs", "TariffBands") for event in ("INSERT", "UPDATE", "DELETE")),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
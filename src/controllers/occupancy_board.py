@@ -0,0 +1,221 @@
+"""
+Live occupancy of the parking lot in a memory-mapped file (parking_lot.db.board), for the entrance
+signage and the floor display boards : any number of local processes map the file and read the
+free spots without querying the database and without copying anything.
+
+Layout (little-endian) :
+    header : magic "PKEB", format, obsolete flag, sequence number, lot number, spots, floors, free spots
+    floors : one (floor_number, spots, free spots) entry per floor, in ascending floor order
+    spots  : one (id, floor_number, row_number, spot_number) entry per spot
+    status : one byte per spot, in the order of the spots table (ParkingSpot.FREE, OCCUPIED or BOOKED)
+
+OccupancyBoard (the writer, owned by ParkingController) updates the status byte and the free counters
+in place on every status change. The sequence number is a seqlock : it is odd while an update is
+being written and incremented again once it is done, so a reader retries when it changed during its
+read. Adding or removing a spot changes the layout : a new file replaces the old one, which is
+flagged as obsolete first so the readers know they have to map the new one.
+"""
+import mmap
+import os
+import struct
+from models import ParkingLot, ParkingSpot
+
+HEADER = struct.Struct("<4sHBxQIIII") # Magic, format, obsolete, sequence, lot number, spots, floors, free spots
+FLOOR = struct.Struct("<iII") # floor_number, spots, free spots
+SPOT = struct.Struct("<qiii") # id, floor_number, row_number, spot_number
+SEQUENCE = struct.Struct("<Q")
+COUNTER = struct.Struct("<I")
+MAGIC = b"PKEB"
+FORMAT = 1
+OBSOLETE_OFFSET = 6
+SEQUENCE_OFFSET = 8
+FREE_OFFSET = HEADER.size - COUNTER.size
+
+class OccupancyBoard:
+    """Publishes the occupancy of a ParkingLot in the board file of a database, see the module docstring"""
+
+    def __init__(self, db_path: str):
+        self.path = db_path + ".board"
+        self.sequence = 0
+        self._lot = None
+        self._map = None
+        self._index = {} # Spot id -> offset of its status byte
+        self._floor_offsets = {} # floor_number -> offset of its free counter
+
+    def publish(self, lot: ParkingLot) -> None:
+        """
+        PRE : None
+        POST : The board file holds the occupancy of lot, and is updated on every following change of lot
+        """
+        self.close()
+        self._lot = lot
+        self._build()
+        lot.add_listener(self._changed)
+
+    def close(self) -> None:
+        """Stops updating the board. The file is left in place, readers keep seeing the last state"""
+        if self._lot is not None:
+            self._lot.remove_listener(self._changed)
+            self._lot = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _build(self):
+        """Writes a new board file for the current layout of the lot and maps it"""
+        lot = self._lot
+        floors, positions, statuses = [], [], bytearray()
+        for floor_number in sorted(lot.floors):
+            floor = lot.floors[floor_number]
+            spots = free = 0
+            for row_number in sorted(floor.rows):
+                row = floor.rows[row_number]
+                for spot_number in sorted(row.spots):
+                    spot = row.spots[spot_number]
+                    positions.append((spot.id, floor_number, row_number, spot_number))
+                    status = ParkingSpot.ALLOWED_STATUSES.index(spot.status)
+                    statuses.append(status)
+                    spots += 1
+                    free += status == ParkingSpot.FREE
+            floors.append((floor_number, spots, free))
+        self._mark_obsolete()
+        self.sequence += 2 - self.sequence % 2 # Next even number
+        data = b"".join([HEADER.pack(MAGIC, FORMAT, 0, self.sequence, lot.lot_number, len(positions), len(floors), sum(f[2] for f in floors)),
+                         *(FLOOR.pack(*floor) for floor in floors),
+                         *(SPOT.pack(*position) for position in positions),
+                         statuses])
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, self.path)
+        with open(self.path, "r+b") as file:
+            self._map = mmap.mmap(file.fileno(), len(data))
+        floors_start = HEADER.size
+        status_start = floors_start + len(floors) * FLOOR.size + len(positions) * SPOT.size
+        self._floor_offsets = {floor[0]: floors_start + i * FLOOR.size + FLOOR.size - COUNTER.size for i, floor in enumerate(floors)}
+        self._index = {position[0]: status_start + i for i, position in enumerate(positions)}
+
+    def _mark_obsolete(self):
+        """
+        Flags the file about to be replaced, whichever process wrote it, so its readers map the new one.
+        Its sequence number is carried over : the readers never see it go backwards
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        try:
+            with open(self.path, "r+b") as file:
+                with mmap.mmap(file.fileno(), HEADER.size) as old:
+                    if old[:len(MAGIC)] == MAGIC:
+                        old[OBSOLETE_OFFSET] = 1
+                        self.sequence = max(self.sequence, SEQUENCE.unpack_from(old, SEQUENCE_OFFSET)[0] | 1)
+        except (OSError, ValueError):
+            pass # No board yet
+
+    def _changed(self, event: str, spot: ParkingSpot):
+        """Listener of the published lot"""
+        if event != "changed":
+            self._build() # Spot added or removed : new layout
+            return
+        offset = self._index[spot.id]
+        board = self._map
+        previous, status = board[offset], ParkingSpot.ALLOWED_STATUSES.index(spot.status)
+        if previous == status:
+            return
+        self.sequence += 1 # Odd : update in progress
+        SEQUENCE.pack_into(board, SEQUENCE_OFFSET, self.sequence)
+        board[offset] = status
+        if previous == ParkingSpot.FREE or status == ParkingSpot.FREE:
+            change = 1 if status == ParkingSpot.FREE else -1
+            for counter in (self._floor_offsets[spot.floor_number], FREE_OFFSET):
+                COUNTER.pack_into(board, counter, COUNTER.unpack_from(board, counter)[0] + change)
+        self.sequence += 1
+        SEQUENCE.pack_into(board, SEQUENCE_OFFSET, self.sequence)
+
+class OccupancyBoardReader:
+    """Reads the board file published for a database, from any process. Every read goes straight to the mapped file"""
+
+    def __init__(self, db_path: str):
+        """
+        PRE : db_path is the path of the database of the lot
+        RAISES : FileNotFoundError if no board was published yet, ValueError if the file isn't a board
+        """
+        self.path = db_path + ".board"
+        self._map = None
+        self._open()
+
+    def _open(self):
+        """Maps the current board file and reads its layout"""
+        self.close()
+        with open(self.path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format, obsolete, sequence, self.lot_number, spots, floors, free = HEADER.unpack_from(self._map)
+        if magic != MAGIC or format != FORMAT:
+            raise ValueError("Not an occupancy board file")
+        floors_start = HEADER.size
+        spots_start = floors_start + floors * FLOOR.size
+        self._status_start = spots_start + spots * SPOT.size
+        self._floors = {FLOOR.unpack_from(self._map, floors_start + i * FLOOR.size)[0]: floors_start + i * FLOOR.size for i in range(floors)}
+        self._spots_start, self._spots = spots_start, spots
+
+    def close(self) -> None:
+        """"""
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass # A view returned by statuses() is still alive, the mapping is released with it
+            self._map = None
+
+    def read(self, function):
+        """
+        PRE : function reads the mapped file (see free_count()), without side effects
+        POST : Calls function until its read wasn't interleaved with an update, mapping the new file if the layout changed
+        RETURNS : The result of the consistent call
+        """
+        while True:
+            if self._map[OBSOLETE_OFFSET]:
+                self._open()
+                continue
+            sequence = SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+            if sequence % 2:
+                continue # The writer is in the middle of an update
+            result = function()
+            if SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0] == sequence:
+                return result
+
+    @property
+    def sequence(self) -> int:
+        """Changes every time the board is updated"""
+        return self.read(lambda: SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0])
+
+    def free_count(self, floor_number: int = None) -> int:
+        """Returns the number of free spots of the lot, or of floor_number (0 if the floor doesn't exist)"""
+        if floor_number is None:
+            return self.read(lambda: COUNTER.unpack_from(self._map, FREE_OFFSET)[0])
+        def free():
+            offset = self._floors.get(floor_number)
+            return FLOOR.unpack_from(self._map, offset)[2] if offset is not None else 0
+        return self.read(free)
+
+    def floors(self) -> dict:
+        """Returns {floor_number: (free spots, spots)} for every floor"""
+        def floors():
+            floors = {}
+            for floor_number, offset in self._floors.items():
+                floor_number, spots, free = FLOOR.unpack_from(self._map, offset)
+                floors[floor_number] = (free, spots)
+            return floors
+        return self.read(floors)
+
+    def spots(self) -> list:
+        """Returns the (id, floor_number, row_number, spot_number) of every spot, in the order of statuses()"""
+        return self.read(lambda: list(SPOT.iter_unpack(self._map[self._spots_start:self._status_start])))
+
+    def statuses(self) -> memoryview:
+        """
+        Returns a view of the status bytes (ParkingSpot.FREE, OCCUPIED or BOOKED), in the order of spots(), without copying them.
+        The view follows the live updates : use read() around the accesses needing a consistent state
+        """
+        self.read(lambda: None) # Maps the current file first
+        return memoryview(self._map)[self._status_start:self._status_start + self._spots]
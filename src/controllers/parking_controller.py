@@ -1,37 +1,160 @@
+import sqlite3
+import threading
+import time
 from .database_controller import DatabaseController
+from .lot_snapshot import LotSnapshot
+from .occupancy_board import OccupancyBoard
+from bookings import CANCELLED, EXPIRED, HELD, HOLD, OPEN_STATUSES, Booking, BookingEngine
 from models import ParkingLot, PremiumCar, StandardCar
 
+class ExitRecordError(Exception):
+    """Raised when the exit of a car can't be recorded : the database holds no open session for its spot, or its tariff is missing"""
+
 class ParkingController:
-    def __init__(self, root=None, update_db: bool = True):
+    """
+    Controller of one parking lot, shared by every gate of the lot.
+
+    Concurrency : the entries and exits (new_entry(), new_entry_auto(), new_exit(), new_exit_by_plate()) may be called
+    by many threads at once. A spot is checked, changed and its database write submitted while holding the lock of the
+    spot (see ParkingLot.spot_lock()), so two gates can't both take or free the same spot and every change of the lot
+    gets exactly one write. self.bookings is guarded by a lock of its own, always taken before the lock of a spot.
+    The bulk methods and checkpoint() freeze the whole lot (see ParkingLot.frozen()). fetch_parking_data() replaces
+    the lot : it must not run while the gates do.
+    In the database, the open session index of ParkingUsage and the overlap check of new_booking() refuse
+    a second session or booking of the same spot made by another process
+    """
+
+    def __init__(self, root=None, update_db: bool = True, db: DatabaseController = None, write_queue=None, lot_number: int = 1, snapshot: bool = True, board: bool = True):
         self.root = root
         self.update_db = update_db # Set to false when
+        self.lot_number = lot_number # db is the shard of this lot (see LotRegistry)
+        self.db = db if db is not None else DatabaseController() # Shared by every method, its connections are pooled
+        # Writes are made by the WriteQueue of the application when there is one, synchronously otherwise
+        self.write_queue = write_queue if write_queue is not None else getattr(root, "write_queue", None)
+        # The lot is restored from a snapshot of the previous run when it is still up to date (see lot_snapshot.py)
+        self.snapshot = LotSnapshot(self.db.path) if snapshot and self.db.path != ":memory:" else None
+        # Live occupancy for the display boards, read by other processes with OccupancyBoardReader
+        self.board = OccupancyBoard(self.db.path) if board and self.db.path != ":memory:" else None
         self.parking_lot = None
+        self.bookings = None # Open bookings of the lot (see bookings.py), loaded along with the spots
+        self._bookings_lock = threading.RLock() # Guards self.bookings, see the class docstring
         self.fetch_parking_data() # Updates self.parking_lot with the existing spots
 
-    def fetch_parking_data(self):
+    def fetch_parking_data(self, use_snapshot: bool = True):
         """Retrieves all the spots stored in the database and orders them inside self.parking_lot
-           Updates self.parking_lot as a ParkingLot object containing all the spots ordered by floor, row, and number"""
-        db = DatabaseController()
-        self.parking_lot = ParkingLot(1) # Empty ParkingLot of id 1
+           Updates self.parking_lot as a ParkingLot object containing all the spots ordered by floor, row, and number
+           The lot is restored from self.snapshot when it matches the database, unless use_snapshot is False (the lot
+           is known to have diverged from the database, e.g. after a failed write). Otherwise the spots, their current
+           occupant and its premium status are fetched with a single query, and a new snapshot is written.
+           The occupancy of the lot is then published on self.board, and the open bookings are loaded in self.bookings"""
+        self.parking_lot = ParkingLot(self.lot_number) # Empty ParkingLot
+        self.bookings = BookingEngine()
         if not self.update_db:
             return
-        for id, spot_number, row_number, floor_number in db.fetch_all_parking_spots():
-            # For every spot found in the database, create the a ParkingSpot object inside its row and floor
-            self.parking_lot.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
-            
-            spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number] # Fetches the spot from self.parking_lot
-            registration_plate, status = self.check_spot_status(id) # Verifies if a car is occupying the spot
-            if status != "free":
-                # Sets the occupant only if it exists
-                car_class = PremiumCar if db.is_premium(registration_plate) else StandardCar
-                spot.linked_car = car_class(registration_plate)
-            spot.status = status
+        self.flush_writes() # The queued writes must be visible to the query
+        self._restore_or_hydrate(use_snapshot)
+        if self.board is not None:
+            self.board.publish(self.parking_lot) # Kept up to date on every status change from now on
+        self._load_bookings()
+
+    def _restore_or_hydrate(self, use_snapshot: bool = True):
+        """Fills self.parking_lot from the snapshot, or from the database if the snapshot is missing, stale or not to be used"""
+        if self.snapshot is not None:
+            self.snapshot.detach()
+        if self.snapshot is not None and use_snapshot:
+            version = self.db.fetch_data_version("ParkingLot")
+            lot = self.snapshot.restore(self.lot_number, version)
+            if lot is not None:
+                self.parking_lot = lot
+                self.snapshot.attach(lot, version)
+                self.checkpoint() # Folds a long journal into a new snapshot
+                return
+        version = self.db.fetch_data_version("ParkingLot")
+        # Creates a ParkingSpot object for every spot found in the database, inside its row and floor, with its occupant if it exists
+        spots = self.parking_lot.load_spots(self.db.fetch_parking_lot_state())
+        for spot_id, registration_plate in self.db.fetch_reserved_spots(): # Spots held for a booking whose window started
+            spot = spots.get(spot_id)
+            if spot is not None and spot.status == "free":
+                spot.book(registration_plate, True)
+        if self.snapshot is not None and self.db.fetch_data_version("ParkingLot") == version:
+            # Only when no entry or exit was committed while the spots were read, the lot would not match the version otherwise
+            self.snapshot.save(self.parking_lot, version)
+            self.snapshot.attach(self.parking_lot, version)
+
+    def _load_bookings(self):
+        """Indexes the open bookings of the database in self.bookings, then applies their timers already due"""
+        rows = self.db.fetch_open_bookings()
+        if not rows:
+            return
+        spots = {spot.id: spot for spot in self.parking_lot.iter_spots()}
+        self.bookings.load(Booking(booking_id, spots[spot_id], registration_plate, start, end, status)
+                           for booking_id, spot_id, registration_plate, start, end, status in rows if spot_id in spots)
+        self.process_bookings()
+
+    def checkpoint(self, force: bool = False) -> bool:
+        """
+        PRE : None
+        POST : Writes a new snapshot of self.parking_lot and empties the journal when the journal is long enough (or as soon
+               as it isn't empty if force), once the queued writes are committed, and only if the database holds
+               no change that self.parking_lot doesn't know about
+        RETURNS : True if a snapshot was written
+        """
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version is None or not (snapshot.due or (force and snapshot.journal_length)):
+            return False
+        with self.parking_lot.frozen(): # Every change of the lot has its write submitted, and none happens until it is saved
+            self.flush_writes()
+            if self.db.fetch_data_version("ParkingLot") != snapshot.version:
+                return False
+            snapshot.save(self.parking_lot, snapshot.version)
+            return True
+
+    def _write(self, write, *args) -> "Future":
+        """
+        PRE : write is a function making database calls, args its arguments
+        POST : Queues write(*args) on self.write_queue, or runs it right away if there is none
+        RETURNS : A Future resolved with the result of write (already resolved without a queue)
+        RAISES : Without a queue, the exceptions raised by write
+        """
+        if self.write_queue is not None:
+            return self.write_queue.submit(write, *args)
+        from concurrent.futures import Future # Only loaded once a write is made, concurrent.futures pulls in logging
+        future = Future()
+        future.set_result(write(*args))
+        return future
+
+    def flush_writes(self, timeout: float = None) -> bool:
+        """Waits until every queued write is committed. Returns False if the timeout expired first"""
+        return self.write_queue is None or self.write_queue.flush(timeout)
+
+    def _exit_session(self, spot_id: int, tariff: str, open_usages: dict):
+        """
+        PRE : open_usages is the dict returned by DatabaseController.fetch_open_usages() for spot_id
+        RETURNS : The open session (usage_id, entry_time, now) of spot_id and the Tariff named tariff (see tariffs.py)
+        RAISES : ExitRecordError if the database holds no open session for spot_id or no tariff named tariff
+        """
+        open_usage = open_usages.get(spot_id)
+        if open_usage is None:
+            raise ExitRecordError(f"No open session of spot {spot_id} in the database")
+        try:
+            return open_usage, self.db.tariffs.get(tariff)
+        except KeyError as e:
+            raise ExitRecordError(e.args[0]) from None
+
+    def _record_exit(self, spot_id: int, registration_plate: str, tariff: str):
+        """Stores the payment and the exit time of the car leaving spot_id, in one transaction.
+           The session is priced with the tariff named tariff (see tariffs.py)"""
+        with self.db.transaction():
+            # The entry's id and time, and the exit time
+            (usage_id, entry_time, now), tariff = self._exit_session(spot_id, tariff, self.db.fetch_open_usages([spot_id]))
+            amount = tariff.price(entry_time, now)
+            self.db.new_payment(usage_id, registration_plate, amount) # Stores the payment inside the database
+            self.db.new_exit(spot_id, registration_plate) # Sets the exit time in the database
 
     def check_spot_status(self, spot_id: int):
         """Queries the database to verify the current status of the spot
            Returns the status : free / occupied and the registration plate of the last (or current) user"""
-        db = DatabaseController()
-        spot_usage = db.fetch_last_spot_usage(spot_id) # Retrieves the last time the spot was used. None if no record was found
+        spot_usage = self.db.fetch_last_spot_usage(spot_id) # Retrieves the last time the spot was used. None if no record was found
         if spot_usage is None:
             return None, "free" # Spot is free if it was never used
         registration_plate, entry_time, exit_time = spot_usage
@@ -39,25 +162,30 @@ class ParkingController:
         return registration_plate, status
 
     def create_new_spot(self, floor_number: int, row_number: int, spot_number: int) -> str:
-        db = DatabaseController()
         try:
             # If you can access the spot without error, it means it shouldn't be created
             self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
             return "[Error] This spot already exists"
         except KeyError:
-            id = db.create_parking_spot(floor_number, row_number, spot_number)
-            print(id)
+            # Waits for the write, the id of the new spot is needed. The db method returns the RETURNING row
+            id = self._write(self.db.create_parking_spot, floor_number, row_number, spot_number).result()[0]
             self.parking_lot.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
             return f"[SPOT CREATED] The parking spot at floor {floor_number} - row {row_number} - spot {spot_number} was successfully created"
 
     def delete_spot(self, floor_number: int, row_number: int, spot_number: int) -> str:
-        db = DatabaseController()
         try:
-            self.parking_lot.remove_spot({"spot_number": spot_number, "row_number": row_number, "floor_number": floor_number}) #Delete spot if it exists, raises KeyError if not 
-            db.delete_parking_spot(floor_number, row_number, spot_number)
+            spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
+            with self._bookings_lock: # Held until the spot is removed, so it can't be booked in between
+                if any(booking.status in OPEN_STATUSES for booking in self.bookings.bookings_of_spot(spot.id)):
+                    return "[Error] This spot is booked, cancel its bookings first"
+                self.parking_lot.remove_spot({"spot_number": spot_number, "row_number": row_number, "floor_number": floor_number}) #Delete spot if it exists, raises ValueError if not
+                self._write(self.db.delete_parking_spot, floor_number, row_number, spot_number)
             return f"[SPOT DELETED] The parking spot at floor {floor_number} - row {row_number} - spot {spot_number} was successfully deleted"
         except KeyError as e:
             return f"[Error] This spot does not exist : {e}"
+        except ValueError:
+            # Error raised by remove_spot() when another thread deleted the spot first
+            return "[Error] This spot does not exist"
 
     def new_entry(self, floor_number: int, row_number: int, spot_number: int, registration_plate: str) -> str:
         """
@@ -65,90 +193,373 @@ class ParkingController:
         POST : Le statut de l'emplacement est occupé, la voiture liée à l'emplacement correspond à la plaque d'immatriculation, et la base de données contient une nouvelle entrée
         RETURNS : Un str contenant un message d'erreur si l'emplacement est déjà occupé où s'il n'existe pas. Un str vide si tout se passe comme prévu
         """
-        db = DatabaseController()
         try:
             spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
-            if self.update_db:
-                # This parameter is set to False when running unit tests
-                spot.enter(registration_plate, db.is_premium(registration_plate)) # Uses ParkingSpot's method to update linked_car and status IF POSSIBLE
-                db.new_entry_visitor(spot.id, registration_plate) # Creates an entry inside the database
-            else:
-                # If running tests
-                spot.enter(registration_plate, False)
+            self._enter(spot, registration_plate)
             return f"[NEW ENTRY] Car {registration_plate} was successfully parked at floor {floor_number} - row {row_number} - spot {spot_number}"
-        except AssertionError:
-            # Error raised by spot.enter()
+        except (AssertionError, sqlite3.IntegrityError):
+            # Error raised by spot.enter(), or by the open session index when another process took the spot first
             return "[Error] This spot is already occupied"
         except KeyError:
             # Error raised by trying to access a spot that isn't contained inside self.parking_lot
             return "[Error] This spot does not exist"
 
+    def _enter(self, spot, registration_plate: str):
+        """
+        PRE : spot is a spot of self.parking_lot
+        POST : Parks registration_plate on spot (see ParkingSpot.enter()) and submits the write of the entry, both while holding
+               the lock of spot. The booking of the car for spot, if it arrives for one, is fulfilled
+        RAISES : AssertionError if the spot can't be taken. Without a write queue, the exceptions of the write, the spot is then left unchanged
+        """
+        if not self.update_db:
+            spot.enter(registration_plate, False) # This parameter is set to False when running unit tests
+            return
+        is_premium = self.db.is_premium(registration_plate)
+        if self._arriving_booking(spot, registration_plate) is None:
+            with spot.lock():
+                if spot.status != "booked": # Otherwise held for a booking since it was looked up : entered along with the bookings below
+                    self._enter_locked(spot, registration_plate, is_premium, None)
+                    return
+        with self._bookings_lock:
+            booking = self._arriving_booking(spot, registration_plate) # Looked up again, it may have been closed meanwhile
+            with spot.lock():
+                self._enter_locked(spot, registration_plate, is_premium, booking)
+            if booking is not None:
+                self.bookings.fulfil(booking)
+
+    def _enter_locked(self, spot, registration_plate: str, is_premium: bool, booking):
+        """_enter() with the lock of spot held : the entry is undone if its write fails right away"""
+        was_held = spot.status == "booked"
+        spot.enter(registration_plate, is_premium) # Uses ParkingSpot's method to update linked_car and status IF POSSIBLE
+        try:
+            if booking is not None:
+                self._write(self.db.new_entry_booking, spot.id, registration_plate, booking.id) # Entry and fulfilled booking
+            else:
+                self._write(self.db.new_entry_visitor, spot.id, registration_plate) # Creates an entry inside the database
+        except BaseException:
+            spot.exit(registration_plate)
+            if was_held:
+                spot.book(registration_plate, True)
+            raise
+
     def new_exit(self, floor_number: int, row_number: int, spot_number: int, registration_plate: str) -> str:
         """
         PRE : floor_number, row_number et spot_number sont des entiers désignant la place de parking, registration_plate est la plaque d'immatriculation du véhicule sortant
         POST : Le statut de l'emplacement est libre, aucune voiture n'est liée à l'emplacement, l'entrée de la base de donnée est marquée comme cloturée
         RETURNS : Un str contenant un message d'erreur si l'emplacement n'est pas occupé, si la plaque d'immatriculation ne correspond pas avec celle enregistrée dans ParkingSpot.linked_car.registration_plate, ou si l'emplacement n'existe pas. Un str vide si tout se passe comme prévu
         """
-        db = DatabaseController()
         try:
             spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
-            if self.update_db:
-                # This parameter is set to False when running unit tests
-                usage_id, time_spent = db.fetch_last_usage_time(spot.id) # Fetches the entry's id and calculates the time spent occupying the spot
-                amount = spot.pay(registration_plate, time_spent) # Calculates the amount to be paid based on the car's HOURLY_RATE
-                db.new_payment(usage_id, registration_plate, amount) # Stores the payment inside the database
-            spot.exit(registration_plate) # Uses ParkingSpot's method to update linked_car and status IF POSSIBLE
-            if self.update_db:
-                db.new_exit(spot.id, registration_plate) # Sets the exit time in the database
+            with spot.lock(): # The check, the write and the exit are atomic : a car can't leave twice
+                if self.update_db:
+                    # This parameter is set to False when running unit tests
+                    spot.pay(registration_plate, 0) # Raises if the spot isn't occupied or if the plates don't match
+                    # The amount is based on the car's tariff and on the entry time stored in the database.
+                    # Waited for even with a write queue : if the exit can't be recorded, the car is left on its spot
+                    self._write(self._record_exit, spot.id, registration_plate, spot.linked_car.TARIFF).result()
+                spot.exit(registration_plate) # Uses ParkingSpot's method to update linked_car and status IF POSSIBLE
             return f"[NEW EXIT] Car {registration_plate} was successfully parked out of floor {floor_number} - row {row_number} - spot {spot_number}"
         except (AssertionError, TypeError):
             #Error raised by spot.exit()
             return "[Error] This spot is unoccupied or the registration plates don't match"
+        except ExitRecordError as e:
+            # The database doesn't match the lot : the car is left on its spot
+            return f"[Error] The exit couldn't be recorded : {e}"
         except KeyError:
             # Error raised by trying to access a spot that isn't contained inside self.parking_lot
             return "[Error] This spot does not exist"
 
+    def new_exit_by_plate(self, registration_plate: str) -> str:
+        """
+        PRE : registration_plate est la plaque d'immatriculation du véhicule sortant (lue par la caméra de la barrière)
+        POST : Identique à new_exit(), l'emplacement est retrouvé grâce à l'index des plaques de self.parking_lot
+        RETURNS : Un str contenant un message d'erreur si le véhicule n'est garé sur aucun emplacement, sinon le message de new_exit()
+        """
+        spot = self.parking_lot.find_car(registration_plate)
+        if spot is None or spot.status != "occupied":
+            return f"[Error] Car {registration_plate} is not parked in this parking lot"
+        return self.new_exit(spot.floor_number, spot.row_number, spot.spot_number, registration_plate)
+
     def get_available_spots(self):
         """
         Récupère toutes les places de parking disponibles (libres).
         Retourne :
-            list : Une liste de toutes les places de parking actuellement libres.
+            list : Une liste de toutes les places de parking actuellement libres, sous forme de tuples
+                   (id, spot_number, row_number, floor_number), de la plus proche à la plus éloignée de l'entrée.
+                   Les places sont lues dans self.parking_lot, sans requête à la base de données
         """
-        db = DatabaseController()
-        available_spots = []
-        try:
-            for spot in db.fetch_all_parking_spots():
-                if self.check_spot_status(spot[0]) == "free":
-                    available_spots.append(spot)
-        except Exception as e:
-            print(f"[Error] Unable to retrieve available spots: {e}")
-        return available_spots
+        return [(spot.id, spot.spot_number, spot.row_number, spot.floor_number) for spot in self.parking_lot.free_spots()]
 
-    def reserve_spot(self, spot_id, registration_plate):
+    def new_entry_auto(self, registration_plate: str) -> str:
         """
-        Réserve une place de parking pour un utilisateur spécifique.
-        Paramètres :
-            spot_id (int) : L'identifiant unique de la place à réserver.
-            registration_plate (str) : La plaque d'immatriculation du véhicule de l'utilisateur.
+        PRE : registration_plate est la plaque d'immatriculation du véhicule entrant
+        POST : Identique à new_entry(), sur l'emplacement réservé par le véhicule s'il arrive pour une réservation (voir BookingEngine.arriving())
+               et que cet emplacement est disponible, sinon sur l'emplacement libre le plus proche de l'entrée (voir ParkingLot.next_free_spot())
+               Si une autre barrière prend l'emplacement choisi entre-temps, l'emplacement libre suivant est essayé
+        RETURNS : Un str contenant un message d'erreur si le parking est complet, sinon le message de new_entry()
         """
-        db = DatabaseController()
-        try:
-            db.new_booking(spot_id, registration_plate)
-        except Exception as e:
-            print(f"[Error] Unable to reserve spot {spot_id} for {registration_plate}: {e}")
+        with self._bookings_lock:
+            booking = self.bookings.arriving(registration_plate, time.time())
+            if booking is not None and (booking.status == HELD or booking.spot.status == "free"):
+                spot = booking.spot # Booked for the car, or still free if it arrives early
+                return self.new_entry(spot.floor_number, spot.row_number, spot.spot_number, registration_plate)
+        while (spot := self.parking_lot.next_free_spot()) is not None:
+            try:
+                self._enter(spot, registration_plate)
+            except AssertionError:
+                continue # Taken by another gate since it was picked : it isn't free anymore, so the next one is picked
+            except sqlite3.IntegrityError:
+                return "[Error] This spot is already occupied" # Taken by another process, still free in this lot
+            return f"[NEW ENTRY] Car {registration_plate} was successfully parked at floor {spot.floor_number} - row {spot.row_number} - spot {spot.spot_number}"
+        return "[Error] The parking lot is full"
 
-    def cancel_reservation(self, spot_id, registration_plate):
+    def new_entries_bulk(self, entries) -> list:
         """
-        Annule une réservation pour une place de parking spécifique.
-        Paramètres :
-            spot_id (int) : L'identifiant unique de la place réservée.
-            registration_plate (str) : La plaque d'immatriculation du véhicule de l'utilisateur.
+        PRE : entries est une liste de tuples (floor_number, row_number, spot_number, registration_plate), dans l'ordre où les véhicules sont entrés
+        POST : Chaque entrée valide est appliquée à self.parking_lot comme par new_entry(), puis toutes les lignes ParkingUsage
+               sont écrites avec un seul executemany, dans une seule transaction.
+               Si l'écriture échoue, self.parking_lot est remis dans son état initial et l'exception est propagée.
+               Les écritures en attente dans self.write_queue sont d'abord attendues, le lot est ensuite écrit directement
+        RETURNS : Une liste contenant, pour chaque entrée, le message que new_entry() aurait renvoyé
         """
-        db = DatabaseController()
-        try:
-            db.cancel_booking(spot_id, registration_plate)
-        except Exception as e:
-            print(f"[Error] Unable to cancel reservation for spot {spot_id} and {registration_plate}: {e}")
+        self.flush_writes()
+        premium = self.db.fetch_premium_plates(entry[3] for entry in entries) if self.update_db else set()
+        with self._bookings_lock, self.parking_lot.frozen(): # No gate changes the lot until the batch is written
+            return self._new_entries_bulk(entries, premium)
+
+    def _new_entries_bulk(self, entries, premium: set) -> list:
+        """new_entries_bulk() once the lot is frozen"""
+        results, applied, fulfilled = [], [], []
+        for floor_number, row_number, spot_number, registration_plate in entries:
+            try:
+                spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
+                booking = self._arriving_booking(spot, registration_plate)
+                spot.enter(registration_plate, registration_plate in premium) # Validated against the lot, in order, so a spot can't be taken twice
+                applied.append((spot, registration_plate))
+                if booking is not None:
+                    fulfilled.append(booking)
+                results.append(f"[NEW ENTRY] Car {registration_plate} was successfully parked at floor {floor_number} - row {row_number} - spot {spot_number}")
+            except AssertionError:
+                results.append("[Error] This spot is already occupied")
+            except KeyError:
+                results.append("[Error] This spot does not exist")
+        if self.update_db and applied:
+            try:
+                with self.db.transaction():
+                    self.db.new_entries_bulk([(spot.id, registration_plate) for spot, registration_plate in applied])
+                    self.db.fulfil_bookings([booking.id for booking in fulfilled])
+            except BaseException:
+                for spot, registration_plate in reversed(applied):
+                    spot.exit(registration_plate)
+                for booking in fulfilled:
+                    if booking.status == HELD:
+                        booking.spot.book(booking.registration_plate, True)
+                raise
+            for booking in fulfilled:
+                self.bookings.fulfil(booking)
+        return results
+
+    def new_exits_bulk(self, exits) -> list:
+        """
+        PRE : exits est une liste de tuples (floor_number, row_number, spot_number, registration_plate), dans l'ordre où les véhicules sont sortis
+        POST : Chaque sortie valide est appliquée à self.parking_lot comme par new_exit(). Les sessions ouvertes sont lues en une requête,
+               tarifées par lot avec Tariff.price_many() (un appel par tarif, voir tariffs.py),
+               puis tous les paiements et toutes les heures de sortie sont écrits avec executemany, dans une seule transaction.
+               Une sortie sans session ouverte ou sans tarif dans la base est refusée seule, la voiture reste sur son emplacement.
+               Si l'écriture échoue, self.parking_lot est remis dans son état initial et l'exception est propagée.
+               Les écritures en attente dans self.write_queue sont d'abord attendues, pour que leurs sessions soient lues
+        RETURNS : Une liste contenant, pour chaque sortie, le message que new_exit() aurait renvoyé
+        """
+        open_usages = {}
+        self.flush_writes()
+        if self.update_db:
+            spot_ids = set()
+            for floor_number, row_number, spot_number, registration_plate in exits:
+                try:
+                    spot_ids.add(self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number].id)
+                except KeyError:
+                    pass # Reported as a missing spot below
+        with self.parking_lot.frozen(): # No gate changes the lot until the batch is written
+            if self.update_db:
+                open_usages = self.db.fetch_open_usages(spot_ids) # Read once the lot is frozen, so they match it
+            return self._new_exits_bulk(exits, open_usages)
+
+    def _new_exits_bulk(self, exits, open_usages: dict) -> list:
+        """new_exits_bulk() once the lot is frozen"""
+        results, applied, sessions = [], [], {} # Tariff -> sessions it prices
+        for floor_number, row_number, spot_number, registration_plate in exits:
+            try:
+                spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
+                linked_car = spot.linked_car
+                if self.update_db:
+                    spot.pay(registration_plate, 0) # Raises like new_exit() if the spot is free or the plates don't match
+                    (usage_id, entry_time, now), tariff = self._exit_session(spot.id, linked_car.TARIFF, open_usages)
+                spot.exit(registration_plate)
+                applied.append((spot, linked_car))
+                if self.update_db:
+                    sessions.setdefault(tariff, []).append((usage_id, registration_plate, entry_time, now))
+                results.append(f"[NEW EXIT] Car {registration_plate} was successfully parked out of floor {floor_number} - row {row_number} - spot {spot_number}")
+            except (AssertionError, TypeError):
+                results.append("[Error] This spot is unoccupied or the registration plates don't match")
+            except ExitRecordError as e:
+                results.append(f"[Error] The exit couldn't be recorded : {e}") # Only this car is left on its spot
+            except KeyError:
+                results.append("[Error] This spot does not exist")
+        if self.update_db and applied:
+            try:
+                payments = []
+                for tariff, tariff_sessions in sessions.items():
+                    usage_ids, plates, entry_times, exit_times = zip(*tariff_sessions)
+                    payments.extend(zip(usage_ids, plates, tariff.price_many(entry_times, exit_times)))
+                with self.db.transaction():
+                    self.db.new_payments_bulk(payments)
+                    self.db.new_exits_bulk([(spot.id, linked_car.registration_plate) for spot, linked_car in applied])
+            except BaseException:
+                for spot, linked_car in reversed(applied):
+                    spot.linked_car = linked_car
+                    spot.status = "occupied"
+                raise
+        return results
+
+    def reserve_spot(self, floor_number: int, row_number: int, spot_number: int, registration_plate: str, start: int, end: int) -> str:
+        """
+        PRE : floor_number, row_number et spot_number désignent la place de parking, registration_plate est la plaque d'un abonné premium,
+              start et end sont les timestamps UNIX du début et de la fin de la réservation
+        POST : La réservation est enregistrée dans la base de données et dans self.bookings. Si elle a déjà commencé,
+               la place est bookée pour le véhicule (voir process_bookings())
+        RETURNS : Un str contenant un message d'erreur si la place n'existe pas, si le véhicule n'est pas premium, si la période est invalide
+                  ou si la place est déjà réservée (ou occupée, pour une réservation qui commence maintenant), sinon un message de confirmation
+        """
+        error = self._booking_error(registration_plate, start, end)
+        if error is not None:
+            return error
+        with self._bookings_lock: # Also held by delete_spot() : the spot can't be deleted until it is booked
+            try:
+                spot = self.parking_lot.floors[floor_number].rows[row_number].spots[spot_number]
+            except KeyError:
+                return "[Error] This spot does not exist"
+            if self.bookings.conflict(spot.id, start, end) is not None:
+                return "[Error] This spot is already booked for this period"
+            if self._starts_soon(start) and spot.status != "free":
+                return "[Error] This spot is already occupied"
+            return self._book(spot, registration_plate, int(start), int(end))
+
+    def reserve_any_spot(self, registration_plate: str, start: int, end: int) -> str:
+        """
+        PRE : registration_plate est la plaque d'un abonné premium, start et end sont les timestamps UNIX du début et de la fin de la réservation
+        POST : Identique à reserve_spot(), sur la place la plus proche de l'entrée qui n'a aucune réservation pendant cette période
+               (et qui est libre, pour une réservation qui commence maintenant)
+        RETURNS : Un str contenant un message d'erreur si aucune place n'est disponible, sinon le message de reserve_spot()
+        """
+        error = self._booking_error(registration_plate, start, end)
+        if error is not None:
+            return error
+        spots = self.parking_lot.iter_spots()
+        if self._starts_soon(start):
+            spots = (spot for spot in spots if spot.status == "free")
+        with self._bookings_lock:
+            spot = self.bookings.find_free_spot(spots, start, end)
+            if spot is None:
+                return "[Error] No spot is available for this period"
+            return self._book(spot, registration_plate, int(start), int(end))
+
+    def cancel_reservation(self, booking_id: int, registration_plate: str) -> str:
+        """
+        PRE : booking_id est l'identifiant d'une réservation, registration_plate la plaque du véhicule qui l'a faite
+        POST : La réservation est annulée. Si la place était bookée pour elle, elle redevient libre
+        RETURNS : Un str contenant un message d'erreur si la réservation n'existe pas, est terminée ou appartient à un autre véhicule,
+                  sinon un message de confirmation
+        """
+        with self._bookings_lock:
+            booking = self.bookings.get(booking_id)
+            if booking is None or booking.status not in OPEN_STATUSES or booking.registration_plate != registration_plate:
+                return f"[Error] Car {registration_plate} has no open booking {booking_id}"
+            self._release(booking, CANCELLED)
+        return f"[BOOKING CANCELLED] Booking {booking_id} of car {registration_plate} was cancelled"
+
+    def process_bookings(self, now: float = None) -> list:
+        """
+        PRE : now est un timestamp UNIX, l'heure actuelle par défaut
+        POST : Applique les timers de self.bookings échus à now : la place d'une réservation qui commence est bookée pour le véhicule
+               (ou une autre place libre si elle est encore occupée, la réservation est annulée s'il n'y en a aucune), et une réservation
+               dont le véhicule n'est pas arrivé NO_SHOW_GRACE secondes après le début expire, sa place redevient libre.
+               Appelée régulièrement (gate_server.py), son coût ne dépend que du nombre de timers échus
+        RETURNS : La liste des messages décrivant chaque changement
+        """
+        now = time.time() if now is None else now
+        messages = []
+        with self._bookings_lock:
+            for event, booking in self.bookings.due(now):
+                if event == HOLD:
+                    messages.append(self._hold(booking, now))
+                else:
+                    self._release(booking, EXPIRED)
+                    messages.append(f"[BOOKING EXPIRED] Car {booking.registration_plate} didn't arrive for booking {booking.id}")
+        return messages
+
+    def _booking_error(self, registration_plate: str, start: int, end: int):
+        """Returns the error message of an invalid booking request, None if it is valid"""
+        if end <= start or end <= time.time():
+            return "[Error] A booking must end after it starts, in the future"
+        if not self.db.is_premium(registration_plate):
+            return "[Error] Only premium subscribers can book a spot"
+        return None
+
+    def _starts_soon(self, start: int) -> bool:
+        """True if a booking starting at start may be used right away : its spot must be free now"""
+        return start - self.bookings.EARLY_ARRIVAL <= time.time()
+
+    def _book(self, spot, registration_plate: str, start: int, end: int) -> str:
+        """Stores the booking of spot (free of bookings from start to end), then holds it right away if it already started"""
+        booking_id = self._write(self.db.new_booking, spot.id, registration_plate, start, end).result() # Its id is needed
+        if booking_id is None:
+            return "[Error] This spot is already booked for this period" # By another process
+        self.bookings.add(Booking(booking_id, spot, registration_plate, start, end))
+        self.process_bookings()
+        from reports import format_timestamp # Only loaded once a booking is made
+        return (f"[NEW BOOKING] Car {registration_plate} booked floor {spot.floor_number} - row {spot.row_number} - spot {spot.spot_number} "
+                f"from {format_timestamp(start)} to {format_timestamp(end)} (booking {booking_id})")
+
+    def _hold(self, booking: Booking, now: float) -> str:
+        """Books the spot of booking for its customer, once its window started"""
+        registration_plate = booking.registration_plate
+        if self.parking_lot.find_car(registration_plate) is not None:
+            # Already parked (or holding another spot) : a car can only be linked to one spot of the lot
+            self._release(booking, CANCELLED)
+            return f"[Error] Booking {booking.id} was cancelled : car {registration_plate} is already in the parking lot"
+        spot, moved = booking.spot, None
+        while True:
+            if spot.status == "free":
+                try:
+                    spot.book(registration_plate, True)
+                    break
+                except AssertionError:
+                    pass # Taken by a gate since it was checked
+            # Still occupied by a car that overstayed : any spot free now and without a booking until the end of the window
+            spot = self.bookings.find_free_spot((s for s in self.parking_lot.iter_spots() if s.status == "free"), max(now, booking.start), booking.end)
+            if spot is None:
+                self._release(booking, CANCELLED)
+                return f"[Error] Booking {booking.id} of car {registration_plate} was cancelled : no spot is free"
+            self.bookings.move(booking, spot)
+            moved = spot.id
+        booking.status = HELD
+        self._write(self.db.update_booking, booking.id, HELD, moved)
+        return f"[BOOKING HELD] Floor {spot.floor_number} - row {spot.row_number} - spot {spot.spot_number} is held for car {registration_plate}"
+
+    def _release(self, booking: Booking, status: str):
+        """Closes booking with status (CANCELLED, EXPIRED), and frees its spot if it was booked for it"""
+        spot = booking.spot
+        with spot.lock():
+            if booking.status == HELD and spot.status == "booked" and spot.registration_plate == booking.registration_plate:
+                spot.unbook(booking.registration_plate)
+        self._write(self.db.update_booking, booking.id, status)
+        self.bookings.close(booking, status)
+
+    def _arriving_booking(self, spot, registration_plate: str):
+        """Returns the open booking of registration_plate for spot the car may park for now, None if there is none"""
+        with self._bookings_lock:
+            booking = self.bookings.arriving(registration_plate, time.time())
+        return booking if booking is not None and booking.spot is spot else None
 
     def calculate_fee(self, spot_id):
         """
@@ -158,13 +569,13 @@ class ParkingController:
         Retourne :
             nombre réel (float) : Les frais de stationnement calculés, ou 0.0 si une erreur survient.
         """
-        db = DatabaseController()
         try:
-            usage = db.fetch_last_usage_time(spot_id)
-            if usage and usage[1] is not None:
-                time_spent = usage[1]  # Durée en heures
-                fee = time_spent * 5  # Exemple : 5 euros par heure
-                return round(fee, 2)
+            open_usage = self.db.fetch_open_usages([spot_id]).get(spot_id)
+            if open_usage is not None:
+                usage_id, entry_time, now = open_usage
+                registration_plate = self.db.fetch_last_spot_usage(spot_id)[0]
+                car_class = PremiumCar if self.db.is_premium(registration_plate) else StandardCar
+                return self.db.tariffs.get(car_class.TARIFF).price(entry_time, now) # Ce que new_exit() ferait payer maintenant
         except Exception as e:
             print(f"[Error] Unable to calculate fee for spot {spot_id}: {e}")
         return 0.0
@@ -177,12 +588,11 @@ class ParkingController:
             registration_plate (str) : La plaque d'immatriculation du véhicule.
             amount (float) : Le montant du paiement à enregistrer.
         """
-        db = DatabaseController()
         try:
-            usage = db.fetch_last_spot_usage(spot_id)
+            usage = self.db.fetch_last_spot_usage(spot_id)
             if usage:
                 usage_id = usage[0]
-                db.new_payment(usage_id, registration_plate, amount)
+                self.db.new_payment(usage_id, registration_plate, amount)
         except Exception as e:
             print(f"[Error] Unable to confirm payment for spot {spot_id} and {registration_plate}: {e}")
 
@@ -192,12 +602,11 @@ class ParkingController:
         Retourne :
             list : Une liste des véhicules garés, chaque élément contenant le numéro de la place et la plaque d'immatriculation.
         """
-        db = DatabaseController()
         parked_vehicles = []
         try:
-            for spot in db.fetch_all_parking_spots():
+            for spot in self.db.fetch_all_parking_spots():
                 if self.check_spot_status(spot[0]) == "occupied":
-                    usage = db.fetch_last_spot_usage(spot[0])
+                    usage = self.db.fetch_last_spot_usage(spot[0])
                     if usage:
                         parked_vehicles.append((spot[1], usage[0]))  # Spot_number et plaque
         except Exception as e:
@@ -208,9 +617,8 @@ class ParkingController:
         """
         Met à jour l'état de toutes les places de parking en mémoire en fonction des données actuelles de la base de données.
         """
-        db = DatabaseController()
         try:
-            for spot in db.fetch_all_parking_spots():
+            for spot in self.db.fetch_all_parking_spots():
                 spot_id = spot[0]
                 status = self.check_spot_status(spot_id)
                 # Mise à jour de l'état dans self.parking_lot si nécessaire
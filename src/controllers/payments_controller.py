@@ -1,47 +1,71 @@
+from .analytics_controller import AnalyticsController
 from .database_controller import DatabaseController
-from models import Payment
+from models import Payment, PremiumCar, StandardCar
 
 class PaymentsController:
-    def __init__(self, root):
+    def __init__(self, root, db: DatabaseController = None):
         self.root = root
+        self.db = db if db is not None else DatabaseController()
 
     def fetch_payments_data(self):
-        db = DatabaseController()
-        payments = []
-        for payment in db.fetch_all_payments():
-            usage_id, registration_plate, amount = payment
-            payments.append(Payment(usage_id, registration_plate, amount))
-        return payments
+        return list(self.iter_payments())
+
+    def iter_payments(self):
+        """Yields every payment as a Payment object, without loading them all in memory"""
+        for usage_id, registration_plate, amount in self.db.iter_payments():
+            yield Payment(usage_id, registration_plate, amount)
+
+    def fetch_payments_page(self, after_usage_id: int = 0, page_size: int = 200):
+        """
+        Retrieves one page of payments
+        PRE : after_usage_id is 0 for the first page, then the cursor returned with the previous page
+        POST : Returns (payments, cursor) : the Payment objects of the page, and the after_usage_id of the next page (None if this was the last one)
+        """
+        page = self.db.fetch_payments_page(after_usage_id, page_size)
+        cursor = page[-1][0] if len(page) == page_size else None
+        return [Payment(usage_id, registration_plate, amount) for usage_id, registration_plate, amount in page], cursor
 
     def calculate_total_revenue(self):
         """
         Calcule le revenu total généré par les paiements.
+        Le total est lu dans le cumul journalier DailyRevenue, sans parcourir la table Payments
         :return: float représentant le revenu total
         """
-        pass
+        count, total = self.db.fetch_revenue_totals()
+        return float(total)
 
     def calculate_average_payment(self):
         """
         Calcule le montant moyen des paiements.
-        :return: float représentant le montant moyen des paiements
+        :return: float représentant le montant moyen des paiements (0.0 s'il n'y en a aucun)
         """
-        pass
+        count, total = self.db.fetch_revenue_totals()
+        return total / count if count else 0.0
 
     def fetch_payments_by_date(self, start_date, end_date):
         """
         Récupère les paiements effectués entre deux dates spécifiques.
-        :param start_date: date de début de la période
-        :param end_date: date de fin de la période
+        :param start_date: date de début de la période (incluse)
+        :param end_date: date de fin de la période (incluse)
         :return: list de paiements effectués dans la période spécifiée
         """
-        pass
+        return [Payment(*payment) for payment in self.db.fetch_payments_by_date(start_date, end_date)]
 
-    def generate_payment_summary(self):
+    def generate_payment_summary(self, start_date=None, end_date=None):
         """
-        Génère un résumé des paiements.
-        :return: dict contenant le résumé des paiements
+        Génère un résumé des paiements, sur tout l'historique ou entre deux dates (incluses).
+        :return: dict contenant le résumé des paiements : nombre de paiements, revenu total, paiement moyen,
+                 et revenu de chaque jour ({"YYYY-MM-DD": revenu})
         """
-        pass
+        daily_revenue = self.db.fetch_daily_revenue(start_date, end_date)
+        count = sum(payments for day, payments, total in daily_revenue)
+        total_revenue = float(sum(total for day, payments, total in daily_revenue))
+        return {
+            "payments": count,
+            "total_revenue": total_revenue,
+            "average_payment": total_revenue / count if count else 0.0,
+            "daily_revenue": {day: total for day, payments, total in daily_revenue},
+        }
 
     def fetch_payments_by_registration_plate(self, registration_plate):
         """
@@ -49,4 +73,27 @@ class PaymentsController:
         :param registration_plate: plaque d'immatriculation du véhicule
         :return: list de paiements associés à la plaque d'immatriculation spécifiée
         """
-        pass
\ No newline at end of file
+        return [Payment(*payment) for payment in self.db.fetch_payments_by_registration_plate(registration_plate)]
+
+    def audit_payments(self, start_date, end_date, chunk_size: int = 10000) -> list:
+        """
+        Re-tarifie les sessions payées pendant une période avec les tarifs actuels (voir tariffs.py), par blocs de chunk_size :
+        chaque bloc est tarifé avec Tariff.price_many(), un appel par tarif. Une plaque est tarifée comme premium si elle
+        est abonnée aujourd'hui.
+        :param start_date: date de début de la période (datetime, date ou "YYYY-MM-DD[ HH:MM:SS]" UTC)
+        :param end_date: date de fin de la période (exclue)
+        :return: list de tuples (usage_id, registration_plate, montant payé, montant attendu) des paiements qui diffèrent d'un cent ou plus
+        """
+        discrepancies = []
+        tariffs = self.db.tariffs.tariffs()
+        chunks = self.db.iter_paid_session_chunks(AnalyticsController.to_timestamp(start_date), AnalyticsController.to_timestamp(end_date), chunk_size)
+        for chunk in chunks:
+            premium_plates = self.db.fetch_premium_plates({row[1] for row in chunk})
+            sessions = {}
+            for row in chunk:
+                sessions.setdefault(PremiumCar.TARIFF if row[1] in premium_plates else StandardCar.TARIFF, []).append(row)
+            for tariff, rows in sessions.items():
+                usage_ids, plates, amounts, entry_times, exit_times = zip(*rows)
+                expected = tariffs[tariff].price_many(entry_times, exit_times)
+                discrepancies.extend(row[:3] + (amount,) for row, amount in zip(rows, expected) if abs(row[2] - amount) >= 0.005)
+        return sorted(discrepancies)
@@ -0,0 +1,90 @@
+import threading
+import time
+import weakref
+
+class PremiumCache:
+    """
+    In-memory set of the premium registration plates of a database, shared by every controller
+    using that database (see for_connections()), so a premium check is a hash lookup.
+
+    The set is loaded on first use and kept up to date by DatabaseController.add_premium_subscription()
+    and delete_premium_subscription(). Changes made by other processes (or directly in SQL) are detected
+    with PRAGMA data_version, which changes when another connection commits : the cache then reads the
+    PremiumCars counter of the DataVersions table (bumped by triggers) and reloads the set only if it moved.
+    That check runs at most once every CHECK_INTERVAL seconds per thread
+    """
+
+    CHECK_INTERVAL = 0.5 # Seconds a change made by another process may stay unnoticed
+    NO_VERSION = -1 # Version of a set loaded while the PremiumCars counter was missing
+
+    _caches = weakref.WeakKeyDictionary() # ConnectionManager -> PremiumCache
+    _caches_lock = threading.Lock()
+
+    def __init__(self, connections):
+        """connections is the ConnectionManager of the database"""
+        self.connections = connections
+        self._plates = None # Loaded on first use
+        self._version = None # PremiumCars counter the set was loaded at, None forces a check
+        self._lock = threading.Lock()
+        self._local = threading.local() # Per thread : connection checked, its data_version, time of the next check
+
+    @classmethod
+    def for_connections(cls, connections) -> "PremiumCache":
+        """Returns the cache shared by every controller using the ConnectionManager connections"""
+        with cls._caches_lock:
+            cache = cls._caches.get(connections)
+            if cache is None:
+                cache = cls._caches[connections] = cls(connections)
+            return cache
+
+    def _refresh(self):
+        """Reloads the set if the PremiumCars table changed since it was loaded"""
+        local = self._local
+        now = time.monotonic()
+        if self._version is not None and getattr(local, "next_check", 0) > now:
+            return
+        local.next_check = now + self.CHECK_INTERVAL
+        with self.connections.connection() as conn:
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._version is not None and getattr(local, "conn", None) is conn and local.data_version == data_version:
+                return # Nothing was committed by another connection
+            local.conn, local.data_version = conn, data_version
+            row = conn.execute("""SELECT version
+                                  FROM DataVersions
+                                  WHERE name = 'PremiumCars'""").fetchone()
+            # Without its counter (row deleted by hand), the set is read again at every check
+            version = row[0] if row is not None else self.NO_VERSION
+            if version == self._version and version != self.NO_VERSION:
+                return
+            plates = {plate for plate, in conn.execute("""SELECT registration_plate
+                                                          FROM PremiumCars""")}
+        with self._lock:
+            self._plates, self._version = plates, version
+
+    def __contains__(self, registration_plate: str) -> bool:
+        """Returns True if registration_plate owns a premium subscription"""
+        self._refresh()
+        return registration_plate in self._plates
+
+    def plates(self) -> set:
+        """Returns a copy of the premium registration plates"""
+        self._refresh()
+        return set(self._plates)
+
+    def added(self, registration_plate: str) -> None:
+        """Records a subscription just written by this process"""
+        self._refresh()
+        with self._lock:
+            self._plates.add(registration_plate)
+            self._version = None # Verified on next use, in case the write is rolled back
+
+    def removed(self, registration_plate: str) -> None:
+        """Records a subscription just deleted by this process"""
+        self._refresh()
+        with self._lock:
+            self._plates.discard(registration_plate)
+            self._version = None
+
+    def invalidate(self) -> None:
+        """Forces a check of the table on next use"""
+        self._version = None
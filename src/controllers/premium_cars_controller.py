@@ -2,21 +2,18 @@ import sqlite3
 from .database_controller import DatabaseController
 
 class PremiumCarsController:
-    def __init__(self, root):
+    def __init__(self, root, db: DatabaseController = None):
         self.root = root
-        self.premium_cars = []
-        self.fetch_premium_cars_data() # Retrieves the premium list on initialization
+        self.db = db if db is not None else DatabaseController()
 
-    def fetch_premium_cars_data(self):
+    @property
+    def premium_cars(self) -> list:
         """
-        Retrieves all the existing premium members from the database
+        Existing premium members
         PRE : None
-        POST : Insert all the existing premium cars in the instance variable self.premium_cars
+        POST : Returns the sorted list of the premium registration plates, read from the premium cache shared with the other controllers
         """
-        db = DatabaseController()
-        for premium_car in db.fetch_all_premium_subscriptions():
-            # The db method returns a list of one-item lists
-            self.premium_cars.append(premium_car[0])
+        return sorted(self.db.premium_cache.plates())
 
     def new_premium_car(self, registration_plate: str) -> str:
         """
@@ -24,12 +21,10 @@ class PremiumCarsController:
         PRE : None
         POST : Returns a string containing a message describing whether the addition was successful or not
         """
-        db = DatabaseController()
-        if db.is_premium(registration_plate):
+        if self.db.is_premium(registration_plate):
             return f"[Error] {registration_plate} is already registered with premium status"
         else:
-            db.add_premium_subscription(registration_plate)
-            self.premium_cars.append(registration_plate)
+            self.db.add_premium_subscription(registration_plate) # Also updates the premium cache
             return f"[NEW PREMIUM]{registration_plate} was succesfully registered with premium status"
 
     def delete_premium_car(self, registration_plate: str) -> str:
@@ -38,10 +33,8 @@ class PremiumCarsController:
         PRE : None
         POST : Returns a string containing a message describing whether the deletion was successful or not
         """
-        db = DatabaseController()
-        if not db.is_premium(registration_plate):
+        if not self.db.is_premium(registration_plate):
             return f"[Error] {registration_plate} is not registered as premium "
         else:
-            db.delete_premium_subscription(registration_plate)
-            self.premium_cars.remove(registration_plate)
+            self.db.delete_premium_subscription(registration_plate) # Also updates the premium cache
             return f"[DELETE PREMIUM] {registration_plate} was succesfully removed from premium list"
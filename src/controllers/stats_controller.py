@@ -0,0 +1,52 @@
+import os
+import time
+from .instrumentation import INSTRUMENTATION
+
+class StatsController:
+    """Drives the shared instrumentation (see instrumentation.py) for the statistics panel"""
+    def __init__(self, root, instrumentation=INSTRUMENTATION):
+        self.root = root
+        self.instrumentation = instrumentation
+
+    @property
+    def enabled(self) -> bool:
+        return self.instrumentation.enabled
+
+    def toggle(self) -> str:
+        """
+        PRE : None
+        POST : Enables the instrumentation if it was disabled, disables it otherwise. Returns a message describing the new state
+        """
+        if self.instrumentation.enabled:
+            self.instrumentation.disable()
+            return "[STATS] Instrumentation disabled"
+        self.instrumentation.enable()
+        return "[STATS] Instrumentation enabled"
+
+    def reset(self) -> str:
+        self.instrumentation.reset()
+        return "[STATS] Statistics cleared"
+
+    def fetch_rows(self) -> list:
+        """
+        PRE : None
+        POST : Returns one tuple (method, calls, mean ms, p95 ms, max ms) per instrumented method called at least once, busiest first
+        """
+        return [(name, s["calls"], s["mean_ms"], s["p95_ms"], s["max_ms"])
+                for name, s in self.instrumentation.snapshot()["methods"].items()]
+
+    def fetch_slow_calls(self) -> list:
+        """Returns the last slow calls as "time method ms : first SQL statement" strings, most recent first"""
+        return [f"{c['time']} {c['method']} {c['ms']} ms : {c['sql'][0] if c['sql'] else ''}".replace("\n", " ")
+                for c in reversed(self.instrumentation.snapshot()["slow_calls"])]
+
+    def export(self, directory: str = None) -> str:
+        """
+        PRE : directory is the folder of the export (default : ~/.parkease)
+        POST : Writes the statistics to a stats-<date>.json file. Returns a message containing its path
+        """
+        directory = directory if directory is not None else os.path.expanduser("~/.parkease")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"stats-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        self.instrumentation.export(path)
+        return f"[STATS] Statistics exported to {path}"
@@ -0,0 +1,80 @@
+import threading
+import time
+import weakref
+
+class TariffCache:
+    """
+    Compiled tariffs of a database (see tariffs.py), shared by every controller using that database
+    like PremiumCache, so pricing an exit doesn't read nor compile the tariff tables.
+
+    The tariffs are compiled on first use, and again once the Tariffs counter of the DataVersions table
+    (bumped by triggers, whichever process changes the tables) moved. The counter is read at most once
+    every CHECK_INTERVAL seconds per thread
+    """
+
+    CHECK_INTERVAL = 1.0 # Seconds a change made by another process may stay unnoticed
+    NO_VERSION = -1 # Version of tariffs compiled while the Tariffs counter was missing
+
+    _caches = weakref.WeakKeyDictionary() # ConnectionManager -> TariffCache
+    _caches_lock = threading.Lock()
+
+    def __init__(self, connections):
+        """connections is the ConnectionManager of the database"""
+        self.connections = connections
+        self._tariffs = None # {name: Tariff}, compiled on first use
+        self._version = None # Tariffs counter the tariffs were compiled at, None forces a check
+        self._lock = threading.Lock()
+        self._local = threading.local() # Per thread : time of the next check
+
+    @classmethod
+    def for_connections(cls, connections) -> "TariffCache":
+        """Returns the cache shared by every controller using the ConnectionManager connections"""
+        with cls._caches_lock:
+            cache = cls._caches.get(connections)
+            if cache is None:
+                cache = cls._caches[connections] = cls(connections)
+            return cache
+
+    def _refresh(self):
+        """Compiles the tariffs again if the tables changed since they were compiled"""
+        local = self._local
+        now = time.monotonic()
+        if self._version is not None and getattr(local, "next_check", 0) > now:
+            return
+        local.next_check = now + self.CHECK_INTERVAL
+        with self.connections.connection() as conn:
+            row = conn.execute("""SELECT version
+                                  FROM DataVersions
+                                  WHERE name = 'Tariffs'""").fetchone()
+            # Without its counter (database older than migration 9, or row deleted), the tables are read again at every check
+            version = row[0] if row is not None else self.NO_VERSION
+            if version == self._version and version != self.NO_VERSION:
+                return
+            tariffs = conn.execute("""SELECT name, daily_cap, utc_offset
+                                      FROM Tariffs""").fetchall()
+            bands = conn.execute("""SELECT tariff, days, start_minute, end_minute, hourly_rate
+                                    FROM TariffBands""").fetchall()
+        from tariffs import compile_tariffs # Only loaded once a session is priced, tariffs.py pulls in NumPy when it is installed
+        compiled = compile_tariffs(tariffs, bands)
+        with self._lock:
+            self._tariffs, self._version = compiled, version
+
+    def get(self, name: str):
+        """
+        RETURNS : The compiled Tariff named name
+        RAISES : KeyError if there is no such tariff
+        """
+        self._refresh()
+        try:
+            return self._tariffs[name]
+        except KeyError:
+            raise KeyError(f"No tariff named '{name}'") from None
+
+    def tariffs(self) -> dict:
+        """Returns a copy of {name: Tariff}"""
+        self._refresh()
+        return dict(self._tariffs)
+
+    def invalidate(self) -> None:
+        """Forces a check of the tables on next use"""
+        self._version = None
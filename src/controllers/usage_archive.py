@@ -0,0 +1,228 @@
+"""
+Hot/cold partitioning of the parking history : the closed sessions older than a configurable age,
+and their payments, are moved out of ParkingUsage and Payments into one archive database per month
+(parking_lot-YYYY-MM.db next to parking_lot.db, month of the entry). The live tables only keep the
+open sessions and the recent history, so the queries of the gates stay fast however old the lot is.
+
+The ArchivePartitions table of the live database is the catalog of the archives : number of rows,
+range of ids, of entry, exit and payment times of each month. Readers use it to attach only the
+archives overlapping the period they query (see partitions()).
+
+A session is moved in two steps, because a commit spanning two SQLite files isn't atomic in WAL mode :
+    1. its month is flagged pending in the catalog, then the session and its payment are copied
+       into the archive (INSERT OR IGNORE, so running it again after a crash is harmless)
+    2. one transaction of the live database updates the catalog, clears the pending flag and deletes
+       the copied rows
+While a month is pending, its rows may exist in both places : the readers skip the archived copy
+of the rows still present in the live tables (UNARCHIVED_USAGE, UNARCHIVED_PAYMENT).
+The session with the largest id is never archived, so SQLite never hands out an archived id again.
+The DailyRevenue rollup has no DELETE trigger : archived payments keep counting in it.
+"""
+import os
+import sqlite3
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS {schema}.ParkingUsage (
+       id INTEGER PRIMARY KEY,
+       spot_id INTEGER NOT NULL,
+       registration_plate VARCHAR(10) NOT NULL,
+       entry_time TIMESTAMP,
+       exit_time TIMESTAMP)""",
+    """CREATE INDEX IF NOT EXISTS {schema}.ParkingUsage_entry
+       ON ParkingUsage(entry_time)""",
+    """CREATE INDEX IF NOT EXISTS {schema}.ParkingUsage_exit_entry
+       ON ParkingUsage(exit_time, entry_time)""",
+    """CREATE TABLE IF NOT EXISTS {schema}.Payments (
+       usage_id INTEGER PRIMARY KEY,
+       registration_plate VARCHAR(10) NOT NULL,
+       amount DECIMAL(5, 2) NOT NULL,
+       paid_at TIMESTAMP)""",
+    """CREATE INDEX IF NOT EXISTS {schema}.Payments_paid_at
+       ON Payments(paid_at)""",
+    """CREATE INDEX IF NOT EXISTS {schema}.Payments_registration_plate
+       ON Payments(registration_plate)""",
+]
+
+# Conditions to add to a query of an archive, aliased u (ParkingUsage) or p (Payments), while its month is pending
+UNARCHIVED_USAGE = "AND NOT EXISTS (SELECT 1 FROM main.ParkingUsage h WHERE h.id = u.id)"
+UNARCHIVED_PAYMENT = "AND NOT EXISTS (SELECT 1 FROM main.Payments h WHERE h.usage_id = p.usage_id)"
+
+# Sessions of a month selected by the current archival run : (month,)
+BATCH = "IN (SELECT id FROM temp.ArchiveBatch WHERE month = ?)"
+
+class UsageArchive:
+    """Moves the old parking history of a database to its monthly archives, and attaches them for the readers"""
+
+    MAX_AGE_DAYS = 90 # Closed sessions older than this (exit time) are archived
+
+    def __init__(self, db, max_age_days: float = MAX_AGE_DAYS):
+        """db is the DatabaseController of the live database"""
+        self.db = db
+        self.max_age_days = max_age_days
+        self.directory = db.directory
+        self._stem = os.path.splitext(os.path.basename(db.path))[0]
+
+    def path(self, month: str) -> str:
+        """Returns the file of the archive of month ('YYYY-MM')"""
+        return os.path.join(self.directory, f"{self._stem}-{month}.db")
+
+    @staticmethod
+    def schema(month: str) -> str:
+        """Returns the name the archive of month is attached as"""
+        return "archive_" + month.replace("-", "_")
+
+    def fetch_partitions(self):
+        """Returns the catalog : a list of tuples (month, usages, payments, first_entry, last_exit, pending) ordered by month"""
+
+        with self.db.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""SELECT month, usages, payments, first_entry, last_exit, pending
+                              FROM ArchivePartitions
+                              ORDER BY month""")
+            return cursor.fetchall()
+
+    def archive(self, max_age_days: float = None) -> dict:
+        """
+        Moves the closed sessions whose exit is older than max_age_days (default : self.max_age_days), and their payments,
+        to the archive of the month of their entry
+        PRE : No transaction is open on the connection of this thread (SQLite can't attach a database inside one)
+        POST : The sessions are in their archive and no longer in ParkingUsage. A run interrupted by a crash is
+               completed by the next one
+        RETURNS : {month: number of sessions moved}
+        RAISES : sqlite3.OperationalError if called inside a transaction
+        """
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        moved = {}
+        with self.db.connect() as conn:
+            # The sessions to move are selected once, in a single pass over the exit time index
+            conn.execute("""CREATE TEMP TABLE IF NOT EXISTS ArchiveBatch (
+                            month TEXT NOT NULL,
+                            id INTEGER NOT NULL,
+                            PRIMARY KEY (month, id)) WITHOUT ROWID""")
+            conn.execute("DELETE FROM temp.ArchiveBatch")
+            conn.execute("""INSERT INTO temp.ArchiveBatch (month, id)
+                            SELECT STRFTIME('%Y-%m', COALESCE(entry_time, exit_time)), id
+                            FROM ParkingUsage
+                            WHERE exit_time < DATETIME('now', ?) AND id < (SELECT MAX(id) FROM ParkingUsage)""",
+                         (f"-{max_age_days} days",))
+            conn.commit()
+            months = [month for month, in conn.execute("SELECT DISTINCT month FROM temp.ArchiveBatch ORDER BY month")]
+            for month in months:
+                moved[month] = self._move(conn, month)
+            conn.execute("DELETE FROM temp.ArchiveBatch")
+        return moved
+
+    def _move(self, conn, month: str) -> int:
+        """Moves the sessions of temp.ArchiveBatch of one month, see the module docstring. Returns the number of sessions deleted from ParkingUsage"""
+        schema, params = self.schema(month), (month,)
+        conn.execute("""INSERT INTO ArchivePartitions (month, pending)
+                        VALUES (?, 1)
+                        ON CONFLICT(month) DO UPDATE SET pending = 1""", (month,))
+        conn.commit()
+        self._attach(conn, [month], create=True)
+
+        conn.execute("BEGIN")
+        conn.execute(f"""INSERT OR IGNORE INTO {schema}.ParkingUsage (id, spot_id, registration_plate, entry_time, exit_time)
+                         SELECT id, spot_id, registration_plate, entry_time, exit_time
+                         FROM main.ParkingUsage
+                         WHERE id {BATCH}""", params)
+        conn.execute(f"""INSERT OR IGNORE INTO {schema}.Payments (usage_id, registration_plate, amount, paid_at)
+                         SELECT p.usage_id, p.registration_plate, p.amount, p.paid_at
+                         FROM main.Payments p
+                         WHERE p.usage_id {BATCH}""", params)
+        conn.commit()
+
+        conn.execute("BEGIN")
+        conn.execute(f"""UPDATE ArchivePartitions
+                         SET usages = (SELECT COUNT(*) FROM {schema}.ParkingUsage),
+                             payments = (SELECT COUNT(*) FROM {schema}.Payments),
+                             min_id = (SELECT MIN(id) FROM {schema}.ParkingUsage),
+                             max_id = (SELECT MAX(id) FROM {schema}.ParkingUsage),
+                             first_entry = (SELECT MIN(entry_time) FROM {schema}.ParkingUsage),
+                             last_entry = (SELECT MAX(entry_time) FROM {schema}.ParkingUsage),
+                             last_exit = (SELECT MAX(exit_time) FROM {schema}.ParkingUsage),
+                             first_paid = (SELECT MIN(paid_at) FROM {schema}.Payments),
+                             last_paid = (SELECT MAX(paid_at) FROM {schema}.Payments),
+                             pending = 0,
+                             archived_at = current_timestamp
+                         WHERE month = ?""", (month,))
+        # Only what the archive holds is deleted : a payment made since the copy stays in the live table
+        conn.execute(f"""DELETE FROM main.Payments
+                         WHERE usage_id {BATCH}
+                           AND EXISTS (SELECT 1 FROM {schema}.Payments a WHERE a.usage_id = main.Payments.usage_id)""", params)
+        cursor = conn.execute(f"""DELETE FROM main.ParkingUsage
+                                  WHERE id {BATCH}
+                                    AND EXISTS (SELECT 1 FROM {schema}.ParkingUsage a WHERE a.id = main.ParkingUsage.id)""", params)
+        conn.commit()
+        return cursor.rowcount
+
+    def _attach(self, conn, months, create: bool = False):
+        """
+        Attaches the archives of months that aren't yet, detaching the ones months doesn't need if there is no room left
+        RAISES : FileNotFoundError if an archive is missing (unless create), sqlite3.OperationalError inside a transaction
+        """
+        attached = {name for seq, name, file in conn.execute("PRAGMA database_list")} - {"main", "temp"}
+        missing = [month for month in months if self.schema(month) not in attached]
+        if not missing:
+            return
+        wanted = {self.schema(month) for month in months}
+        room = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - len(attached)
+        for schema in sorted(attached - wanted)[:max(0, len(missing) - room)]:
+            conn.execute(f"DETACH DATABASE {schema}")
+        for month in missing:
+            path, schema = self.path(month), self.schema(month)
+            if not create and not os.path.exists(path):
+                raise FileNotFoundError(f"Archive {path} is missing")
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            if create:
+                conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+                for statement in SCHEMA:
+                    conn.execute(statement.format(schema=schema))
+
+    def _months(self, conn, where: str, params, order: str) -> list:
+        """Returns the (month, pending, min_id) of the archives matching where, a condition on the columns of ArchivePartitions"""
+        return conn.execute(f"""SELECT month, pending, min_id
+                                FROM ArchivePartitions
+                                WHERE {where}
+                                ORDER BY {order}""", params).fetchall()
+
+    def partitions(self, conn, where: str = "usages > 0", params=(), order: str = "month", live_first: bool = False):
+        """
+        Attaches the archives a read needs and yields the partitions to query
+        PRE : conn is the connection of the current thread, where a condition on the columns of ArchivePartitions
+              (month, usages, payments, min_id, max_id, first_entry, last_entry, last_exit, first_paid, last_paid)
+              selecting the archives that may hold rows of the read, order an ORDER BY clause on the same columns
+        POST : Yields (schema, pending, min_id) for the live tables ("main", False, None), first or last, and for each
+               archive matching where, in order. The archives of a pending month may hold copies of rows of the live
+               tables : add UNARCHIVED_USAGE or UNARCHIVED_PAYMENT to their queries.
+               When every archive fits in the attachment limit of SQLite, the partitions are read in a single read
+               transaction, so a concurrent archival run can't make a row appear twice or go missing. Otherwise the
+               archives are attached one after the other, and each partition is read on its own
+        RAISES : FileNotFoundError if an archive is missing, sqlite3.OperationalError if an archive that isn't attached yet
+                 is needed inside a transaction
+        """
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        months = self._months(conn, where, params, order)
+        while len(months) <= limit and not conn.in_transaction:
+            self._attach(conn, [month for month, pending, min_id in months])
+            conn.execute("BEGIN")
+            current = self._months(conn, where, params, order)
+            if current == months: # No archival run committed since the catalog was read
+                try:
+                    yield from self._partitions(conn, months, live_first)
+                finally:
+                    conn.commit()
+                return
+            conn.commit()
+            months = current
+        yield from self._partitions(conn, months, live_first, attach=True)
+
+    def _partitions(self, conn, months, live_first: bool, attach: bool = False):
+        if live_first:
+            yield "main", False, None
+        for month, pending, min_id in months:
+            if attach:
+                self._attach(conn, [month])
+            yield self.schema(month), bool(pending), min_id
+        if not live_first:
+            yield "main", False, None
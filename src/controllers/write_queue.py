@@ -0,0 +1,115 @@
+import atexit
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+class WriteQueue:
+    """
+    Write-behind queue : database writes are submitted from the Tk thread and executed, in order,
+    by a dedicated writer thread, so the interface never waits for SQLite.
+    The writer groups every write waiting in the queue (up to MAX_BATCH) into a single transaction
+    (group commit). If one of them fails, the batch is rolled back and replayed one write per
+    transaction, so only the failing write is lost and reported.
+    Pending writes are flushed by close(), which also runs when the interpreter exits
+    """
+
+    MAX_BATCH = 256 # Writes committed together at most
+
+    def __init__(self, db, on_error=None):
+        """
+        PRE : db is the DatabaseController the writes are made with. on_error is None or a function
+              called with the exception of every failed write (from the writer thread)
+        """
+        self.db = db
+        self.on_error = on_error
+        self._writes = deque() # (future, function, args, kwargs)
+        self._pending = 0 # Submitted writes that are not committed (or failed) yet
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="parkease-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, write, *args, **kwargs) -> Future:
+        """
+        PRE : write is a function making database calls (usually a DatabaseController method)
+        POST : write(*args, **kwargs) is queued and will run on the writer thread after every write submitted before it
+        RETURNS : A concurrent.futures.Future resolved with the result of write once it is committed,
+                  call its result() method to wait for it (e.g. for the id of a new spot)
+        RAISES : RuntimeError if the queue is closed
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The write queue is closed")
+            self._writes.append((future, write, args, kwargs))
+            self._pending += 1
+            self._condition.notify_all()
+        return future
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        PRE : timeout is None (wait as long as needed) or a number of seconds
+        POST : Waits until every write submitted so far is committed or failed
+        RETURNS : True if the queue is empty, False if the timeout expired first
+        """
+        if threading.current_thread() is self._thread:
+            return not self._pending # A write waiting for the queue would wait for itself
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        PRE : timeout is None (wait as long as needed) or a number of seconds
+        POST : Refuses new writes, flushes the pending ones and stops the writer thread
+        RETURNS : True if every write was flushed, False if the timeout expired first
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        atexit.unregister(self.close)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+        return not self._pending
+
+    def __len__(self):
+        """Number of writes not committed yet"""
+        return self._pending
+
+    def _run(self):
+        """Main loop of the writer thread"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._writes or self._closed)
+                if not self._writes:
+                    return # Closed and flushed
+                batch = [self._writes.popleft() for _ in range(min(len(self._writes), self.MAX_BATCH))]
+            self._commit(batch)
+            with self._condition:
+                self._pending -= len(batch)
+                self._condition.notify_all()
+
+    def _commit(self, batch):
+        """Runs a batch of writes inside one transaction, then resolves their futures"""
+        try:
+            with self.db.transaction():
+                results = [write(*args, **kwargs) for future, write, args, kwargs in batch]
+        except Exception as error:
+            if len(batch) == 1:
+                self._fail(batch[0][0], error)
+                return
+            # The whole batch was rolled back : replays it one write per transaction to isolate the failing ones
+            for write in batch:
+                self._commit([write])
+            return
+        for (future, *_), result in zip(batch, results):
+            future.set_result(result)
+
+    def _fail(self, future, error):
+        """Reports error to the future of the failed write and to on_error"""
+        future.set_exception(error)
+        if self.on_error is not None:
+            try:
+                self.on_error(error)
+            except Exception:
+                pass # A broken callback must not stop the writer thread
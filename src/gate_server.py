@@ -0,0 +1,230 @@
+"""
+Headless gate service : exposes ParkingController to the barrier controllers and ANPR cameras
+over a local TCP connection, without the Tk interface.
+
+Protocol : newline-delimited JSON. Every request is one JSON object on one line, every response
+is one JSON object on one line, sent in the order of the requests of the connection.
+    {"id": 1, "action": "entry", "floor": 1, "row": 2, "spot": 3, "plate": "ABC-123"}
+    {"id": 1, "ok": true, "message": "[NEW ENTRY] Car ABC-123 was successfully parked at floor 1 - row 2 - spot 3"}
+Actions : entry (floor, row, spot, plate), entry_auto (plate), exit (floor, row, spot, plate),
+          exit_plate (plate), create_spot (floor, row, spot), is_premium (plate),
+          book (plate, start, end as UNIX timestamps, and floor, row, spot unless any spot will do),
+          cancel_booking (booking, plate), ping.
+"id" is optional and copied to the response. "ok" is false when the message is an error.
+
+Many gates are served concurrently by the asyncio event loop. The ParkingController is only used by
+one worker thread, so the calls of every gate are applied one at a time, and its database writes
+are group-committed by a WriteQueue. When one of them fails after the gate was answered (e.g. another process took
+the spot), the error is logged and the lot is reloaded from the database. A snapshot of the lot is written every CHECKPOINT_INTERVAL seconds
+when its journal is long enough, and when the server stops, so the next start restores it quickly.
+The timers of the bookings (start of a window, no-show) are applied every BOOKING_INTERVAL seconds.
+Once a day (and on start), the closed sessions older than --archive-days are moved to the monthly
+archives (see usage_archive.py), in a thread of its own so the gates aren't held up.
+
+Usage : park-ease-gate [--host HOST] [--port PORT] [--db PATH] [--stats FILE] [--archive-days DAYS]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from controllers import DatabaseController, ParkingController
+from controllers.connection_manager import ConnectionManager
+from controllers.instrumentation import INSTRUMENTATION
+from controllers.usage_archive import UsageArchive
+from controllers.write_queue import WriteQueue
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+class GateServer:
+    """asyncio server multiplexing the gate connections on top of a single ParkingController"""
+
+    MAX_LINE = 64 * 1024 # Bytes per request at most
+    CHECKPOINT_INTERVAL = 60 # Seconds between two checks of the lot journal
+    ARCHIVE_INTERVAL = 24 * 3600 # Seconds between two archival runs
+    BOOKING_INTERVAL = 1 # Seconds between two checks of the booking timers
+
+    def __init__(self, db: DatabaseController, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.write_queue = WriteQueue(db, on_error=self.write_failed)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parkease-gate") # Owns the controller
+        self.archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parkease-archive")
+        self.controller = None
+        self.server = None
+        self.checkpoints = None
+        self.archival = None
+        self.booking_timers = None
+        self._resync_pending = threading.Event() # Set while a resynchronisation of the lot is queued on the worker thread
+        self.actions = {
+            "entry": lambda r: self.controller.new_entry(int(r["floor"]), int(r["row"]), int(r["spot"]), str(r["plate"])),
+            "entry_auto": lambda r: self.controller.new_entry_auto(str(r["plate"])),
+            "exit": lambda r: self.controller.new_exit(int(r["floor"]), int(r["row"]), int(r["spot"]), str(r["plate"])),
+            "exit_plate": lambda r: self.controller.new_exit_by_plate(str(r["plate"])),
+            "create_spot": lambda r: self.controller.create_new_spot(int(r["floor"]), int(r["row"]), int(r["spot"])),
+            "is_premium": lambda r: self.db.is_premium(str(r["plate"])),
+            "book": self.book,
+            "cancel_booking": lambda r: self.controller.cancel_reservation(int(r["booking"]), str(r["plate"])),
+            "ping": lambda r: "pong",
+        }
+
+    async def start(self):
+        """Loads the parking lot and starts listening. Returns the (host, port) the server is bound to"""
+        loop = asyncio.get_running_loop()
+        self.controller = await loop.run_in_executor(self.executor, lambda: ParkingController(db=self.db, write_queue=self.write_queue))
+        self.server = await asyncio.start_server(self.handle_gate, self.host, self.port, limit=self.MAX_LINE)
+        self.checkpoints = asyncio.create_task(self.checkpoint_periodically())
+        self.archival = asyncio.create_task(self.archive_periodically())
+        self.booking_timers = asyncio.create_task(self.process_bookings_periodically())
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def checkpoint_periodically(self):
+        """Writes a snapshot of the lot when it is due. Runs in the worker thread, between two gate calls"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.CHECKPOINT_INTERVAL)
+            await loop.run_in_executor(self.executor, self.controller.checkpoint)
+
+    async def archive_periodically(self):
+        """Archives the old parking history, see UsageArchive.archive(). Runs in the archiver thread.
+           A failed run (e.g. the database is locked by the gates, or an archive file can't be written) is logged
+           and tried again at the next interval"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(self.archiver, self.db.archive.archive)
+            except Exception as e:
+                print(f"[Error] The parking history couldn't be archived : {e!r}")
+            await asyncio.sleep(self.ARCHIVE_INTERVAL)
+
+    async def process_bookings_periodically(self):
+        """Applies the booking timers that are due, see ParkingController.process_bookings(). Runs in the worker thread"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.BOOKING_INTERVAL)
+            await loop.run_in_executor(self.executor, self.controller.process_bookings)
+
+    async def close(self):
+        """Stops listening, then flushes the queued writes and writes a snapshot of the lot"""
+        for task in (self.checkpoints, self.archival, self.booking_timers):
+            if task is not None:
+                task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        loop = asyncio.get_running_loop()
+        if self.controller is not None:
+            await loop.run_in_executor(self.executor, self.controller.checkpoint, True)
+        await loop.run_in_executor(self.executor, self.write_queue.close)
+        self.executor.shutdown()
+        await loop.run_in_executor(None, self.archiver.shutdown) # Waits for an archival run in progress
+
+    def write_failed(self, error: Exception):
+        """
+        on_error of the write queue, called from the writer thread : the gate was already answered, the lot no longer
+        matches the database (e.g. the spot was taken by another process). Logs the error and reloads the lot
+        from the database on the worker thread, between two gate calls. Several failures in a row reload it once
+        """
+        print(f"[Error] A database write failed, the parking lot is reloaded : {error!r}")
+        if self._resync_pending.is_set():
+            return
+        self._resync_pending.set()
+        try:
+            self.executor.submit(self.resync)
+        except RuntimeError:
+            pass # The server is closing
+
+    def resync(self):
+        """Reloads the lot and its bookings from the database. Runs in the worker thread"""
+        self._resync_pending.clear()
+        if self.controller is not None:
+            self.controller.fetch_parking_data(use_snapshot=False) # Its journal holds the change that failed
+
+    def book(self, request) -> str:
+        """Books the spot of request, or the closest spot free for the window if request has no floor"""
+        plate, start, end = str(request["plate"]), int(request["start"]), int(request["end"])
+        if "floor" not in request:
+            return self.controller.reserve_any_spot(plate, start, end)
+        return self.controller.reserve_spot(int(request["floor"]), int(request["row"]), int(request["spot"]), plate, start, end)
+
+    def dispatch(self, request) -> dict:
+        """
+        PRE : request is the decoded JSON request of a gate
+        POST : Runs its action on the controller (in the worker thread)
+        RETURNS : The response to send back
+        """
+        response = {"id": request.get("id")} if isinstance(request, dict) else {"id": None}
+        try:
+            result = self.actions[request["action"]](request)
+        except (KeyError, TypeError, ValueError) as e:
+            response.update(ok=False, message=f"[Error] Invalid request : {e!r}")
+            return response
+        except (sqlite3.Error, futures.CancelledError, futures.TimeoutError, futures.BrokenExecutor) as e:
+            # The database or the write queue failed : the gate gets an error, the connection stays open
+            response.update(ok=False, message=f"[Error] The request couldn't be completed : {e!r}")
+            return response
+        if isinstance(result, bool):
+            response.update(ok=True, premium=result)
+        else:
+            response.update(ok=not result.startswith("[Error]"), message=result)
+        return response
+
+    async def handle_gate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one gate connection until it is closed"""
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"id": None, "ok": False, "message": "[Error] Invalid JSON"}
+                else:
+                    response = await loop.run_in_executor(self.executor, self.dispatch, request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass # The gate disconnected or sent a line longer than MAX_LINE
+        finally:
+            writer.close()
+
+async def serve(db: DatabaseController, host: str, port: int):
+    server = GateServer(db, host, port)
+    host, port = await server.start()
+    print(f"ParkEase gate server listening on {host}:{port}")
+    try:
+        await asyncio.Event().wait() # Until interrupted
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="ParkEase headless gate server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=None, help="SQLite database file (default : ~/.parkease/parking_lot.db)")
+    parser.add_argument("--stats", default=None, help="Enables the instrumentation and writes its statistics to this JSON file on exit")
+    parser.add_argument("--archive-days", type=float, default=UsageArchive.MAX_AGE_DAYS,
+                        help="Age (days since the exit) after which the closed sessions are archived")
+    args = parser.parse_args()
+
+    db = DatabaseController(args.db)
+    db.archive.max_age_days = args.archive_days
+    os.makedirs(db.directory, exist_ok=True)
+    db.migrate()
+    if args.stats:
+        INSTRUMENTATION.enable()
+    try:
+        asyncio.run(serve(db, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ConnectionManager.close_all_managers()
+        if args.stats:
+            INSTRUMENTATION.export(args.stats)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
-from tkinter import ttk, IntVar, PhotoImage, StringVar
-from controllers import ParkingController, PaymentsController, PremiumCarsController, AnalyticsController
+from tkinter import ttk, IntVar, Listbox, PhotoImage, StringVar
+import controllers # The controllers are only loaded when their view is first opened
 import os
-from tkinter import ttk, PhotoImage
 
 class LogoFrame(ttk.Frame):
     def __init__(self, root):
@@ -47,10 +46,11 @@ class SidebarFrame(ttk.Frame):
     def __init__(self, parent, app):
         super().__init__(parent, style="Default.TFrame")
 
-        ttk.Button(self, text="Manage parkings", style="Default.TButton", command=lambda: app.switch_mainframe(ParkingOverviewFrame, ParkingController, "Parking Management")).pack(pady=(4,0))
-        ttk.Button(self, text="Manage payments", style="Default.TButton", command=lambda: app.switch_mainframe(PaymentsOverviewFrame, PaymentsController, "Payments Management")).pack(pady=(4,0))
-        ttk.Button(self, text="Manage premium car", style="Default.TButton", command=lambda: app.switch_mainframe(PremiumCarsOverviewFrame, PremiumCarsController, "Premium Cars Management")).pack(pady=(4,0))
-        ttk.Button(self, text="View analytics", style="Default.TButton", command=lambda: app.switch_mainframe(AnalyticsOverviewFrame, AnalyticsController, "Analytics Visualization")).pack(pady=(4,0))
+        ttk.Button(self, text="Manage parkings", style="Default.TButton", command=lambda: app.switch_mainframe(ParkingOverviewFrame, controllers.ParkingController, "Parking Management")).pack(pady=(4,0))
+        ttk.Button(self, text="Manage payments", style="Default.TButton", command=lambda: app.switch_mainframe(PaymentsOverviewFrame, controllers.PaymentsController, "Payments Management")).pack(pady=(4,0))
+        ttk.Button(self, text="Manage premium car", style="Default.TButton", command=lambda: app.switch_mainframe(PremiumCarsOverviewFrame, controllers.PremiumCarsController, "Premium Cars Management")).pack(pady=(4,0))
+        ttk.Button(self, text="View analytics", style="Default.TButton", command=lambda: app.switch_mainframe(AnalyticsOverviewFrame, controllers.AnalyticsController, "Analytics Visualization")).pack(pady=(4,0))
+        ttk.Button(self, text="Performance stats", style="Default.TButton", command=lambda: app.switch_mainframe(StatsOverviewFrame, controllers.StatsController, "Performance Statistics")).pack(pady=(4,0))
 
 class MainFrame(ttk.Frame):
     """Parent class to the overviews"""
@@ -59,6 +59,142 @@ class MainFrame(ttk.Frame):
         self.app = app
         self.controller = controller
 
+class ParkingLotView(ttk.Frame):
+    """
+    Tree view of a ParkingLot. Only the floors are inserted at first : the rows of a floor and the spots of a row
+    are inserted when they are opened, and removed when they are closed. The view listens to the lot,
+    so after an entry, exit, creation or deletion only the items of the spot that changed are updated
+    """
+    PLACEHOLDER = "~" # Suffix of the dummy child that makes a closed floor/row expandable
+
+    def __init__(self, parent, parking_lot):
+        super().__init__(parent, style="Default.TFrame")
+        self.parking_lot = parking_lot
+
+        self.tree = ttk.Treeview(self, columns=("status", "car"), selectmode="browse")
+        self.tree.heading("#0", text="Position")
+        self.tree.heading("status", text="Status")
+        self.tree.heading("car", text="Car")
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree.bind("<<TreeviewOpen>>", lambda event: self.on_open(self.tree.focus()))
+        self.tree.bind("<<TreeviewClose>>", lambda event: self.on_close(self.tree.focus()))
+        for floor_number in sorted(self.parking_lot.floors):
+            self.insert_floor(floor_number)
+        self.parking_lot.add_listener(self.on_lot_change)
+
+    def destroy(self):
+        self.parking_lot.remove_listener(self.on_lot_change)
+        super().destroy()
+
+    @staticmethod
+    def floor_iid(floor_number):
+        return f"F{floor_number}"
+
+    @staticmethod
+    def row_iid(floor_number, row_number):
+        return f"F{floor_number}R{row_number}"
+
+    @staticmethod
+    def spot_iid(floor_number, row_number, spot_number):
+        return f"F{floor_number}R{row_number}S{spot_number}"
+
+    def is_populated(self, iid):
+        """Returns True if the children of the floor/row item are inserted"""
+        return self.tree.get_children(iid) != (iid + self.PLACEHOLDER,)
+
+    def floor_values(self, floor_number):
+        floor = self.parking_lot.floors[floor_number]
+        total = sum(len(row.spots) for row in floor.rows.values())
+        return (f"{self.parking_lot.free_spots_count(floor_number)} / {total} free", "")
+
+    def row_values(self, floor_number, row_number):
+        spots = self.parking_lot.floors[floor_number].rows[row_number].spots
+        free = sum(1 for spot in spots.values() if spot.status == "free")
+        return (f"{free} / {len(spots)} free", "")
+
+    @staticmethod
+    def spot_values(spot):
+        return (spot.status, "" if spot.status == "free" else str(spot.linked_car))
+
+    def insert_floor(self, floor_number):
+        iid = self.floor_iid(floor_number)
+        index = sorted(self.parking_lot.floors).index(floor_number)
+        self.tree.insert("", index, iid=iid, text=f"Floor {floor_number}", values=self.floor_values(floor_number))
+        self.tree.insert(iid, "end", iid=iid + self.PLACEHOLDER)
+
+    def insert_row(self, floor_number, row_number):
+        iid = self.row_iid(floor_number, row_number)
+        index = sorted(self.parking_lot.floors[floor_number].rows).index(row_number)
+        self.tree.insert(self.floor_iid(floor_number), index, iid=iid, text=f"Row {row_number}", values=self.row_values(floor_number, row_number))
+        self.tree.insert(iid, "end", iid=iid + self.PLACEHOLDER)
+
+    def insert_spot(self, spot):
+        floor_number, row_number, spot_number = spot.floor_number, spot.row_number, spot.spot_number
+        index = sorted(self.parking_lot.floors[floor_number].rows[row_number].spots).index(spot_number)
+        self.tree.insert(self.row_iid(floor_number, row_number), index, iid=self.spot_iid(floor_number, row_number, spot_number),
+                         text=f"Spot {spot_number}", values=self.spot_values(spot))
+
+    def on_open(self, iid):
+        """Inserts the rows of a floor, or the spots of a row, when it is opened"""
+        if not iid or self.is_populated(iid):
+            return
+        self.tree.delete(iid + self.PLACEHOLDER)
+        floor_number, _, row_number = iid[1:].partition("R")
+        floor = self.parking_lot.floors[int(floor_number)]
+        if not row_number:
+            for row_number in sorted(floor.rows):
+                self.insert_row(floor.floor_number, row_number)
+        else:
+            row = floor.rows[int(row_number)]
+            for spot_number in sorted(row.spots):
+                self.insert_spot(row.spots[spot_number])
+
+    def on_close(self, iid):
+        """Removes the children of a floor or row when it is closed, so only open items are kept in the widget"""
+        if not iid or not self.is_populated(iid) or "S" in iid:
+            return
+        self.tree.delete(*self.tree.get_children(iid))
+        self.tree.insert(iid, "end", iid=iid + self.PLACEHOLDER)
+
+    def on_lot_change(self, event, spot):
+        """Listener of the ParkingLot : updates the items of spot, its row and its floor"""
+        floor_number, row_number, spot_number = spot.floor_number, spot.row_number, spot.spot_number
+        floor_iid, row_iid = self.floor_iid(floor_number), self.row_iid(floor_number, row_number)
+        spot_iid = self.spot_iid(floor_number, row_number, spot_number)
+        if event == "changed":
+            if self.tree.exists(spot_iid):
+                self.tree.item(spot_iid, values=self.spot_values(spot))
+        elif event == "added":
+            if not self.tree.exists(floor_iid):
+                self.insert_floor(floor_number)
+            elif self.is_populated(floor_iid):
+                if not self.tree.exists(row_iid):
+                    self.insert_row(floor_number, row_number)
+                elif self.is_populated(row_iid):
+                    self.insert_spot(spot)
+        elif event == "removed":
+            if floor_number not in self.parking_lot.floors:
+                if self.tree.exists(floor_iid):
+                    self.tree.delete(floor_iid)
+            elif row_number not in self.parking_lot.floors[floor_number].rows:
+                if self.tree.exists(row_iid):
+                    self.tree.delete(row_iid)
+            elif self.tree.exists(spot_iid):
+                self.tree.delete(spot_iid)
+        # Free counters of the row and the floor
+        floor = self.parking_lot.floors.get(floor_number)
+        if floor is not None:
+            if row_number in floor.rows and self.tree.exists(row_iid):
+                self.tree.item(row_iid, values=self.row_values(floor_number, row_number))
+            if self.tree.exists(floor_iid):
+                self.tree.item(floor_iid, values=self.floor_values(floor_number))
+
 class ParkingOverviewFrame(MainFrame):
     """Frame used to view the parking lot occupancy"""
     def __init__(self, parent, app, controller):
@@ -73,9 +209,8 @@ class ParkingOverviewFrame(MainFrame):
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=1)
 
-        parking_lot = self.controller.parking_lot
-        self.parking_lot = ttk.Label(column_right, text=str(parking_lot), style="Default.TLabel")
-        self.parking_lot.pack(pady=(1, 0))
+        self.parking_lot = ParkingLotView(column_right, self.controller.parking_lot) # Updated by the lot itself after every change
+        self.parking_lot.pack(fill="both", expand=True, pady=(1, 0))
 
         """Entry Form, Structure and initialisation"""
         
@@ -94,7 +229,9 @@ class ParkingOverviewFrame(MainFrame):
         ttk.Label(column_left, text="Registration Plate", style="Default.TLabel").pack(pady=(1,0))
         ttk.Entry(column_left, textvariable=plate).pack(pady=(1,0))
         ttk.Radiobutton(column_left, text='Enter', variable=action, value='enter').pack(pady=(3,0))
+        ttk.Radiobutton(column_left, text='Enter (any free spot)', variable=action, value='enter_auto').pack(pady=(3,0))
         ttk.Radiobutton(column_left, text='Exit', variable=action, value='exit',).pack(pady=(3,0))
+        ttk.Radiobutton(column_left, text='Exit (plate only)', variable=action, value='exit_plate',).pack(pady=(3,0))
         ttk.Button(column_left, text='Submit', command=lambda: self.submit(int(floor.get()),int(row.get()),int(spot.get()),plate.get(),action.get())).pack(pady=(3,0))
 
         """Creation Form, Structure and initialisation"""
@@ -118,12 +255,15 @@ class ParkingOverviewFrame(MainFrame):
         control = ""
         if action == "enter":
             control = self.controller.new_entry(floor,row,spot,plate)
+        elif action == "enter_auto":
+            control = self.controller.new_entry_auto(plate)
         elif action == "exit":
             control = self.controller.new_exit(floor,row,spot,plate)
+        elif action == "exit_plate":
+            control = self.controller.new_exit_by_plate(plate)
         else:
             control = "[Error] Please, enter an action"
         self.app.banner_frame.notification = control
-        self.parking_lot.config(text=self.controller.parking_lot)
 
     def submitCreate(self,floor,row,spot,action):
         if action == "create":
@@ -135,14 +275,50 @@ class ParkingOverviewFrame(MainFrame):
             # TODO : apply color (error messages start with [Error])
         else:
             print("Please, enter an action")
-        self.parking_lot.config(text=self.controller.parking_lot)
+
+class PagedListView(ttk.Frame):
+    """
+    Scrollable list loading its lines one page at a time.
+    fetch_page(cursor) must return (items, next_cursor) : it is called with cursor 0 for the first page,
+    and next_cursor is None once the last page was loaded. The next page is loaded when the list
+    is scrolled to its end, or with the "Load more" button
+    """
+    def __init__(self, parent, fetch_page):
+        super().__init__(parent, style="Default.TFrame")
+        self.fetch_page = fetch_page
+        self.cursor = 0
+
+        self.listbox = Listbox(self, height=25, width=90, borderwidth=0, activestyle="none")
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.listbox.yview)
+        self.listbox.configure(yscrollcommand=lambda first, last: self.on_scroll(scrollbar, first, last))
+        self.more_button = ttk.Button(self, text="Load more", style="Default.TButton", command=self.load_page)
+        self.listbox.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.more_button.grid(row=1, column=0, columnspan=2, pady=(3, 0))
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.load_page()
+
+    def load_page(self):
+        """Appends the next page to the list"""
+        if self.cursor is None:
+            return
+        items, self.cursor = self.fetch_page(self.cursor)
+        self.listbox.insert("end", *(str(item) for item in items))
+        if self.cursor is None:
+            self.more_button.state(["disabled"])
+
+    def on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 1.0 and self.cursor is not None:
+            self.after_idle(self.load_page) # Scrolled to the end of the loaded lines
 
 class PaymentsOverviewFrame(MainFrame):
     """Frame used to encode or review payments"""
     def __init__(self, parent, app, controller):
         super().__init__(parent, app, controller)
-        for i in self.controller.fetch_payments_data():
-            ttk.Label(self, text=i, style="Default.TLabel").pack(pady=(1,0))
+        self.payments = PagedListView(self, self.controller.fetch_payments_page)
+        self.payments.pack(fill="both", expand=True, pady=(1,0))
 
 class PremiumCarsOverviewFrame(MainFrame):
     """Frame used to manage subscribers"""
@@ -173,6 +349,46 @@ class AnalyticsOverviewFrame(MainFrame):
     """Frame used to visualize current or past data about the parking lots and generate reports"""
     def __init__(self, parent, app, controller):
         super().__init__(parent, app, controller)
-        for i in self.controller.fetch_all_usages():
-            ttk.Label(self, text=i, style="Default.TLabel").pack(pady=(1,0))
+        self.usages = PagedListView(self, self.controller.fetch_usages_page)
+        self.usages.pack(fill="both", expand=True, pady=(1,0))
+
+class StatsOverviewFrame(MainFrame):
+    """Frame showing the call counts and latencies of the instrumented methods, and the last slow calls"""
+    REFRESH_INTERVAL = 1000 # ms
+
+    def __init__(self, parent, app, controller):
+        super().__init__(parent, app, controller)
+        buttons = ttk.Frame(self, style="Default.TFrame")
+        self.toggle_button = ttk.Button(buttons, style="Default.TButton", command=lambda: self.notify(self.controller.toggle()))
+        self.toggle_button.pack(side="left", padx=(0, 4))
+        ttk.Button(buttons, text="Reset", style="Default.TButton", command=lambda: self.notify(self.controller.reset())).pack(side="left", padx=(0, 4))
+        ttk.Button(buttons, text="Export", style="Default.TButton", command=lambda: self.notify(self.controller.export())).pack(side="left")
+        buttons.pack(fill="x", pady=(1, 0))
+
+        columns = ("calls", "mean", "p95", "max")
+        self.table = ttk.Treeview(self, columns=columns, height=15)
+        self.table.heading("#0", text="Method")
+        self.table.column("#0", width=320)
+        for column, title in zip(columns, ("Calls", "Mean (ms)", "p95 (ms)", "Max (ms)")):
+            self.table.heading(column, text=title)
+            self.table.column(column, width=90, anchor="e")
+        self.table.pack(fill="both", expand=True, pady=(3, 0))
+        ttk.Label(self, text="Slow calls", style="Default.TLabel").pack(pady=(3, 0))
+        self.slow_calls = Listbox(self, height=6, width=90, borderwidth=0, activestyle="none")
+        self.slow_calls.pack(fill="x", pady=(1, 0))
+        self.refresh()
+
+    def notify(self, message):
+        self.app.banner_frame.notification = message
+        self.refresh(reschedule=False)
 
+    def refresh(self, reschedule=True):
+        """Redraws the statistics, then every REFRESH_INTERVAL while the frame exists"""
+        self.toggle_button.config(text="Disable" if self.controller.enabled else "Enable")
+        self.table.delete(*self.table.get_children())
+        for name, calls, mean, p95, maximum in self.controller.fetch_rows():
+            self.table.insert("", "end", text=name, values=(calls, f"{mean:.3f}", f"{p95:.3f}", f"{maximum:.3f}"))
+        self.slow_calls.delete(0, "end")
+        self.slow_calls.insert("end", *self.controller.fetch_slow_calls())
+        if reschedule:
+            self.after(self.REFRESH_INTERVAL, self.refresh)
@@ -1,13 +1,22 @@
+from queue import Empty, SimpleQueue
 from tkinter import ttk
 from interface.frames import LogoFrame, TitleFrame, BannerFrame, SidebarFrame, ParkingOverviewFrame
-from controllers import ParkingController
+from controllers import DatabaseController, ParkingController
+from controllers.write_queue import WriteQueue
 
 class ParkEaseApp:
     """
     A class that represents the window available to the user. It contains frames and can replace them to display different views
     """
+    ERROR_POLL_INTERVAL = 200 # ms between two checks of the failed writes
+    CHECKPOINT_INTERVAL = 60000 # ms between two checks of the journal of the parking lot
+    BOOKING_INTERVAL = 1000 # ms between two checks of the booking timers
+
     def __init__(self, root):
         self.root = root
+        # Database writes run on the writer thread, their errors are shown in the banner by the Tk thread
+        self.write_errors = SimpleQueue()
+        self.write_queue = WriteQueue(DatabaseController(), on_error=self.write_errors.put)
         self.root.title("ParkEase - Simple parking management")
         self.root.configure(background="white")
 
@@ -26,6 +35,47 @@ class ParkEaseApp:
 
         self.init_grid()
         self.switch_mainframe(ParkingOverviewFrame, ParkingController, "Parking Management")
+        self.root.after(self.ERROR_POLL_INTERVAL, self.report_write_errors)
+        self.root.after(self.CHECKPOINT_INTERVAL, self.checkpoint_periodically)
+        self.root.after(self.BOOKING_INTERVAL, self.process_bookings_periodically)
+
+    def report_write_errors(self):
+        """Shows the last failed database write in the banner. Tk widgets may only be used by the Tk thread, hence the polling"""
+        error = None
+        try:
+            while True:
+                error = self.write_errors.get_nowait()
+        except Empty:
+            pass
+        if error is not None:
+            self.banner_frame.notification = f"[Error] A database write failed, restart to resynchronize : {error}"
+        self.root.after(self.ERROR_POLL_INTERVAL, self.report_write_errors)
+
+    def checkpoint(self, force: bool = False):
+        """Writes a snapshot of the parking lot if the current view manages it (see ParkingController.checkpoint())"""
+        controller = getattr(self.current_mainframe, "controller", None)
+        if hasattr(controller, "checkpoint"):
+            controller.checkpoint(force)
+
+    def checkpoint_periodically(self):
+        """Checks the journal of the parking lot every CHECKPOINT_INTERVAL ms"""
+        self.checkpoint()
+        self.root.after(self.CHECKPOINT_INTERVAL, self.checkpoint_periodically)
+
+    def process_bookings_periodically(self):
+        """Applies the booking timers that are due if the current view manages the parking lot (see ParkingController.process_bookings()).
+           The last change is shown in the banner"""
+        controller = getattr(self.current_mainframe, "controller", None)
+        if hasattr(controller, "process_bookings"):
+            messages = controller.process_bookings()
+            if messages:
+                self.banner_frame.notification = messages[-1]
+        self.root.after(self.BOOKING_INTERVAL, self.process_bookings_periodically)
+
+    def close(self):
+        """Flushes the pending database writes and snapshots the parking lot, called once the main loop is over"""
+        self.checkpoint(force=True)
+        self.write_queue.close()
 
     def init_grid(self):
         """Initializes the grid layout"""
@@ -47,7 +97,9 @@ class ParkEaseApp:
         if isinstance(self.current_mainframe, frame_class):
             return
         if self.current_mainframe is not None:
+            self.checkpoint(force=True) # The next ParkingController restores the lot from the snapshot
             self.current_mainframe.destroy() # Frees memory for the current frame
+        self.write_queue.flush() # The new view reads the database
         self.current_mainframe = frame_class(self.root, self, frame_controller_class(self)) # Sets the current frame to a new object of class *frame_class* (parent given as argument)
         self.current_mainframe.grid(row=2, column=1, sticky="nsew", padx=10, pady=10)
         self.title_frame.title = title
@@ -1,14 +1,21 @@
 import os
-from tkinter import Tk
-from interface.gui import ParkEaseApp
 from controllers import DatabaseController
+from controllers.connection_manager import ConnectionManager
 
 def main():
     db_controller = DatabaseController()
-    if not os.path.exists(db_controller.path):
-        os.makedirs(db_controller.directory, exist_ok=True) # Ensure the directory exists
-        db_controller.init_database()
+    os.makedirs(db_controller.directory, exist_ok=True) # Ensure the directory exists
+    db_controller.migrate() # Creates the database, or upgrades an existing one to the latest schema
+    if os.environ.get("PARKEASE_INSTRUMENTATION"):
+        from controllers.instrumentation import INSTRUMENTATION
+        INSTRUMENTATION.enable() # Also available from the "Performance stats" panel
 
+    # Tk is only loaded once the database is ready, the core package doesn't depend on it
+    from tkinter import Tk
+    from interface.gui import ParkEaseApp
     root = Tk()
     app = ParkEaseApp(root)
     root.mainloop()
+    app.close() # Writes still queued are committed before exiting
+    ConnectionManager.close_all_managers() # Checkpoints the WAL and releases the pooled connections
+
@@ -1,6 +1,8 @@
-from typing import Dict
-
-from pip._vendor.rich import status
+import gc
+import heapq
+import sys
+import threading
+from contextlib import ExitStack, contextmanager, nullcontext
 
 
 class ParkingSpot:
@@ -22,9 +24,22 @@ class ParkingSpot:
               Only that person can be placed in that spot
         - _booking_id (read-only str | None) : The id of the current booking
           linked to the spot. None if the spot is not booked
+        - floor_number, row_number (read-only int | None) : The position of the spot
+          once it was added to a ParkingLot. None for a standalone spot
+
+    enter(), exit(), book() and unbook() are atomic check-and-set operations : the status is checked
+    and changed while holding the lock of the spot (see ParkingLot.spot_lock()), so two gates can't
+    both take the same spot
     """
 
-    ALLOWED_STATUSES = ["free", "occupied", "booked"] 
+    ALLOWED_STATUSES = ["free", "occupied", "booked"]
+    # The status is stored as its index in ALLOWED_STATUSES
+    FREE, OCCUPIED, BOOKED = range(3)
+    _STATUS_CODES = {status: code for code, status in enumerate(ALLOWED_STATUSES)}
+
+    # Large lots hold hundreds of thousands of spots : no per-instance __dict__, and the linked car
+    # is stored as its registration plate and class instead of a Car object (see linked_car)
+    __slots__ = ("_id", "_spot_number", "_code", "_plate", "_car_class", "_lot", "_location")
 
     def __init__(self, id: int,
                  spot_number: int,
@@ -32,8 +47,11 @@ class ParkingSpot:
         """"""
         self._id = id
         self._spot_number = spot_number
+        self._lot = None # ParkingLot notified of every status change, set by ParkingLot.add_spot()
+        self._location = None # (floor_number, row_number) shared with the ParkingRow, set by ParkingLot.add_spot()
+        self._plate = None
+        self._car_class = None
         self.status = status # Forces usage of @status.setter
-        self.linked_car = None
 
     @property
     def id(self):
@@ -45,41 +63,82 @@ class ParkingSpot:
         """"""
         return self._spot_number
 
+    @property
+    def floor_number(self):
+        """"""
+        return self._location[0] if self._location is not None else None
+
+    @property
+    def row_number(self):
+        """"""
+        return self._location[1] if self._location is not None else None
+
     @property
     def status(self):
         """"""
-        return self._status
+        return self.ALLOWED_STATUSES[self._code]
 
     @status.setter
     def status(self, status: str):
         """"""
-        if status not in self.ALLOWED_STATUSES:
+        code = self._STATUS_CODES.get(status)
+        if code is None:
             raise ValueError(f"""Invalid status '{status}'.
             Must be one the following : {self.ALLOWED_STATUSES}""")
-        self._status = status
+        self._code = code
+        if self._lot is not None:
+            self._lot._spot_changed(self) # Keeps the indexes of the lot in sync
+
+    @property
+    def linked_car(self):
+        """The car linked to the spot (StandardCar or PremiumCar), None if there is none.
+           The Car object is rebuilt from the stored plate and class on every access"""
+        if self._car_class is None:
+            return None
+        return self._car_class(self._plate)
+
+    @linked_car.setter
+    def linked_car(self, car):
+        """"""
+        if car is None:
+            self._plate = self._car_class = None
+        else:
+            self._plate = sys.intern(car.registration_plate) # The same plate comes back day after day
+            self._car_class = type(car)
+
+    @property
+    def registration_plate(self):
+        """The registration plate of the linked car, None if there is none"""
+        return self._plate
 
     def __str__(self):
         """"""
         string = f"Spot {self.spot_number} : {self.status}"
-        if self.status != "free":
+        if self._code != self.FREE:
             # Adds the registration plate if the spot is occupied or booked
             string += f" by {self.linked_car}"
         return string
 
+    def lock(self):
+        """Returns the lock of the spot in its lot (see ParkingLot.spot_lock()), a no-op lock for a standalone spot"""
+        lot = self._lot
+        return lot.spot_lock(self) if lot is not None else nullcontext()
+
     def enter(self, registration_plate: str, is_premium: bool):
         """
         PRE : None
         POST : Change le statut du spot en "occupé" si le spot était libre et attribue une voiture avec sa plaque au spot. Si la place était boookée, change la booking_plate en None
         RAISES : AssertionError si le spot n'était pas "libre" et AssertionError si la place était bookée et que la plaque d'immatriculation enregistrée ne correspond pas à la booking_plate
         """
-        if self.status == "booked":
-            assert self.linked_car.registration_plate == registration_plate and is_premium
-        elif self.status == "free":
-            car_class = PremiumCar if is_premium else StandardCar
-            self.linked_car = car_class(registration_plate)
-        else:
-            raise AssertionError("The spot is already occupied")
-        self.status = "occupied"
+        with self.lock():
+            if self._code == self.BOOKED:
+                assert self._plate == registration_plate and is_premium
+            elif self._code == self.FREE:
+                car_class = PremiumCar if is_premium else StandardCar
+                self.linked_car = car_class(registration_plate)
+            else:
+                raise AssertionError("The spot is already occupied")
+            self.status = "occupied"
 
     def exit(self, registration_plate: str):
         """
@@ -87,14 +146,15 @@ class ParkingSpot:
         POST : Change le statut du spot en "libre" si le spot était occupé et désattribue la voiture désignée de ce spot
         RAISES : AssertionError si le spot n'était pas "occupé" ou si la plaque entrée dans les paramètres ne correspond pas à la plaque du véhicule sur le spot
         """
-        assert (self.status == "occupied") and (self.linked_car.registration_plate == registration_plate) # Raises an error if the spot isn't occupied or if the plates don't match
-        self.status = "free"
-        self.linked_car = None
+        with self.lock():
+            assert (self._code == self.OCCUPIED) and (self._plate == registration_plate) # Raises an error if the spot isn't occupied or if the plates don't match
+            self.status = "free"
+            self.linked_car = None
 
     def pay(self, registration_plate : str, time_spent : float):
         """Returns the amount that has to be paid by the car"""
-        assert (self.status == "occupied") and (registration_plate == self.linked_car.registration_plate) # Raises an error if the spot isn't occupied or if the plates don't match
-        return self.linked_car.HOURLY_RATE * time_spent
+        assert (self._code == self.OCCUPIED) and (registration_plate == self._plate) # Raises an error if the spot isn't occupied or if the plates don't match
+        return self._car_class.HOURLY_RATE * time_spent
 
     def book(self, registration_plate : str, is_premium: bool):
         """
@@ -104,15 +164,30 @@ class ParkingSpot:
         POST : change le statut du spot en "booké", lui attribue un identifiant de booking, tout ça si le client est premium
         RAISES : AssertionError si le client n'est pas premium et/ou que la place était occupée, TypeError si la Registration_plate n'est pas une string
         """
-        assert self.status == "free" and is_premium
-        self.status = "booked"
-        self.linked_car = PremiumCar(registration_plate)
+        with self.lock():
+            assert self._code == self.FREE and is_premium
+            self.linked_car = PremiumCar(registration_plate) # Linked before the status changes so the lot indexes the plate
+            self.status = "booked"
+
+    def unbook(self, registration_plate: str):
+        """
+        PRE : None
+        POST : Change le statut du spot en "libre" si le spot était booké par registration_plate (réservation annulée ou expirée)
+        RAISES : AssertionError si le spot n'était pas "booké" ou si la plaque ne correspond pas à celle de la réservation
+        """
+        with self.lock():
+            assert (self._code == self.BOOKED) and (self._plate == registration_plate)
+            self.status = "free"
+            self.linked_car = None
 
 class ParkingRow:
     """"""
+    __slots__ = ("_row_number", "_location", "spots")
+
     def __init__(self, row_number: int):
         """"""
         self._row_number = row_number
+        self._location = None # (floor_number, row_number) shared by the spots of the row, set by ParkingLot.add_spot()
         self.spots = {}
 
     @property
@@ -127,10 +202,11 @@ class ParkingRow:
             output.append(f"            {str(self.spots[spot])}")
         return "\n".join(output)
 
-    def add_spot(self, spot: Dict[str, int]):
+    def add_spot(self, spot: dict):
         """"""
         #spot.keys() = "id", "spot_number"
-        self.spots[spot["spot_number"]] = ParkingSpot(spot["id"], spot["spot_number"])
+        parking_spot = self.spots[spot["spot_number"]] = ParkingSpot(spot["id"], spot["spot_number"])
+        return parking_spot
 
     def remove_spot(self, spot_number : int):
         """"""
@@ -138,6 +214,8 @@ class ParkingRow:
 
 class ParkingFloor:
     """"""
+    __slots__ = ("_floor_number", "rows")
+
     def __init__(self, floor_number: int):
         """"""
         self._floor_number = floor_number
@@ -155,13 +233,13 @@ class ParkingFloor:
             output.append(f"        {str(self.rows[row])}")
         return "\n".join(output)
 
-    def add_spot(self, spot: Dict[str, int]):
+    def add_spot(self, spot: dict):
         """"""
         #spot.keys() = "id", "spot_number", "row_number"
         id, spot_number, row_number = spot["id"], spot["spot_number"], spot["row_number"]
         if row_number not in self.rows:
             self.rows[row_number] = ParkingRow(row_number)
-        self.rows[row_number].add_spot({"id": id, "spot_number": spot_number})
+        return self.rows[row_number].add_spot({"id": id, "spot_number": spot_number})
 
     def remove_spot(self, spot):
         """"""
@@ -170,8 +248,86 @@ class ParkingFloor:
         if not self.rows[row_number].spots:
             del self.rows[row_number]
 
+class FreeSpotAllocator:
+    """
+    Keeps the free spots of a ParkingLot in a min-heap ordered by their allocation key,
+    so the best free spot is found in O(log n) instead of walking every floor, row and spot.
+    Spots that stop being free are only removed from the heap lazily (when they reach the top),
+    the heap is rebuilt when those stale entries outnumber the free spots.
+    """
+    def __init__(self, key):
+        """key is a function returning the allocation key (a tuple) of a spot"""
+        self._key = key
+        self._heap = [] # Allocation key + (spot id,), flat tuples to keep large lots small
+        self._free = {} # Spot id -> every spot currently free
+        self._free_per_floor = {}
+
+    def __len__(self):
+        """"""
+        return len(self._free)
+
+    def add(self, spot: "ParkingSpot"):
+        """Marks spot as free"""
+        if self._free.get(spot.id) is spot:
+            return
+        self._free[spot.id] = spot
+        self._free_per_floor[spot.floor_number] = self._free_per_floor.get(spot.floor_number, 0) + 1
+        heapq.heappush(self._heap, self._key(spot) + (spot.id,))
+
+    def add_many(self, spots):
+        """Marks every spot of spots as free, the heap is rebuilt once in O(n) instead of one push per spot"""
+        heap = self._heap
+        for spot in spots:
+            if self._free.get(spot.id) is spot:
+                continue
+            self._free[spot.id] = spot
+            self._free_per_floor[spot.floor_number] = self._free_per_floor.get(spot.floor_number, 0) + 1
+            heap.append(self._key(spot) + (spot.id,))
+        heapq.heapify(heap)
+
+    def discard(self, spot: "ParkingSpot"):
+        """Marks spot as unavailable (occupied, booked or removed)"""
+        if self._free.get(spot.id) is not spot:
+            return
+        del self._free[spot.id]
+        self._free_per_floor[spot.floor_number] -= 1
+        if len(self._heap) > 2 * len(self._free) + 64:
+            self._heap = [self._key(spot) + (spot.id,) for spot in self._free.values()]
+            heapq.heapify(self._heap)
+
+    def peek(self):
+        """Returns the free spot with the smallest key, None if there is no free spot"""
+        heap = self._heap
+        while heap:
+            entry = heap[0]
+            spot = self._free.get(entry[-1])
+            if spot is not None and self._key(spot) == entry[:-1]:
+                return spot
+            heapq.heappop(heap) # Stale entry : the spot was taken or removed since it was pushed
+        return None
+
+    def free_count(self, floor_number: int = None) -> int:
+        """Returns the number of free spots in the lot, or on floor_number"""
+        if floor_number is None:
+            return len(self._free)
+        return self._free_per_floor.get(floor_number, 0)
+
+    def spots(self):
+        """Returns every free spot, in allocation order"""
+        return sorted(self._free.values(), key=self._key)
+
 class ParkingLot:
-    """"""
+    """
+    Concurrency : the lot may be shared by several gate threads.
+        - Each spot is guarded by one of LOCK_STRIPES reentrant locks (spot_lock(), chosen by spot id), held by the
+          check-and-set methods of ParkingSpot. Gates working on different spots rarely wait for each other.
+        - The indexes of the lot (plates, free spots) and its layout are guarded by a single lot lock, only held
+          for the few dict and heap operations of a change. The listeners are called with it held, one change at a time.
+    Locks are always taken in that order (a spot, then the lot) and a thread never holds the locks of two spots at once
+    """
+
+    LOCK_STRIPES = 64 # Locks shared by the spots : one lock per spot would weigh more than the spot itself
+
     def __init__(self, lot_number: int):
         """
         PRE : None
@@ -184,12 +340,39 @@ class ParkingLot:
             raise ValueError("lot_number must be positive")
         self._lot_number = lot_number
         self.floors = {}
+        self._spots_by_plate = {} # Registration plate -> ParkingSpot currently occupied or booked by that car
+        self._plates_by_spot = {} # ParkingSpot id -> registration plate indexed for that spot
+        self._free_spots = FreeSpotAllocator(lambda spot: self.allocation_key(*spot._location, spot._spot_number))
+        self._listeners = []
+        self._lock = threading.RLock() # Indexes and layout, see the class docstring
+        self._spot_locks = tuple(threading.RLock() for _ in range(self.LOCK_STRIPES))
 
     @property
     def lot_number(self):
         """"""
         return self._lot_number
 
+    def spot_lock(self, spot: ParkingSpot):
+        """
+        PRE : spot is a spot of the lot
+        POST : Returns the reentrant lock guarding spot. Holding it makes a check of the spot and the changes that
+               depend on it (e.g. its database write) atomic for the other threads. Don't take the lock of another spot meanwhile
+        """
+        return self._spot_locks[spot.id % self.LOCK_STRIPES]
+
+    @contextmanager
+    def frozen(self):
+        """
+        PRE : The calling thread holds no spot lock taken from another thread's order (see the class docstring)
+        POST : Holds every lock of the lot until the block exits : no spot changes meanwhile, except through the calling thread.
+               Used to apply a batch of changes, or to save a snapshot matching a database version
+        """
+        with ExitStack() as stack:
+            for lock in self._spot_locks: # Always in the same order, so two frozen() calls can't deadlock
+                stack.enter_context(lock)
+            stack.enter_context(self._lock)
+            yield self
+
     def __str__(self):
         """"""
         output = [f"Parking {self.lot_number}"]
@@ -197,7 +380,7 @@ class ParkingLot:
             output.append(f"    {str(self.floors[floor])}")
         return "\n".join(output)
 
-    def add_spot(self, spot: Dict[str, int]):
+    def add_spot(self, spot: dict):
         """"
         PRE : Spot est un dictionnaire dont les clés sont
               "id", "spot_number", "row_number", "floor_number",
@@ -205,7 +388,7 @@ class ParkingLot:
         POST : Si l'étage demandé n'existe pas, il est créé (à vide).
                Appelle ensuite la méthode add_spot() de l'objet ParkingFloor,
                qui va créer un ParkingRow si besoin.
-               À terme, L'objet ParkingSpot est créé dans le ParkingRow correspondant
+               À terme, L'objet ParkingSpot est créé dans le ParkingRow correspondant, puis retourné
         RAISES : ValueError si l'emplacement existe déjà,
                  TypeError si spot n'est pas un dictionnaire
                  ou ne correspond pas à la description indiquée
@@ -218,6 +401,11 @@ class ParkingLot:
                 raise TypeError(f"{key} is not in spot")
             if spot[key] <= 0 and key != "floor_number":
                 raise ValueError(f"{key} must be strictly positive")
+        with self._lock:
+            return self._add_spot(spot)
+
+    def _add_spot(self, spot: dict):
+        """add_spot() once spot is validated, with the lot lock held"""
         id, spot_number, row_number, floor_number = spot["id"], spot["spot_number"], spot["row_number"], spot["floor_number"] 
         if (f:= self.floors.get(floor_number)) is not None:
             if (r:= f.rows.get(row_number)) is not None:
@@ -225,9 +413,70 @@ class ParkingLot:
                     raise ValueError("There is already an existing spot at this position")
         if floor_number not in self.floors:
             self.floors[floor_number] = ParkingFloor(floor_number)
-        self.floors[floor_number].add_spot({"id": id, 
-                                            "spot_number": spot_number,
-                                            "row_number": row_number})
+        parking_spot = self.floors[floor_number].add_spot({"id": id,
+                                                           "spot_number": spot_number,
+                                                           "row_number": row_number})
+        row = self.floors[floor_number].rows[row_number]
+        if row._location is None:
+            row._location = (floor_number, row_number)
+        parking_spot._location = row._location # A single tuple per row
+        parking_spot._lot = self
+        self._index_spot(parking_spot)
+        self._notify("added", parking_spot)
+        return parking_spot
+
+    def load_spots(self, spots) -> dict:
+        """
+        PRE : spots est un itérable de tuples (id, spot_number, row_number, floor_number, registration_plate, is_premium),
+              registration_plate valant None si l'emplacement est libre
+        POST : Ajoute chaque emplacement au lot, occupé par sa voiture si registration_plate n'est pas None, comme le feraient
+               add_spot() puis enter(), sans valider les tuples un par un ni prévenir les listeners.
+               Les emplacements libres sont indexés en une fois. Utilisé pour charger un lot entier au démarrage
+        RETURNS : Un dictionnaire {id: ParkingSpot} des emplacements chargés
+        RAISES : ValueError si un emplacement existe déjà à la même position
+        """
+        # Every object allocated here stays alive : the cyclic garbage collector would only scan them over and over
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self._lock:
+                return self._load_spots(spots)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _load_spots(self, spots) -> dict:
+        """load_spots() without the garbage collector"""
+        loaded, free = {}, []
+        floors, spots_by_plate, plates_by_spot = self.floors, self._spots_by_plate, self._plates_by_spot
+        new_spot = ParkingSpot.__new__
+        for id, spot_number, row_number, floor_number, registration_plate, is_premium in spots:
+            floor = floors.get(floor_number)
+            if floor is None:
+                floor = floors[floor_number] = ParkingFloor(floor_number)
+            row = floor.rows.get(row_number)
+            if row is None:
+                row = floor.rows[row_number] = ParkingRow(row_number)
+                row._location = (floor_number, row_number)
+            if spot_number in row.spots:
+                raise ValueError("There is already an existing spot at this position")
+            # Built without __init__ : the status setter would index the spot once per spot instead of once for the lot
+            parking_spot = row.spots[spot_number] = new_spot(ParkingSpot)
+            parking_spot._id, parking_spot._spot_number = id, spot_number
+            parking_spot._location, parking_spot._lot = row._location, self
+            if registration_plate is None:
+                parking_spot._code, parking_spot._plate, parking_spot._car_class = ParkingSpot.FREE, None, None
+                free.append(parking_spot)
+            else:
+                registration_plate = sys.intern(registration_plate)
+                parking_spot._plate = registration_plate
+                parking_spot._car_class = PremiumCar if is_premium else StandardCar
+                parking_spot._code = ParkingSpot.OCCUPIED
+                spots_by_plate[registration_plate] = parking_spot
+                plates_by_spot[id] = registration_plate
+            loaded[id] = parking_spot
+        self._free_spots.add_many(free)
+        return loaded
 
     def remove_spot(self, spot):
         """
@@ -242,21 +491,133 @@ class ParkingLot:
             if not key in keys:
                 raise TypeError(f"{key} is not in spot")
         spot_number, row_number, floor_number = spot["spot_number"], spot["row_number"], spot["floor_number"]
-        if (self.floors.get(floor_number) is None) or (self.floors[floor_number].rows.get(row_number) is None) or (self.floors[floor_number].rows[row_number].spots.get(spot_number) is None):
+        parking_spot = self._spot_at(floor_number, row_number, spot_number)
+        if parking_spot is None:
             raise ValueError("There is no existing spot at this position")
-        self.floors[floor_number].remove_spot({"spot_number": spot_number, "row_number": row_number})
-        if not self.floors[floor_number].rows:
-            del self.floors[floor_number]
+        with self.spot_lock(parking_spot), self._lock:
+            # Looked up again : another thread may have removed the spot while this one waited for the locks
+            if self._spot_at(floor_number, row_number, spot_number) is not parking_spot:
+                raise ValueError("There is no existing spot at this position")
+            self._unindex_plate(parking_spot)
+            self._free_spots.discard(parking_spot)
+            parking_spot._lot = None
+            self.floors[floor_number].remove_spot({"spot_number": spot_number, "row_number": row_number})
+            if not self.floors[floor_number].rows:
+                del self.floors[floor_number]
+            self._notify("removed", parking_spot)
+
+    def _spot_at(self, floor_number: int, row_number: int, spot_number: int):
+        """Returns the ParkingSpot at this position, None if there is none"""
+        if (f:= self.floors.get(floor_number)) is not None:
+            if (r:= f.rows.get(row_number)) is not None:
+                return r.spots.get(spot_number)
+        return None
+
+    def find_car(self, registration_plate: str):
+        """
+        PRE : None
+        POST : Returns the ParkingSpot occupied or booked by registration_plate in O(1), None if the car isn't in the lot
+        """
+        return self._spots_by_plate.get(registration_plate)
+
+    @staticmethod
+    def allocation_key(floor_number: int, row_number: int, spot_number: int) -> tuple:
+        """
+        Order in which free spots are handed out by next_free_spot().
+        The closest floors to the ground level (where the entrance is) come first, the basement before
+        the upper floor at the same distance, then the lowest row and spot numbers of that floor
+        """
+        return (abs(floor_number), floor_number, row_number, spot_number)
+
+    def next_free_spot(self):
+        """
+        PRE : None
+        POST : Returns in O(log n) the free ParkingSpot closest to the entrance (see allocation_key()),
+               None if the lot is full. The spot isn't reserved : its status is left unchanged
+        """
+        with self._lock:
+            return self._free_spots.peek()
+
+    def free_spots(self):
+        """Returns the list of every free ParkingSpot of the lot, closest to the entrance first"""
+        with self._lock:
+            return self._free_spots.spots()
+
+    def iter_spots(self):
+        """Yields every ParkingSpot of the lot, closest to the entrance first (see allocation_key()).
+           Each floor is copied under the lot lock once it is reached, so spots added or removed by another thread
+           meanwhile don't break the iteration, and stopping early is cheap"""
+        with self._lock:
+            floor_numbers = sorted(self.floors, key=lambda floor_number: (abs(floor_number), floor_number))
+        for floor_number in floor_numbers:
+            with self._lock:
+                floor = self.floors.get(floor_number)
+                if floor is None:
+                    continue # Removed since
+                spots = [floor.rows[row_number].spots[spot_number] for row_number in sorted(floor.rows)
+                                                                   for spot_number in sorted(floor.rows[row_number].spots)]
+            yield from spots
+
+    def free_spots_count(self, floor_number: int = None) -> int:
+        """Returns the number of free spots of the lot, or of floor_number only"""
+        with self._lock:
+            return self._free_spots.free_count(floor_number)
+
+    def add_listener(self, listener):
+        """
+        PRE : listener is a callable taking two arguments (event, spot)
+        POST : listener is called after every change of the lot, event being "added" or "removed" when spot
+               is added to/removed from the lot, and "changed" when the status of spot changed
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stops calling listener. Does nothing if it wasn't registered"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, spot: ParkingSpot):
+        """"""
+        for listener in self._listeners:
+            listener(event, spot)
+
+    def _spot_changed(self, spot: ParkingSpot):
+        """Called by a spot of the lot after each status change"""
+        with self._lock:
+            self._index_spot(spot)
+            self._notify("changed", spot)
+
+    def _index_spot(self, spot: ParkingSpot):
+        """Updates the plate index and the free spots after a change of spot"""
+        self._unindex_plate(spot)
+        if spot._code != ParkingSpot.FREE and spot._plate is not None:
+            registration_plate = spot._plate
+            self._spots_by_plate[registration_plate] = spot
+            self._plates_by_spot[spot.id] = registration_plate
+        if spot._code == ParkingSpot.FREE:
+            self._free_spots.add(spot)
+        else:
+            self._free_spots.discard(spot)
+
+    def _unindex_plate(self, spot: ParkingSpot):
+        """Removes the plate previously indexed for spot, if any"""
+        registration_plate = self._plates_by_spot.pop(spot.id, None)
+        if registration_plate is not None and self._spots_by_plate.get(registration_plate) is spot:
+            del self._spots_by_plate[registration_plate]
 
 class Car:
     """"""
+    __slots__ = ("registration_plate",)
+
     def __init__(self, registration_plate):
         """"""
         self.registration_plate = registration_plate
 
 class StandardCar(Car):
     """"""
-    HOURLY_RATE = 3.00
+    HOURLY_RATE = 3.00 # Flat rate of ParkingSpot.pay(), the gates price sessions with the tariffs of the database
+    TARIFF = "standard" # Name of the tariff of the car in the Tariffs table (see tariffs.py)
+    __slots__ = ()
 
     def __init__(self, registration_plate):
         super().__init__(registration_plate)
@@ -267,6 +628,8 @@ class StandardCar(Car):
 class PremiumCar(Car):
     """"""
     HOURLY_RATE = 2.0
+    TARIFF = "premium"
+    __slots__ = ()
 
     def __init__(self, registration_plate):
         super().__init__(registration_plate)
@@ -276,11 +639,12 @@ class PremiumCar(Car):
 
 class Payment:
     """"""
-    def __init__(self, usage_id, registration_plate, amount):
+    def __init__(self, usage_id, registration_plate, amount, paid_at=None):
         """"""
         self.usage_id = usage_id
         self.registration_plate = registration_plate
         self.amount = amount
+        self.paid_at = paid_at
 
     def __str__(self):
         """"""
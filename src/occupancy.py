@@ -0,0 +1,149 @@
+"""
+Occupancy engine : turns parking sessions (entry/exit intervals) into occupancy curves.
+
+Every session becomes two events (+1 at its entry, -1 at its exit) and every bucket boundary a
+neutral event. Once the events are sorted by time, a single sweep gives the occupancy between two
+consecutive events, so the time-weighted average and the peak of each bucket come out in
+O(n log n) instead of comparing every session with every other one.
+Each event is encoded as a single integer (group, time, kind) so sorting them is a plain integer sort.
+NumPy is used to vectorize the sweep when it is installed, the pure Python sweep is used otherwise.
+"""
+import itertools
+from datetime import datetime, timezone
+
+try:
+    import numpy
+except ImportError: # NumPy is optional
+    numpy = None
+
+ALL_FLOORS = "all"
+
+# Kind of an event, also its order among events happening at the same second
+EXIT, BOUNDARY, ENTRY = 0, 1, 2
+
+def _sweep_python(events, span, step, buckets):
+    """
+    Sweeps the encoded events (time * 4 + kind, times relative to the start of the period) of one group.
+    Returns (average occupancy per bucket, peak occupancy per bucket)
+    """
+    events.extend(i * step * 4 + BOUNDARY for i in range(buckets))
+    events.append(span * 4 + BOUNDARY) # Closes the last segment
+    events.sort()
+    integrals = [0] * buckets
+    peaks = [0] * buckets
+    last_bucket = buckets - 1
+    level = previous = 0
+    for event in events:
+        time, kind = divmod(event, 4)
+        bucket = previous // step # Boundaries are events, so a segment never spans two buckets
+        integrals[bucket if bucket < last_bucket else last_bucket] += level * (time - previous)
+        level += kind - BOUNDARY
+        previous = time
+        bucket = time // step
+        if bucket > last_bucket:
+            bucket = last_bucket
+        if level > peaks[bucket]:
+            peaks[bucket] = level
+    # The last bucket is shorter than step when the period isn't a multiple of it
+    return [integral / min(step, span - i * step) for i, integral in enumerate(integrals)], peaks
+
+def _statistics_python(usages, start, end, step, buckets):
+    """Returns (groups, sessions, dwell total, dwell count), groups mapping each key of the result to its curves"""
+    span = end - start
+    events = {ALL_FLOORS: []}
+    sessions, dwell_total, dwell_count = 0, 0, 0
+    for floor_number, entry, exit in usages:
+        if entry >= end or (exit is not None and exit < start):
+            continue # Doesn't overlap the period
+        sessions += 1
+        if exit is not None and exit <= end:
+            dwell_total += exit - entry
+            dwell_count += 1
+        entry_event = (max(entry, start) - start) * 4 + ENTRY
+        exit_event = ((min(exit, end) if exit is not None else end) - start) * 4 + EXIT
+        floor_events = events.get(floor_number)
+        if floor_events is None:
+            floor_events = events[floor_number] = []
+        floor_events.append(entry_event)
+        floor_events.append(exit_event)
+        events[ALL_FLOORS].append(entry_event)
+        events[ALL_FLOORS].append(exit_event)
+    groups = {key: _sweep_python(group_events, span, step, buckets) for key, group_events in events.items()}
+    return groups, sessions, dwell_total, dwell_count
+
+def _statistics_numpy(usages, start, end, step, buckets):
+    """Vectorized version of _statistics_python(), every group is swept at once"""
+    span = end - start
+    columns = numpy.fromiter(itertools.chain.from_iterable(usages), dtype=numpy.float64).reshape(-1, 3) # None becomes nan
+    floors, entries, exits = columns[:, 0].astype(numpy.int64), columns[:, 1], columns[:, 2]
+    still_parked = numpy.isnan(exits)
+    overlapping = (entries < end) & (still_parked | (exits >= start))
+    floors, entries, exits, still_parked = floors[overlapping], entries[overlapping], exits[overlapping], still_parked[overlapping]
+    ended = ~still_parked & (exits <= end)
+
+    floor_numbers, floor_groups = numpy.unique(floors, return_inverse=True)
+    groups = len(floor_numbers) + 1 # Group 0 is every floor
+    group_span = (span + 1) * 4
+    entry_events = ((numpy.maximum(entries, start) - start) * 4 + ENTRY).astype(numpy.int64)
+    exit_events = ((numpy.where(still_parked, end, numpy.minimum(exits, end)) - start) * 4 + EXIT).astype(numpy.int64)
+    boundary_events = numpy.append(numpy.arange(buckets, dtype=numpy.int64) * step, span) * 4 + BOUNDARY
+    session_groups = (floor_groups.reshape(-1) + 1) * group_span
+    events = numpy.concatenate((
+        entry_events, exit_events, # Group 0
+        entry_events + session_groups, exit_events + session_groups,
+        (numpy.arange(groups, dtype=numpy.int64)[:, None] * group_span + boundary_events).ravel(),
+    ))
+    events.sort()
+
+    group, event = numpy.divmod(events, group_span)
+    time, kind = numpy.divmod(event, 4)
+    levels = numpy.cumsum(kind - BOUNDARY) # The events of a group sum to 0, so each group starts at 0
+    cells = group * buckets + numpy.minimum(time // step, buckets - 1)
+    # The last event of a group has a level of 0, so the segment joining two groups weighs nothing
+    integrals = numpy.bincount(cells[:-1], weights=levels[:-1] * numpy.diff(time), minlength=groups * buckets)
+    cell_starts = numpy.flatnonzero(numpy.concatenate(([True], cells[1:] != cells[:-1])))
+    peaks = numpy.maximum.reduceat(levels, cell_starts) # Every cell holds at least its boundary event
+
+    widths = numpy.minimum(step, span - numpy.arange(buckets, dtype=numpy.int64) * step) # The last bucket may be shorter
+    integrals = (integrals.reshape(groups, buckets) / widths)
+    peaks = peaks.reshape(groups, buckets)
+    keys = [ALL_FLOORS] + floor_numbers.tolist()
+    result = {key: (integrals[i].tolist(), peaks[i].tolist()) for i, key in enumerate(keys)}
+    dwell = exits[ended] - entries[ended]
+    return result, int(overlapping.sum()), float(dwell.sum()), len(dwell)
+
+def occupancy_statistics(usages, start: int, end: int, step: int = 3600, use_numpy: bool = None) -> dict:
+    """
+    PRE : usages is an iterable of (floor_number, entry_time, exit_time) tuples, times being integer UNIX timestamps
+          and exit_time None for the cars still parked. start < end are UNIX timestamps, step is the bucket size in seconds
+    POST : Returns a dict describing the occupancy between start and end :
+            - buckets : the start of each bucket, as "YYYY-MM-DD HH:MM" UTC strings
+            - occupancy : {floor_number or "all": time-weighted average number of cars during each bucket}
+            - peak_occupancy : {floor_number or "all": highest number of cars parked at the same time during each bucket}
+            - peak : highest number of cars parked at the same time in the lot, and peak_time the start of its bucket
+            - sessions : number of sessions overlapping the period
+            - average_dwell_hours : average duration of the sessions that ended during the period (None if there is none)
+    RAISES : ValueError if start >= end or step <= 0
+    """
+    if start >= end or step <= 0:
+        raise ValueError("start must be before end and step must be positive")
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    buckets = -(-(end - start) // step)
+    compute = _statistics_numpy if use_numpy else _statistics_python
+    groups, sessions, dwell_total, dwell_count = compute(usages, start, end, step, buckets)
+
+    occupancy = {key: groups[key][0] for key in [ALL_FLOORS] + sorted(k for k in groups if k != ALL_FLOORS)}
+    peak_occupancy = {key: groups[key][1] for key in occupancy}
+    peaks = peak_occupancy[ALL_FLOORS]
+    peak_bucket = max(range(buckets), key=peaks.__getitem__)
+    labels = [datetime.fromtimestamp(start + i * step, timezone.utc).strftime("%Y-%m-%d %H:%M") for i in range(buckets)]
+    return {
+        "buckets": labels,
+        "occupancy": occupancy,
+        "peak_occupancy": peak_occupancy,
+        "peak": peaks[peak_bucket],
+        "peak_time": labels[peak_bucket],
+        "sessions": sessions,
+        "average_dwell_hours": dwell_total / dwell_count / 3600 if dwell_count else None,
+    }
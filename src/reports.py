@@ -0,0 +1,173 @@
+"""
+Report pipeline : writes rows to a CSV file or to a compact columnar binary file chunk by chunk,
+so an export only holds one chunk in memory, whatever the length of the period.
+
+Columnar format (little-endian) :
+    header    : b"PKEC", format (H), number of columns (H), then for each column its name length (B),
+                its name (UTF-8) and its type (1 byte)
+    row group : number of rows (I), then for each column the length (I) of its zlib-compressed values.
+                One row group per chunk, a row group of 0 rows ends the file
+Column types :
+    i : 64-bit integers, NULL stored as the smallest 64-bit integer
+    t : UNIX timestamps, stored like integers, written as "YYYY-MM-DD HH:MM:SS" (UTC, like the database) in CSV
+    f : 64-bit floats, NULL stored as NaN
+    s : strings, dictionary-encoded per row group (the same plates come back day after day) : the length (I)
+        of the dictionary, the dictionary (UTF-8, \0 separated), then one 32-bit index per row (-1 for NULL)
+"""
+import array
+import csv
+import math
+import os
+import struct
+import sys
+import time
+import zlib
+
+MAGIC = b"PKEC"
+FORMAT = 1
+NULL_INT = -2 ** 63
+COMPRESSION_LEVEL = 1 # Speed first, the large integer columns compress well anyway
+FORMATS = ("csv", "columnar")
+
+USAGE_COLUMNS = (("id", "i"), ("spot_id", "i"), ("floor_number", "i"), ("row_number", "i"), ("spot_number", "i"),
+                 ("registration_plate", "s"), ("entry_time", "t"), ("exit_time", "t"))
+PAYMENT_COLUMNS = (("usage_id", "i"), ("registration_plate", "s"), ("amount", "f"), ("paid_at", "t"))
+
+_HEADER = struct.Struct("<4sHH")
+_LENGTH = struct.Struct("<I")
+_ARRAY_TYPES = {"i": "q", "t": "q", "f": "d"}
+
+def format_timestamp(timestamp) -> str:
+    """Formats a UNIX timestamp like the database does, None stays None"""
+    return None if timestamp is None else time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp))
+
+def _little_endian(values: array.array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _encode(kind: str, values) -> bytes:
+    """Encodes the values of one column of a row group, before compression"""
+    if kind == "s":
+        dictionary = {}
+        indexes = array.array("i", [-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values])
+        words = "\0".join(dictionary).encode()
+        return _LENGTH.pack(len(words)) + words + _little_endian(indexes)
+    if kind == "f":
+        return _little_endian(array.array("d", [math.nan if value is None else value for value in values]))
+    return _little_endian(array.array("q", [NULL_INT if value is None else value for value in values]))
+
+def _decode(kind: str, data: bytes, rows: int) -> list:
+    """Decodes the values of one column of a row group, after decompression"""
+    if kind == "s":
+        length, = _LENGTH.unpack_from(data)
+        dictionary = data[_LENGTH.size:_LENGTH.size + length].decode().split("\0") if length else [""]
+        indexes = array.array("i", data[_LENGTH.size + length:])
+        if sys.byteorder == "big":
+            indexes.byteswap()
+        values = [None if index < 0 else dictionary[index] for index in indexes]
+    else:
+        values = array.array(_ARRAY_TYPES[kind], data)
+        if sys.byteorder == "big":
+            values.byteswap()
+        if kind == "f":
+            values = [None if math.isnan(value) else value for value in values]
+        else:
+            values = [None if value == NULL_INT else value for value in values]
+    if len(values) != rows:
+        raise ValueError("Corrupt columnar report")
+    return values
+
+class CsvReportWriter:
+    """Writes the chunks as the rows of a CSV file, after a header line holding the column names"""
+
+    def __init__(self, file, columns):
+        self._writer = csv.writer(file)
+        self._writer.writerow([name for name, kind in columns])
+        self._timestamps = [i for i, (name, kind) in enumerate(columns) if kind == "t"]
+
+    def write_chunk(self, rows: list) -> None:
+        if self._timestamps:
+            columns = list(zip(*rows))
+            for i in self._timestamps:
+                columns[i] = map(format_timestamp, columns[i])
+            rows = zip(*columns)
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        """Nothing left to write, every row is written by write_chunk()"""
+
+class ColumnarReportWriter:
+    """Writes the chunks as the row groups of a columnar file, see the module docstring"""
+
+    def __init__(self, file, columns):
+        self._file = file
+        self._kinds = [kind for name, kind in columns]
+        header = [_HEADER.pack(MAGIC, FORMAT, len(columns))]
+        for name, kind in columns:
+            encoded = name.encode()
+            header.append(bytes([len(encoded)]) + encoded + kind.encode())
+        file.write(b"".join(header))
+
+    def write_chunk(self, rows: list) -> None:
+        if not rows:
+            return # 0 rows would end the file
+        blocks = [zlib.compress(_encode(kind, values), COMPRESSION_LEVEL) for kind, values in zip(self._kinds, zip(*rows))]
+        self._file.write(b"".join([_LENGTH.pack(len(rows)), *(_LENGTH.pack(len(block)) for block in blocks), *blocks]))
+
+    def close(self) -> None:
+        self._file.write(_LENGTH.pack(0))
+
+def write_report(chunks, columns, path: str, format: str = "csv") -> int:
+    """
+    PRE : chunks is an iterable of lists of rows (tuples with one value per column of columns),
+          columns a sequence of (name, type) pairs (see the module docstring), format "csv" or "columnar"
+    POST : Writes every row to the file path, one chunk at a time. The file only replaces an existing one once it is complete
+    RETURNS : The number of rows written
+    RAISES : ValueError if format isn't supported
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported report format '{format}'. Must be one of the following : {FORMATS}")
+    rows = 0
+    temporary = path + ".tmp"
+    try:
+        if format == "csv":
+            file = open(temporary, "w", newline="", encoding="utf-8")
+            writer = CsvReportWriter(file, columns)
+        else:
+            file = open(temporary, "wb")
+            writer = ColumnarReportWriter(file, columns)
+        with file:
+            for chunk in chunks:
+                writer.write_chunk(chunk)
+                rows += len(chunk)
+            writer.close()
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return rows
+
+def read_columnar(path: str):
+    """
+    PRE : path is a file written by ColumnarReportWriter
+    POST : Yields each row group as a dict {column name: list of values}, one row group in memory at a time
+    RAISES : ValueError if path isn't a columnar report
+    """
+    with open(path, "rb") as file:
+        magic, format, count = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != MAGIC or format != FORMAT:
+            raise ValueError("Not a columnar report")
+        columns = []
+        for _ in range(count):
+            name = file.read(file.read(1)[0]).decode()
+            columns.append((name, file.read(1).decode()))
+        while rows := _LENGTH.unpack(file.read(_LENGTH.size))[0]:
+            lengths = struct.unpack(f"<{count}I", file.read(count * _LENGTH.size))
+            yield {name: _decode(kind, zlib.decompress(file.read(length)), rows) for (name, kind), length in zip(columns, lengths)}
+
+def iter_columnar_rows(path: str):
+    """Yields the rows of a columnar report as tuples, in the order of its columns"""
+    for group in read_columnar(path):
+        yield from zip(*group.values())
@@ -0,0 +1,153 @@
+"""
+Tariff engine : prices parking sessions with time-of-day bands, weekend rates and daily caps.
+
+A tariff is a set of bands (days of the week, start and end minute in local time, hourly rate) and
+an optional cap on what is charged per calendar day. It is compiled once into a weekly price curve :
+the cumulative price G(t) from Monday 00:00 to each band boundary t of the week. The price of a
+slice [a, b[ of a day is then G(b) - G(a) (one bisection each), capped by the daily cap, and the
+full days of a long session are summed from per-weekday totals, so a session is priced in O(log b)
+(b boundaries) whatever its length :
+    price = first day (capped) + full days in between (capped each) + last day (capped)
+Time covered by no band is free. Amounts are rounded to the cent once the session is priced.
+
+price_many() prices a batch of sessions (end-of-day billing, re-pricing audits) with the same
+formula, vectorized with NumPy when it is installed. Both paths give the same amounts.
+"""
+import bisect
+import math
+
+try:
+    import numpy
+except ImportError: # NumPy is optional
+    numpy = None
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+EPOCH_WEEKDAY = 3 # 1970-01-01 (day 0 of UNIX time) was a Thursday, Monday being 0
+
+# Bitmasks of the days a band applies to, bit 0 being Monday
+ALL_DAYS = 0b1111111
+WEEKDAYS = 0b0011111
+WEEKEND = 0b1100000
+
+class Tariff:
+    """A tariff compiled into its weekly price curve, see the module docstring"""
+
+    def __init__(self, name: str, bands, daily_cap: float = None, utc_offset: int = 0):
+        """
+        PRE : bands is an iterable of (days, start_minute, end_minute, hourly_rate) : hourly_rate is charged from
+              start_minute to end_minute (0 to 1440, local time) on every day of the bitmask days (bit 0 Monday).
+              daily_cap is the most charged per calendar day (None : no cap), utc_offset the offset of the local
+              time in minutes
+        RAISES : ValueError if a band is invalid or if two bands overlap on the same day
+        """
+        self.name = name
+        self.bands = [(int(days), int(start), int(end), float(rate)) for days, start, end, rate in bands]
+        self.daily_cap = None if daily_cap is None else float(daily_cap)
+        self.utc_offset = int(utc_offset)
+        self._compile()
+
+    def __repr__(self):
+        return f"Tariff({self.name!r}, {self.bands}, daily_cap={self.daily_cap}, utc_offset={self.utc_offset})"
+
+    def _compile(self):
+        """Builds the weekly curve : segment starts (seconds since Monday 00:00), rate per second and cumulative price of each"""
+        segments = []
+        for weekday in range(7):
+            day = sorted((start * 60, end * 60, rate / 3600) for days, start, end, rate in self.bands if days >> weekday & 1)
+            previous = 0
+            for start, end, rate in day:
+                if not 0 <= start < end <= DAY or rate < 0:
+                    raise ValueError(f"Invalid band of tariff {self.name} : {start // 60} to {end // 60} at {rate * 3600}/h")
+                if start < previous:
+                    raise ValueError(f"Overlapping bands in tariff {self.name} on day {weekday} at minute {start // 60}")
+                if start > previous:
+                    segments.append((weekday * DAY + previous, 0.0)) # Not covered by any band : free
+                segments.append((weekday * DAY + start, rate))
+                previous = end
+            if previous < DAY:
+                segments.append((weekday * DAY + previous, 0.0))
+        segments.append((WEEK, 0.0)) # Sentinel, so G(WEEK) is defined
+        self._bounds = [start for start, rate in segments]
+        self._rates = [rate for start, rate in segments]
+        self._cumulative = [0.0]
+        for (start, rate), (end, _) in zip(segments, segments[1:]):
+            self._cumulative.append(self._cumulative[-1] + rate * (end - start))
+        self._cap = math.inf if self.daily_cap is None else self.daily_cap
+        day_totals = [min(self._curve(weekday * DAY + DAY) - self._curve(weekday * DAY), self._cap) for weekday in range(7)]
+        self._week_total = sum(day_totals)
+        # _day_prefix[w + n] - _day_prefix[w] : capped price of the n full days starting on weekday w (n <= 7)
+        self._day_prefix = [0.0]
+        for weekday in range(14):
+            self._day_prefix.append(self._day_prefix[-1] + day_totals[weekday % 7])
+        if numpy is not None:
+            self._arrays = tuple(numpy.array(values) for values in (self._bounds, self._rates, self._cumulative, self._day_prefix))
+
+    def _curve(self, t: int) -> float:
+        """G(t) : price from Monday 00:00 to t seconds later (0 <= t <= WEEK)"""
+        i = bisect.bisect_right(self._bounds, t) - 1
+        return self._cumulative[i] + self._rates[i] * (t - self._bounds[i])
+
+    def price(self, entry: int, exit: int) -> float:
+        """
+        PRE : entry and exit are UNIX timestamps (seconds)
+        RETURNS : The price of a session from entry to exit, rounded to the cent. 0 if exit isn't after entry
+        """
+        if exit <= entry:
+            return 0.0
+        offset = self.utc_offset * 60
+        first_day, first_second = divmod(int(entry) + offset, DAY)
+        last_day, last_second = divmod(int(exit) + offset, DAY)
+        first_base = (first_day + EPOCH_WEEKDAY) % 7 * DAY
+        if first_day == last_day:
+            first = min(self._curve(first_base + last_second) - self._curve(first_base + first_second), self._cap)
+            return round(first, 2)
+        first = min(self._curve(first_base + DAY) - self._curve(first_base + first_second), self._cap)
+        last_base = (last_day + EPOCH_WEEKDAY) % 7 * DAY
+        last = min(self._curve(last_base + last_second) - self._curve(last_base), self._cap)
+        full = last_day - first_day - 1
+        weekday = (first_day + 1 + EPOCH_WEEKDAY) % 7
+        full_days = full // 7 * self._week_total + (self._day_prefix[weekday + full % 7] - self._day_prefix[weekday])
+        return round(first + full_days + last, 2)
+
+    def price_many(self, entries, exits, use_numpy: bool = None) -> list:
+        """
+        PRE : entries and exits are sequences of UNIX timestamps of the same length
+        RETURNS : The list of the prices of the sessions, like price() would return them one by one
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None and len(entries) > 1
+        if not use_numpy:
+            return [self.price(entry, exit) for entry, exit in zip(entries, exits)]
+        bounds, rates, cumulative, day_prefix = self._arrays
+
+        def curve(t):
+            i = numpy.searchsorted(bounds, t, side="right") - 1
+            return cumulative[i] + rates[i] * (t - bounds[i])
+
+        entries = numpy.asarray(entries, dtype=numpy.int64)
+        exits = numpy.asarray(exits, dtype=numpy.int64)
+        offset = self.utc_offset * 60
+        first_day, first_second = numpy.divmod(entries + offset, DAY)
+        last_day, last_second = numpy.divmod(exits + offset, DAY)
+        same_day = first_day == last_day
+        first_base = (first_day + EPOCH_WEEKDAY) % 7 * DAY
+        last_base = (last_day + EPOCH_WEEKDAY) % 7 * DAY
+        first = numpy.minimum(curve(first_base + numpy.where(same_day, last_second, DAY)) - curve(first_base + first_second), self._cap)
+        last = numpy.where(same_day, 0.0, numpy.minimum(curve(last_base + last_second) - curve(last_base), self._cap))
+        full = numpy.maximum(last_day - first_day - 1, 0)
+        weekday = (first_day + 1 + EPOCH_WEEKDAY) % 7
+        full_days = full // 7 * self._week_total + (day_prefix[weekday + full % 7] - day_prefix[weekday])
+        amounts = numpy.where(exits > entries, first + full_days + last, 0.0)
+        return [round(amount, 2) for amount in amounts.tolist()]
+
+def compile_tariffs(tariffs, bands) -> dict:
+    """
+    PRE : tariffs is an iterable of (name, daily_cap, utc_offset), bands an iterable of (tariff name, days, start_minute, end_minute, hourly_rate)
+    RETURNS : {name: Tariff}
+    RAISES : ValueError if the bands of a tariff are invalid
+    """
+    bands_of = {}
+    for name, *band in bands:
+        bands_of.setdefault(name, []).append(band)
+    return {name: Tariff(name, bands_of.get(name, []), daily_cap, utc_offset) for name, daily_cap, utc_offset in tariffs}
@@ -0,0 +1,205 @@
+import os
+import tempfile
+import time
+import unittest
+from src.bookings import ACTIVE, CANCELLED, EXPIRE, FULFILLED, HELD, HOLD, Booking, BookingEngine, SpotSchedule
+from src.controllers import DatabaseController, ParkingController
+from src.controllers.connection_manager import ConnectionManager
+from src.models import ParkingSpot
+
+HOUR = 3600
+
+class TestSpotSchedule(unittest.TestCase):
+    def setUp(self):
+        self.spot = ParkingSpot(1, 1)
+        self.schedule = SpotSchedule()
+        for booking_id, (start, end) in enumerate([(10, 20), (30, 40), (50, 60)]):
+            self.schedule.add(Booking(booking_id, self.spot, "PRE-001", start, end))
+
+    def test_conflict(self):
+        for start, end in [(0, 10), (20, 30), (40, 50), (60, 100)]:
+            self.assertIsNone(self.schedule.conflict(start, end)) # Windows are half-open
+        for (start, end), booking_id in [((0, 11), 0), ((19, 21), 0), ((25, 45), 1), ((35, 36), 1), ((25, 55), 2), ((59, 70), 2), ((0, 100), 2)]:
+            self.assertEqual(self.schedule.conflict(start, end).id, booking_id)
+
+    def test_add_and_remove(self):
+        with self.assertRaises(ValueError):
+            self.schedule.add(Booking(9, self.spot, "PRE-002", 15, 25))
+        booking = Booking(3, self.spot, "PRE-002", 20, 30)
+        self.schedule.add(booking)
+        self.assertEqual([b.start for b in self.schedule], [10, 20, 30, 50])
+        self.schedule.remove(booking)
+        self.schedule.remove(booking) # Does nothing the second time
+        self.assertIsNone(self.schedule.conflict(20, 30))
+        self.assertEqual(len(self.schedule), 3)
+
+class TestBookingEngine(unittest.TestCase):
+    def setUp(self):
+        self.spots = [ParkingSpot(id, id) for id in range(1, 4)]
+        self.engine = BookingEngine(no_show_grace=10)
+
+    def test_find_free_spot(self):
+        self.engine.add(Booking(1, self.spots[0], "PRE-001", 100, 200))
+        self.engine.add(Booking(2, self.spots[1], "PRE-002", 150, 300))
+        self.assertIs(self.engine.find_free_spot(self.spots, 0, 100), self.spots[0])
+        self.assertIs(self.engine.find_free_spot(self.spots, 120, 140), self.spots[1])
+        self.assertIs(self.engine.find_free_spot(self.spots, 180, 190), self.spots[2])
+        self.assertIsNone(self.engine.find_free_spot(self.spots[:2], 180, 190))
+        with self.assertRaises(ValueError):
+            self.engine.add(Booking(3, self.spots[0], "PRE-003", 199, 250))
+        with self.assertRaises(ValueError):
+            self.engine.add(Booking(3, self.spots[0], "PRE-003", 250, 250))
+
+    def test_timers(self):
+        first, second = Booking(1, self.spots[0], "PRE-001", 100, 200), Booking(2, self.spots[1], "PRE-002", 150, 155)
+        self.engine.load([second, first])
+        self.assertEqual(self.engine.next_due(), 100)
+        self.assertEqual(list(self.engine.due(99)), [])
+        self.assertEqual(list(self.engine.due(100)), [(HOLD, first)])
+        first.status = HELD # The caller holds the spot
+        events = []
+        for event, booking in self.engine.due(1000):
+            events.append((event, booking.id))
+            if event == HOLD:
+                booking.status = HELD
+            else:
+                self.engine.close(booking, "expired")
+        # The second booking expires at its end, before its grace period is over
+        self.assertEqual(events, [(EXPIRE, 1), (HOLD, 2), (EXPIRE, 2)])
+        self.assertEqual(len(self.engine), 0)
+        self.assertIsNone(self.engine.next_due())
+
+    def test_fulfilled_booking_keeps_its_window(self):
+        booking = Booking(1, self.spots[0], "PRE-001", 100, 200)
+        self.engine.add(booking)
+        self.assertIs(self.engine.arriving("PRE-001", 100 - BookingEngine.EARLY_ARRIVAL), booking)
+        self.assertIsNone(self.engine.arriving("PRE-001", 200))
+        list(self.engine.due(100))
+        self.engine.fulfil(booking)
+        self.assertIsNone(self.engine.arriving("PRE-001", 150))
+        self.assertEqual(list(self.engine.due(199)), []) # No expiry once the customer parked
+        self.assertIs(self.engine.conflict(self.spots[0].id, 150, 160), booking)
+        list(self.engine.due(200))
+        self.assertIsNone(self.engine.conflict(self.spots[0].id, 150, 160))
+
+    def test_cancelled_timers_dont_pile_up(self):
+        for booking_id in range(1000):
+            booking = Booking(booking_id, self.spots[0], "PRE-001", 10 ** 6 + booking_id, 10 ** 6 + booking_id + 1)
+            self.engine.add(booking)
+            self.engine.close(booking, CANCELLED)
+        self.assertLess(len(self.engine._timers), 100)
+        self.assertEqual(list(self.engine.due(10 ** 7)), [])
+
+class TestParkingControllerBookings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        for spot_number in (1, 2, 3):
+            self.db.create_parking_spot(0, 1, spot_number)
+        for plate in ("PRE-001", "PRE-002"):
+            self.db.add_premium_subscription(plate)
+        self.pc = ParkingController(db=self.db, board=False)
+        self.spot = self.pc.parking_lot.floors[0].rows[1].spots
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def statuses(self):
+        return {booking_id: status for booking_id, spot_id, start, end, status in self.db.fetch_bookings_by_registration_plate("PRE-001")}
+
+    def test_reserve_and_enter(self):
+        now = int(time.time())
+        self.assertTrue(self.pc.reserve_spot(0, 1, 2, "PRE-001", now - 60, now + 2 * HOUR).startswith("[NEW BOOKING]"))
+        self.assertEqual(self.spot[2].status, "booked") # Held right away, its window started
+        self.assertEqual(self.pc.reserve_spot(0, 1, 2, "PRE-002", now + HOUR, now + 3 * HOUR), "[Error] This spot is already booked for this period")
+        self.assertEqual(self.pc.reserve_spot(0, 1, 2, "STD-001", now + 2 * HOUR, now + 3 * HOUR), "[Error] Only premium subscribers can book a spot")
+        self.assertEqual(self.pc.reserve_spot(0, 1, 2, "PRE-002", now + 3 * HOUR, now + 2 * HOUR), "[Error] A booking must end after it starts, in the future")
+        self.assertTrue(self.pc.reserve_spot(0, 1, 2, "PRE-002", now + 2 * HOUR, now + 3 * HOUR).startswith("[NEW BOOKING]"))
+
+        self.assertTrue(self.pc.new_entry_auto("STD-001").endswith("spot 1"))
+        self.assertEqual(self.pc.parking_lot.next_free_spot(), self.spot[3])
+        self.assertEqual(self.pc.new_entry(0, 1, 2, "STD-002"), "[Error] This spot is already occupied")
+        self.assertTrue(self.pc.new_entry(0, 1, 2, "PRE-001").startswith("[NEW ENTRY]"))
+        self.assertEqual(list(self.statuses().values()), [FULFILLED])
+        self.assertEqual(self.pc.process_bookings(now + HOUR), []) # Fulfilled : never expires
+        self.pc.new_exit(0, 1, 2, "PRE-001")
+        self.assertEqual(len(self.pc.process_bookings(now + 2 * HOUR)), 1) # The next booking of the spot starts
+        self.assertEqual(self.spot[2].registration_plate, "PRE-002")
+
+    def test_reserve_any_spot_and_arrive_early(self):
+        now = int(time.time())
+        self.pc.new_entry(0, 1, 1, "STD-001")
+        self.pc.reserve_spot(0, 1, 2, "PRE-002", now + 600, now + 3 * HOUR)
+        message = self.pc.reserve_any_spot("PRE-001", now, now + 2 * HOUR) # Starts now : spot 1 is occupied, spot 2 booked in 10 minutes
+        self.assertIn("spot 3", message)
+        self.assertEqual(self.spot[3].status, "booked") # Held right away
+        self.assertEqual(self.pc.reserve_any_spot("PRE-001", now, now + 2 * HOUR), "[Error] No spot is available for this period")
+        self.assertTrue(self.pc.new_entry_auto("PRE-001").endswith("spot 3"))
+        self.assertTrue(self.pc.new_entry_auto("PRE-002").endswith("spot 2")) # Early : its spot is free and kept for it
+        self.assertEqual(self.spot[2].status, "occupied")
+        self.assertEqual([status for *_, status in self.db.fetch_bookings_by_registration_plate("PRE-002")], [FULFILLED])
+
+    def test_no_show_expires(self):
+        now = int(time.time())
+        self.pc.reserve_spot(0, 1, 1, "PRE-001", now + HOUR, now + 3 * HOUR)
+        self.pc.process_bookings(now + HOUR)
+        self.assertEqual(self.spot[1].status, "booked")
+        self.assertEqual(self.pc.process_bookings(now + HOUR + BookingEngine.NO_SHOW_GRACE - 1), [])
+        self.assertEqual(len(self.pc.process_bookings(now + HOUR + BookingEngine.NO_SHOW_GRACE)), 1)
+        self.assertEqual(self.spot[1].status, "free")
+        self.assertEqual(list(self.statuses().values()), ["expired"])
+        self.assertEqual(self.db.fetch_reserved_spots(), [])
+
+    def test_occupied_spot_is_relocated(self):
+        now = int(time.time())
+        self.pc.reserve_spot(0, 1, 1, "PRE-001", now + HOUR, now + 2 * HOUR)
+        self.pc.new_entry(0, 1, 1, "STD-001") # Parks before the window and overstays
+        self.pc.process_bookings(now + HOUR)
+        self.assertEqual(self.spot[2].status, "booked")
+        self.assertEqual(self.db.fetch_reserved_spots(), [(self.spot[2].id, "PRE-001")])
+        self.pc.new_entry_auto("STD-002")
+        self.pc.reserve_spot(0, 1, 3, "PRE-002", now + 3 * HOUR, now + 4 * HOUR) # Booked while spot 3 is occupied
+        self.pc.cancel_reservation(1, "PRE-001")
+        self.assertTrue(self.pc.new_entry_auto("STD-003").endswith("spot 2")) # The lot is full
+        self.pc.process_bookings(now + 3 * HOUR)
+        self.assertEqual([status for *_, status in self.db.fetch_bookings_by_registration_plate("PRE-002")], [CANCELLED]) # No spot left
+
+    def test_fulfilled_booking_blocks_database(self):
+        now = int(time.time())
+        spot_id = self.spot[1].id
+        booking_id = self.db.new_booking(spot_id, "PRE-001", now - 60, now + HOUR)
+        self.db.fulfil_bookings([booking_id])
+        self.assertIsNone(self.db.new_booking(spot_id, "PRE-002", now, now + HOUR)) # Its window isn't over
+        self.assertIsNotNone(self.db.new_booking(spot_id, "PRE-002", now + HOUR, now + 2 * HOUR))
+
+    def test_cancel(self):
+        now = int(time.time())
+        self.pc.reserve_spot(0, 1, 1, "PRE-001", now - 60, now + HOUR)
+        booking_id, = self.statuses()
+        self.assertEqual(self.spot[1].status, "booked")
+        self.assertEqual(self.pc.delete_spot(0, 1, 1), "[Error] This spot is booked, cancel its bookings first")
+        self.assertTrue(self.pc.cancel_reservation(booking_id, "PRE-002").startswith("[Error]"))
+        self.assertTrue(self.pc.cancel_reservation(booking_id, "PRE-001").startswith("[BOOKING CANCELLED]"))
+        self.assertEqual(self.spot[1].status, "free")
+        self.assertEqual(self.statuses(), {booking_id: CANCELLED})
+        self.assertTrue(self.pc.reserve_spot(0, 1, 1, "PRE-002", now, now + HOUR).startswith("[NEW BOOKING]"))
+
+    def test_restart(self):
+        now = int(time.time())
+        self.pc.reserve_spot(0, 1, 1, "PRE-001", now - 60, now + HOUR)
+        self.pc.reserve_spot(0, 1, 2, "PRE-002", now + HOUR, now + 2 * HOUR)
+        restored = ParkingController(db=self.db, board=False)
+        self.assertEqual(restored.snapshot.journal_length, 1) # Restored : holding the spot didn't make the snapshot stale
+        hydrated = ParkingController(db=self.db, board=False, snapshot=False)
+        for pc in (restored, hydrated):
+            spots = pc.parking_lot.floors[0].rows[1].spots
+            self.assertEqual(spots[1].status, "booked")
+            self.assertEqual(spots[1].registration_plate, "PRE-001")
+            self.assertEqual(len(pc.bookings), 2)
+            self.assertEqual(pc.reserve_spot(0, 1, 2, "PRE-001", now + HOUR, now + HOUR + 60), "[Error] This spot is already booked for this period")
+            self.assertEqual(pc.bookings.bookings_of("PRE-002")[0].status, ACTIVE)
+
+if __name__ == "__main__":
+    unittest.main()
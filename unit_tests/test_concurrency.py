@@ -0,0 +1,268 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from src.controllers import DatabaseController, ParkingController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.write_queue import WriteQueue
+
+THREADS = 8
+
+def run_threads(target, count=THREADS):
+    """Runs target(i) in count threads released at once, returns their results. Fails on the first exception"""
+    barrier = threading.Barrier(count)
+    results, errors = [None] * count, []
+
+    def run(i):
+        try:
+            barrier.wait()
+            results[i] = target(i)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+class ConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # Switches threads as often as possible, so the races show up
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def assert_lot_consistent(self, lot):
+        """The indexes of the lot match its spots"""
+        spots = list(lot.iter_spots())
+        free = [spot for spot in spots if spot.status == "free"]
+        self.assertEqual(lot.free_spots_count(), len(free))
+        self.assertEqual(sorted(spot.id for spot in lot.free_spots()), sorted(spot.id for spot in free))
+        for spot in spots:
+            if spot.status != "free":
+                self.assertIs(lot.find_car(spot.registration_plate), spot)
+
+class TestLotConcurrency(ConcurrencyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pc = ParkingController(update_db=False)
+        for n in range(1, 101):
+            self.pc.parking_lot.add_spot({"id": n, "spot_number": n % 10 + 1, "row_number": n // 10 + 1, "floor_number": n % 3})
+        self.changes = []
+        self.pc.parking_lot.add_listener(lambda event, spot: self.changes.append((spot.id, spot.status)))
+
+    def test_one_winner_per_spot(self):
+        spots = [(spot.floor_number, spot.row_number, spot.spot_number) for spot in self.pc.parking_lot.iter_spots()]
+
+        def gate(i):
+            return [self.pc.new_entry(*spot, f"GATE{i}-{n}").startswith("[NEW ENTRY]") for n, spot in enumerate(spots)]
+        wins = run_threads(gate)
+        self.assertEqual([sum(column) for column in zip(*wins)], [1] * len(spots)) # Each spot taken by exactly one gate
+        self.assertEqual(self.pc.parking_lot.free_spots_count(), 0)
+        self.assertEqual(len(self.changes), len(spots))
+        self.assert_lot_consistent(self.pc.parking_lot)
+
+    def test_hammer_one_spot(self):
+        spot = self.pc.parking_lot.floors[1].rows[1].spots[2]
+        models = sys.modules[type(spot).__module__] # The module the controllers use, src.models is another copy
+
+        class YieldingCar(models.StandardCar):
+            __slots__ = ()
+
+            def __init__(self, registration_plate):
+                time.sleep(0) # Lets another gate run between the check of the spot and its change
+                super().__init__(registration_plate)
+
+        def gate(i):
+            wins = lost = 0
+            for _ in range(500):
+                if self.pc.new_entry(1, 1, 2, f"GATE{i}").startswith("[NEW ENTRY]"):
+                    wins += 1
+                    lost += not self.pc.new_exit(1, 1, 2, f"GATE{i}").startswith("[NEW EXIT]") # Another gate took the spot over
+            return wins, lost
+        with mock.patch.object(models, "StandardCar", YieldingCar):
+            wins, lost = (sum(column) for column in zip(*run_threads(gate)))
+        self.assertGreater(wins, 0)
+        self.assertEqual(lost, 0)
+        self.assertEqual(spot.status, "free")
+        self.assertEqual(len(self.changes), 2 * wins)
+        self.assert_lot_consistent(self.pc.parking_lot)
+
+    def test_churn_without_lost_updates(self):
+        def gate(i):
+            entries = exits = 0
+            for n in range(300):
+                registration_plate = f"GATE{i}-{n % 20}"
+                if self.pc.parking_lot.find_car(registration_plate) is None:
+                    entries += self.pc.new_entry_auto(registration_plate).startswith("[NEW ENTRY]")
+                else:
+                    exits += self.pc.new_exit_by_plate(registration_plate).startswith("[NEW EXIT]")
+            return entries, exits
+        counts = run_threads(gate)
+        entries, exits = (sum(column) for column in zip(*counts))
+        parked = sum(spot.status == "occupied" for spot in self.pc.parking_lot.iter_spots())
+        self.assertEqual(entries - exits, parked)
+        self.assertEqual(len(self.changes), entries + exits) # One change per successful entry or exit, none lost
+        self.assert_lot_consistent(self.pc.parking_lot)
+
+    def test_racing_removals(self):
+        lot = self.pc.parking_lot
+        spots = [{"spot_number": spot.spot_number, "row_number": spot.row_number, "floor_number": spot.floor_number} for spot in lot.iter_spots()]
+
+        def gate(i):
+            removed = 0
+            for spot in spots:
+                try:
+                    lot.remove_spot(spot)
+                    removed += 1
+                except ValueError:
+                    pass # Already removed by another gate
+            return removed
+        self.assertEqual(sum(run_threads(gate)), len(spots)) # Each spot removed exactly once
+        self.assertEqual(lot.floors, {})
+        self.assertEqual(lot.free_spots_count(), 0)
+
+    def test_iterate_while_changing(self):
+        lot = self.pc.parking_lot
+        stop = threading.Event()
+
+        def change_layout():
+            while not stop.is_set():
+                for n in range(101, 131):
+                    lot.add_spot({"id": n, "spot_number": n % 10 + 1, "row_number": n // 10 + 1, "floor_number": n % 3})
+                for n in range(101, 131):
+                    lot.remove_spot({"spot_number": n % 10 + 1, "row_number": n // 10 + 1, "floor_number": n % 3})
+        thread = threading.Thread(target=change_layout)
+        thread.start()
+        try:
+            counts = run_threads(lambda i: [sum(1 for spot in lot.iter_spots() if spot.id <= 100) for _ in range(50)], count=4)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual({count for result in counts for count in result}, {100}) # The spots that stay are always seen
+
+class TestControllerConcurrency(ConcurrencyTestCase):
+    SPOTS = 20
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        with self.db.transaction():
+            for n in range(1, self.SPOTS + 1):
+                self.db.create_parking_spot(n % 2, 1, n)
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def count(self, query):
+        with self.db.connect() as conn:
+            return conn.execute(query).fetchone()[0]
+
+    def check_gates(self, pc):
+        def enter(i):
+            return [pc.new_entry_auto(f"GATE{i}-{n}") for n in range(5)]
+        messages = [message for result in run_threads(enter) for message in result]
+        parked = [message for message in messages if message.startswith("[NEW ENTRY]")]
+        self.assertEqual(len(parked), self.SPOTS)
+        self.assertEqual(len(messages) - len(parked), messages.count("[Error] The parking lot is full"))
+        pc.flush_writes()
+        self.assertEqual(self.count("SELECT COUNT(DISTINCT spot_id) FROM ParkingUsage WHERE exit_time IS NULL"), self.SPOTS)
+        self.assert_lot_consistent(pc.parking_lot)
+
+        plates = [spot.registration_plate for spot in pc.parking_lot.iter_spots()]
+        def leave(i):
+            # Every gate tries to let every car out : each one must leave (and pay) exactly once
+            return [pc.new_exit_by_plate(registration_plate) for registration_plate in plates[i % 2::2] + plates[(i + 1) % 2::2]]
+        messages = [message for result in run_threads(leave) for message in result]
+        self.assertEqual(sum(message.startswith("[NEW EXIT]") for message in messages), self.SPOTS)
+        pc.flush_writes()
+        self.assertEqual(self.count("SELECT COUNT(*) FROM ParkingUsage WHERE exit_time IS NULL"), 0)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM Payments"), self.SPOTS)
+        self.assertEqual(pc.parking_lot.free_spots_count(), self.SPOTS)
+        self.assert_lot_consistent(pc.parking_lot)
+
+    def test_gates_without_write_queue(self):
+        self.check_gates(ParkingController(db=self.db, snapshot=False, board=False))
+
+    def test_gates_with_write_queue(self):
+        write_queue = WriteQueue(self.db)
+        try:
+            self.check_gates(ParkingController(db=self.db, write_queue=write_queue, snapshot=False, board=False))
+        finally:
+            write_queue.close()
+
+    def test_checkpoint_during_entries(self):
+        pc = ParkingController(db=self.db, board=False)
+        stop = threading.Event()
+
+        def checkpoints():
+            while not stop.is_set():
+                pc.checkpoint(force=True)
+        thread = threading.Thread(target=checkpoints)
+        thread.start()
+        try:
+            run_threads(lambda i: [pc.new_entry_auto(f"GATE{i}-{n}") for n in range(3)])
+        finally:
+            stop.set()
+            thread.join()
+        pc.checkpoint(force=True)
+        spots = {spot.id: spot.registration_plate for spot in pc.parking_lot.iter_spots()}
+        ConnectionManager.close_all_managers()
+        restored = ParkingController(db=DatabaseController(self.db.path), board=False)
+        self.assertEqual({spot.id: spot.registration_plate for spot in restored.parking_lot.iter_spots()}, spots)
+
+    def test_two_processes(self):
+        # Two controllers on the same database stand for two processes : the database refuses the second session
+        first, second = (ParkingController(db=self.db, snapshot=False, board=False) for _ in range(2))
+        self.assertTrue(first.new_entry(1, 1, 1, "ABC-001").startswith("[NEW ENTRY]"))
+        self.assertEqual(second.new_entry(1, 1, 1, "ABC-002"), "[Error] This spot is already occupied")
+        self.assertEqual(second.parking_lot.floors[1].rows[1].spots[1].status, "free") # Undone in the lot
+        self.assertEqual(self.count("SELECT COUNT(*) FROM ParkingUsage WHERE exit_time IS NULL"), 1)
+
+    def test_racing_deletions(self):
+        pc = ParkingController(db=self.db, snapshot=False, board=False)
+        spots = [(spot.floor_number, spot.row_number, spot.spot_number) for spot in pc.parking_lot.iter_spots()]
+        messages = [message for result in run_threads(lambda i: [pc.delete_spot(*spot) for spot in spots]) for message in result]
+        self.assertEqual(sum(message.startswith("[SPOT DELETED]") for message in messages), self.SPOTS)
+        self.assertTrue(all(message.startswith(("[SPOT DELETED]", "[Error] This spot does not exist")) for message in messages))
+        self.assertEqual(self.count("SELECT COUNT(*) FROM ParkingSpots"), 0)
+
+    def test_booking_races_deletion(self):
+        self.db.add_premium_subscription("PRE-001")
+        pc = ParkingController(db=self.db, snapshot=False, board=False)
+        spots = [(spot.floor_number, spot.row_number, spot.spot_number) for spot in pc.parking_lot.iter_spots()]
+        start = int(time.time()) + 3600
+
+        def gate(i):
+            if i % 2:
+                return [pc.delete_spot(*spot) for spot in spots]
+            return [pc.reserve_spot(*spot, "PRE-001", start + i * 60, start + i * 60 + 30) for spot in spots]
+        run_threads(gate)
+        # Every spot is either deleted or still in the lot with its bookings
+        with self.db.connect() as conn:
+            booked = {spot_id for spot_id, in conn.execute("SELECT DISTINCT spot_id FROM Bookings")}
+        remaining = {spot.id for spot in pc.parking_lot.iter_spots()}
+        self.assertLessEqual(booked, remaining)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM ParkingSpots"), len(remaining))
+
+    def test_bookings_cant_overlap_in_database(self):
+        now = int(time.time())
+        self.assertIsNotNone(self.db.new_booking(1, "PRE-001", now + 3600, now + 7200))
+        self.assertIsNone(self.db.new_booking(1, "PRE-002", now + 5400, now + 9000))
+        self.assertIsNotNone(self.db.new_booking(1, "PRE-002", now + 7200, now + 9000)) # Windows are half-open
+        self.assertIsNotNone(self.db.new_booking(2, "PRE-003", now + 5400, now + 9000))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from src.controllers.database_controller import DatabaseController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.migrations import LATEST_VERSION
+
+class TestDatabaseController(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_connection_is_reused(self):
+        with self.db.connect() as c1:
+            pass
+        with DatabaseController(self.db.path).connect() as c2:
+            self.assertIs(c1, c2)
+            self.assertEqual(c2.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_one_connection_per_thread(self):
+        connections = []
+        def worker():
+            with self.db.connect() as conn:
+                connections.append(conn)
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        with self.db.connect() as conn:
+            self.assertIsNot(conn, connections[0])
+
+    def test_entry_exit_payment(self):
+        id = self.db.create_parking_spot(1, 1, 1)[0]
+        self.db.new_entry_visitor(id, "ABC-123")
+        self.assertEqual(self.db.fetch_last_spot_usage(id)[0], "ABC-123")
+        usage_id, time_spent = self.db.fetch_last_usage_time(id)
+        self.db.new_payment(usage_id, "ABC-123", 3.0)
+        self.db.new_exit(id, "ABC-123")
+        self.assertIsNotNone(self.db.fetch_last_spot_usage(id)[2])
+        self.assertEqual(self.db.fetch_all_payments(), [(usage_id, "ABC-123", 3.0)])
+
+    def test_transaction_rollback(self):
+        id = self.db.create_parking_spot(1, 1, 1)[0]
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.new_entry_visitor(id, "ABC-123")
+                raise RuntimeError
+        self.assertIsNone(self.db.fetch_last_spot_usage(id))
+
+    def test_pagination(self):
+        id = self.db.create_parking_spot(1, 1, 1)[0]
+        with self.db.transaction():
+            for i in range(25):
+                self.db.new_entry_visitor(id, f"CAR-{i}")
+                usage_id = self.db.fetch_last_usage_time(id)[0]
+                self.db.new_payment(usage_id, f"CAR-{i}", float(i))
+                self.db.new_exit(id, f"CAR-{i}")
+        first = self.db.fetch_usages_page(0, 10)
+        second = self.db.fetch_usages_page(first[-1][0], 10)
+        self.assertEqual([u[2] for u in first + second], [f"CAR-{i}" for i in range(20)])
+        self.assertEqual([u[0] for u in self.db.iter_usages(chunk_size=7)], [u[0] for u in self.db.fetch_all_usages()])
+        self.assertEqual(list(self.db.iter_payments(chunk_size=4)), sorted(self.db.fetch_all_payments()))
+        self.assertEqual(len(self.db.fetch_payments_page(self.db.fetch_payments_page(0, 20)[-1][0], 20)), 5)
+
+    def test_iter_sessions_between(self):
+        spot_ids = [self.db.create_parking_spot(floor, 1, 1)[0] for floor in (0, 1, 2)]
+        with self.db.connect() as conn:
+            conn.executemany("INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time, exit_time) VALUES (?, ?, ?, ?)", [
+                (spot_ids[0], "OLD", "1970-01-01 00:00:00", "1970-01-01 00:10:00"), # Ends before the period
+                (spot_ids[0], "IN", "1970-01-01 00:30:00", "1970-01-01 02:00:00"),
+                (spot_ids[1], "NOW", "1970-01-01 01:00:00", None),
+                (spot_ids[2], "LATE", "1970-01-01 03:00:00", None), # Starts after the period
+            ])
+        self.assertEqual(sorted(self.db.iter_sessions_between(1200, 7200, chunk_size=1), key=str),
+                         [(0, 1800, 7200), (1, 3600, None)])
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "parking_lot.db")
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def indexes(self, db):
+        with db.connect() as conn:
+            return {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+
+    def test_fresh_database(self):
+        db = DatabaseController(self.path)
+        db.init_database()
+        self.assertEqual(db.schema_version(), LATEST_VERSION)
+        self.assertIn("ParkingUsage_open_session", self.indexes(db))
+        self.assertEqual(db.migrate(), [])
+
+    def test_upgrade_in_place(self):
+        # Database created by the first releases, without SchemaVersion nor indexes
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE ParkingSpots (id INTEGER PRIMARY KEY, spot_number INTEGER NOT NULL, row_number INTEGER NOT NULL, floor_number INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE ParkingUsage (id INTEGER PRIMARY KEY, spot_id INTEGER NOT NULL, registration_plate VARCHAR(10) NOT NULL, entry_time TIMESTAMP, exit_time TIMESTAMP)")
+            conn.execute("CREATE TABLE Payments (usage_id INTEGER PRIMARY KEY, registration_plate VARCHAR(10) NOT NULL, amount DECIMAL(5, 2) NOT NULL)")
+            conn.execute("CREATE TABLE PremiumCars (premium_id INTEGER PRIMARY KEY, registration_plate VARCHAR(20) UNIQUE)")
+            conn.execute("INSERT INTO ParkingSpots VALUES (1, 1, 1, 1)")
+            conn.execute("INSERT INTO ParkingUsage VALUES (1, 1, 'OLD-000', NULL, NULL)") # Old booking row, without entry time
+            conn.execute("INSERT INTO ParkingUsage VALUES (2, 1, 'OLD-001', '2024-01-01 08:00:00', NULL)")
+            conn.execute("INSERT INTO ParkingUsage VALUES (3, 1, 'ABC-123', '2024-01-02 08:00:00', NULL)")
+        conn.close()
+        db = DatabaseController(self.path)
+        self.assertEqual(db.migrate(), list(range(1, LATEST_VERSION + 1)))
+        self.assertTrue({"ParkingSpots_position", "ParkingUsage_spot_entry", "ParkingUsage_open_session"} <= self.indexes(db))
+        self.assertEqual(db.fetch_current_parked_vehicles(), [(1, "ABC-123")])
+        with self.assertRaises(sqlite3.IntegrityError):
+            db.new_entry_visitor(1, "XYZ-789") # The spot already has an open session
+
+if __name__ == "__main__":
+    unittest.main()
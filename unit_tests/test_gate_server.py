@@ -0,0 +1,151 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from concurrent import futures
+from src.controllers import DatabaseController
+from src.controllers.connection_manager import ConnectionManager
+from src.gate_server import GateServer
+
+class TestGateServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.db.add_premium_subscription("PRE-001")
+        self.server = GateServer(self.db, port=0)
+        self.address = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    async def request(self, reader, writer, request):
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def test_gate_session(self):
+        reader, writer = await asyncio.open_connection(*self.address)
+        response = await self.request(reader, writer, {"id": 1, "action": "create_spot", "floor": 1, "row": 1, "spot": 1})
+        self.assertEqual(response, {"id": 1, "ok": True, "message": "[SPOT CREATED] The parking spot at floor 1 - row 1 - spot 1 was successfully created"})
+        response = await self.request(reader, writer, {"id": 2, "action": "entry", "floor": 1, "row": 1, "spot": 1, "plate": "ABC-123"})
+        self.assertTrue(response["ok"])
+        response = await self.request(reader, writer, {"id": 3, "action": "entry_auto", "plate": "DEF-456"})
+        self.assertEqual(response, {"id": 3, "ok": False, "message": "[Error] The parking lot is full"})
+        response = await self.request(reader, writer, {"id": 4, "action": "exit_plate", "plate": "ABC-123"})
+        self.assertTrue(response["ok"])
+        self.assertEqual(await self.request(reader, writer, {"action": "is_premium", "plate": "PRE-001"}), {"id": None, "ok": True, "premium": True})
+        writer.close()
+        await writer.wait_closed()
+        self.server.write_queue.flush()
+        self.assertEqual([plate for _, plate, _ in self.db.fetch_all_payments()], ["ABC-123"])
+
+    async def test_bookings(self):
+        self.db.create_parking_spot(1, 1, 1)
+        await self.server.close() # Restarts the server so it loads the new spot
+        self.server = GateServer(self.db, port=0)
+        self.address = await self.server.start()
+        reader, writer = await asyncio.open_connection(*self.address)
+        now = int(time.time())
+        response = await self.request(reader, writer, {"action": "book", "plate": "PRE-001", "start": now - 60, "end": now + 3600})
+        self.assertTrue(response["message"].startswith("[NEW BOOKING] Car PRE-001 booked floor 1 - row 1 - spot 1"))
+        response = await self.request(reader, writer, {"action": "book", "plate": "PRE-001", "start": now, "end": now + 60, "floor": 1, "row": 1, "spot": 1})
+        self.assertFalse(response["ok"])
+        self.assertEqual((await self.request(reader, writer, {"action": "entry_auto", "plate": "ABC-123"}))["message"], "[Error] The parking lot is full")
+        response = await self.request(reader, writer, {"action": "cancel_booking", "booking": 1, "plate": "PRE-001"})
+        self.assertTrue(response["ok"])
+        self.assertTrue((await self.request(reader, writer, {"action": "entry_auto", "plate": "ABC-123"}))["ok"])
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_invalid_requests(self):
+        reader, writer = await asyncio.open_connection(*self.address)
+        writer.write(b"not json\n")
+        self.assertEqual(json.loads(await reader.readline()), {"id": None, "ok": False, "message": "[Error] Invalid JSON"})
+        self.assertFalse((await self.request(reader, writer, {"id": 1, "action": "teleport"}))["ok"])
+        self.assertFalse((await self.request(reader, writer, {"id": 2, "action": "entry", "plate": "ABC-123"}))["ok"])
+        self.assertEqual(await self.request(reader, writer, {"id": 3, "action": "ping"}), {"id": 3, "ok": True, "message": "pong"})
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_failed_requests(self):
+        def fail(error):
+            def action(request):
+                raise error
+            return action
+        self.server.actions["locked"] = fail(sqlite3.OperationalError("database is locked"))
+        self.server.actions["cancelled"] = fail(futures.CancelledError())
+        reader, writer = await asyncio.open_connection(*self.address)
+        self.assertEqual(await self.request(reader, writer, {"id": 1, "action": "locked"}),
+                         {"id": 1, "ok": False, "message": "[Error] The request couldn't be completed : OperationalError('database is locked')"})
+        self.assertFalse((await self.request(reader, writer, {"id": 2, "action": "cancelled"}))["ok"])
+        self.assertEqual(await self.request(reader, writer, {"id": 3, "action": "ping"}), {"id": 3, "ok": True, "message": "pong"}) # Still served
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_failed_queued_write(self):
+        spot_id = self.db.create_parking_spot(1, 1, 1)[0]
+        await self.server.close() # Restarts the server so it loads the new spot
+        self.server = GateServer(self.db, port=0)
+        self.address = await self.server.start()
+        self.db.new_entry_visitor(spot_id, "XYZ-999") # Another process parks first, the lot doesn't know yet
+        reader, writer = await asyncio.open_connection(*self.address)
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            response = await self.request(reader, writer, {"action": "entry", "floor": 1, "row": 1, "spot": 1, "plate": "ABC-123"})
+            self.assertTrue(response["ok"]) # Answered before the write is committed
+            self.server.write_queue.flush() # The write fails on the open session index
+        self.assertIn("[Error] A database write failed, the parking lot is reloaded : IntegrityError", log.getvalue())
+        await self.request(reader, writer, {"action": "ping"}) # Runs after the reload on the worker thread
+        spot = self.server.controller.parking_lot.floors[1].rows[1].spots[1]
+        self.assertEqual(spot.registration_plate, "XYZ-999")
+        response = await self.request(reader, writer, {"action": "exit_plate", "plate": "ABC-123"})
+        self.assertEqual(response["message"], "[Error] Car ABC-123 is not parked in this parking lot")
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_failed_archival_is_retried(self):
+        await self.server.close()
+        self.server = GateServer(self.db, port=0)
+        self.server.ARCHIVE_INTERVAL = 0.01
+        runs = []
+
+        def archive():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                raise sqlite3.OperationalError("database is locked")
+        self.db.archive.archive = archive
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            self.address = await self.server.start()
+            for _ in range(100):
+                if len(runs) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertGreaterEqual(len(runs), 2) # Still running after the failed run
+        self.assertIn("[Error] The parking history couldn't be archived : OperationalError('database is locked')", log.getvalue())
+
+    async def test_concurrent_gates(self):
+        for spot_number in range(1, 21):
+            self.db.create_parking_spot(1, 1, spot_number)
+        await self.server.close() # Restarts the server so it loads the new spots
+        self.server = GateServer(self.db, port=0)
+        self.address = await self.server.start()
+
+        async def gate(number):
+            reader, writer = await asyncio.open_connection(*self.address)
+            responses = [await self.request(reader, writer, {"action": "entry_auto", "plate": f"GATE-{number}-{n}"}) for n in range(5)]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+        responses = [r for gate_responses in await asyncio.gather(*(gate(n) for n in range(5))) for r in gate_responses]
+        self.assertEqual(sum(r["ok"] for r in responses), 20) # Only 20 spots for 25 cars
+        self.assertEqual(self.server.controller.parking_lot.free_spots_count(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
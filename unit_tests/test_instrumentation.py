@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from src.controllers import DatabaseController, ParkingController, StatsController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.instrumentation import INSTRUMENTATION, Instrumentation, MethodStats
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.db.create_parking_spot(1, 1, 1)
+        self.instrumentation = Instrumentation({DatabaseController: None, ParkingController: ("new_entry", "new_exit", "fetch_parking_data")})
+
+    def tearDown(self):
+        self.instrumentation.disable()
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_disabled_leaves_the_classes_untouched(self):
+        original = DatabaseController.new_entry_visitor
+        self.instrumentation.enable()
+        self.assertIsNot(DatabaseController.new_entry_visitor, original)
+        self.assertEqual(DatabaseController.new_entry_visitor.__name__, "new_entry_visitor")
+        self.instrumentation.disable()
+        self.assertIs(DatabaseController.new_entry_visitor, original)
+        self.assertIs(DatabaseController.connect, vars(DatabaseController)["connect"])
+
+    def test_counts(self):
+        self.instrumentation.enable()
+        pc = ParkingController(db=self.db)
+        pc.new_entry(1, 1, 1, "ABC-123")
+        pc.new_exit(1, 1, 1, "ABC-123")
+        self.instrumentation.disable()
+        pc.new_entry(1, 1, 1, "ABC-123") # Not counted anymore
+        methods = self.instrumentation.snapshot()["methods"]
+        self.assertEqual(methods["ParkingController.new_entry"]["calls"], 1)
+        self.assertEqual(methods["ParkingController.new_exit"]["calls"], 1)
+        self.assertEqual(methods["ParkingController.fetch_parking_data"]["calls"], 1)
+        self.assertEqual(methods["DatabaseController.new_payment"]["calls"], 1)
+        self.assertEqual(sum(methods["ParkingController.new_entry"]["histogram_us"].values()), 1)
+        self.instrumentation.reset()
+        self.assertEqual(self.instrumentation.snapshot()["methods"], {})
+
+    def test_slow_calls_keep_their_sql(self):
+        self.instrumentation.slow_threshold = 0 # Every call is slow
+        self.instrumentation.enable()
+        with self.assertLogs("parkease.slow_queries", "WARNING"):
+            self.db.new_entry_visitor(1, "ABC-123")
+        slow = self.instrumentation.snapshot()["slow_calls"][-1]
+        self.assertEqual(slow["method"], "DatabaseController.new_entry_visitor")
+        self.assertTrue(any("INSERT INTO ParkingUsage" in statement for statement in slow["sql"]))
+
+    def test_percentiles(self):
+        stats = MethodStats()
+        for elapsed in [0.00002] * 90 + [0.003] * 10:
+            stats.record(elapsed)
+        self.assertEqual(stats.percentile(50), 0.025)
+        self.assertEqual(stats.percentile(95), 5.0)
+
+    def test_stats_controller(self):
+        controller = StatsController(None, self.instrumentation)
+        self.assertEqual(controller.toggle(), "[STATS] Instrumentation enabled")
+        self.db.is_premium("ABC-123")
+        self.assertIn("DatabaseController.is_premium", [row[0] for row in controller.fetch_rows()])
+        message = controller.export(self.tmp.name)
+        with open(message.split(" to ")[1]) as file:
+            self.assertIn("DatabaseController.is_premium", json.load(file)["methods"])
+        self.assertEqual(controller.toggle(), "[STATS] Instrumentation disabled")
+
+    def test_shared_instance_is_disabled(self):
+        self.assertFalse(INSTRUMENTATION.enabled)
+
+if __name__ == "__main__":
+    unittest.main()
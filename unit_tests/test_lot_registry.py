@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.lot_registry import LotRegistry
+
+class TestLotRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = LotRegistry(self.tmp.name)
+        for lot_number, spots in ((1, 3), (2, 5)):
+            db = self.registry.add_lot(lot_number)
+            for spot_number in range(1, spots + 1):
+                db.create_parking_spot(1, 1, spot_number)
+
+    def tearDown(self):
+        self.registry.close()
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_shards(self):
+        self.assertEqual(self.registry.lots(), [1, 2])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "parking_lot_2.db")))
+        self.assertEqual(LotRegistry(self.tmp.name).lots(), [1, 2]) # Existing shards are found again
+        with self.assertRaises(KeyError):
+            self.registry.controller(3)
+        with self.assertRaises(ValueError):
+            self.registry.add_lot(0)
+
+    def test_shard_names(self):
+        for name in ("parking_lot_0.db", "parking_lot_1.db", "parking_lot_03.db", "parking_lot_x.db"):
+            open(os.path.join(self.tmp.name, name), "wb").close()
+        open(os.path.join(self.tmp.name, "parking_lot_10.db"), "wb").close()
+        self.assertEqual(LotRegistry(self.tmp.name).lots(), [1, 2, 10]) # parking_lot_1.db doesn't shadow parking_lot.db
+
+    def test_routing(self):
+        lot_2 = self.registry.controller(2)
+        self.assertIs(self.registry.controller(2), lot_2)
+        self.assertEqual(lot_2.parking_lot.lot_number, 2)
+        lot_2.new_entry(1, 1, 4, "ABC-123")
+        self.assertEqual(len(self.registry.db(2).fetch_current_parked_vehicles()), 1)
+        self.assertEqual(len(self.registry.db(1).fetch_current_parked_vehicles()), 0)
+        self.assertEqual(self.registry.controller(1).parking_lot.find_car("ABC-123"), None)
+
+    def test_fan_out(self):
+        self.registry.controller(1).new_entry(1, 1, 1, "ABC-123")
+        self.registry.controller(1).new_exit(1, 1, 1, "ABC-123")
+        self.registry.db(2).new_entry_visitor(1, "DEF-456") # Written behind the back of the (unloaded) controller of lot 2
+        self.registry.db(2).new_payment(1, "DEF-456", 4.5)
+        self.assertEqual(self.registry.free_spots(), {1: 3, 2: 4})
+        self.assertEqual(self.registry.total_free_spots(), 7)
+        self.assertEqual(self.registry.revenue()[2], (1, 4.5))
+        self.assertEqual(self.registry.total_revenue(), sum(total for _, total in self.registry.revenue().values()))
+
+if __name__ == "__main__":
+    unittest.main()
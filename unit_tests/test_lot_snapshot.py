@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from src.controllers import DatabaseController, ParkingController
+from src.controllers.connection_manager import ConnectionManager
+
+class TestLotSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        for floor_number, row_number, spot_number in [(0, 1, 1), (0, 1, 2), (1, 1, 1), (1, 2, 1)]:
+            self.db.create_parking_spot(floor_number, row_number, spot_number)
+        self.db.add_premium_subscription("PRE-456")
+        self.pc = ParkingController(db=self.db) # Hydrated from the database, writes the first snapshot
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def assertSameLot(self, pc):
+        hydrated = ParkingController(db=self.db, snapshot=False)
+        self.assertEqual(str(pc.parking_lot), str(hydrated.parking_lot))
+        self.assertEqual(pc.get_available_spots(), hydrated.get_available_spots())
+
+    def test_restore_replays_the_journal(self):
+        self.pc.new_entry(0, 1, 1, "ABC-123")
+        self.pc.new_entry(1, 2, 1, "PRE-456")
+        self.pc.create_new_spot(2, 1, 1)
+        self.pc.new_exit(0, 1, 1, "ABC-123")
+        self.pc.new_entry_auto("DEF-789")
+        self.pc.delete_spot(1, 1, 1)
+        self.assertEqual(self.pc.snapshot.journal_length, 6)
+        restored = ParkingController(db=self.db)
+        self.assertEqual(restored.snapshot.journal_length, 6) # Restored, not hydrated
+        self.assertSameLot(restored)
+        self.assertEqual(str(restored.parking_lot.find_car("PRE-456").linked_car), "PRE-456 (premium)")
+        self.assertEqual(str(restored.parking_lot.find_car("DEF-789").linked_car), "DEF-789 (standard)")
+        self.assertEqual(restored.new_exit(1, 2, 1, "PRE-456")[:10], "[NEW EXIT]")
+
+    def test_stale_snapshot(self):
+        self.pc.new_entry(0, 1, 1, "ABC-123")
+        self.db.new_entry_visitor(self.pc.parking_lot.floors[1].rows[2].spots[1].id, "XYZ-000") # Another process
+        restored = ParkingController(db=self.db)
+        self.assertEqual(restored.snapshot.journal_length, 0) # Hydrated from the database, then snapshotted again
+        self.assertSameLot(restored)
+        self.assertIsNotNone(restored.parking_lot.find_car("XYZ-000"))
+
+    def test_change_never_written(self):
+        self.pc.new_entry(0, 1, 1, "ABC-123")
+        self.pc.parking_lot.floors[0].rows[1].spots[1].exit("ABC-123") # Journaled, but never written to the database
+        restored = ParkingController(db=self.db)
+        self.assertEqual(restored.snapshot.journal_length, 0)
+        self.assertSameLot(restored)
+
+    def test_corrupt_files(self):
+        self.pc.new_entry(0, 1, 1, "ABC-123")
+        with open(self.pc.snapshot.journal_path, "r+b") as file:
+            file.truncate(os.path.getsize(self.pc.snapshot.journal_path) - 1) # Record cut short by a crash
+        self.assertEqual(ParkingController(db=self.db).snapshot.journal_length, 0)
+        with open(self.pc.snapshot.path, "r+b") as file:
+            file.seek(30)
+            file.write(b"\xff")
+        restored = ParkingController(db=self.db)
+        self.assertSameLot(restored)
+        self.assertIsNotNone(restored.parking_lot.find_car("ABC-123"))
+
+    def test_checkpoint(self):
+        self.assertFalse(self.pc.checkpoint(force=True)) # Nothing journaled yet
+        self.pc.new_entry(0, 1, 1, "ABC-123")
+        self.assertFalse(self.pc.checkpoint())
+        self.pc.snapshot.SNAPSHOT_EVERY = 2
+        self.pc.new_entry(0, 1, 2, "DEF-456")
+        self.assertTrue(self.pc.checkpoint())
+        self.assertEqual(os.path.getsize(self.pc.snapshot.journal_path), 0)
+        self.pc.new_exit(0, 1, 2, "DEF-456")
+        restored = ParkingController(db=self.db)
+        self.assertEqual(restored.snapshot.journal_length, 1)
+        self.assertSameLot(restored)
+
+    def test_without_snapshot(self):
+        pc = ParkingController(db=self.db, snapshot=False)
+        self.assertIsNone(pc.snapshot)
+        self.assertFalse(pc.checkpoint(force=True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,5 @@
+import sys
+import tracemalloc
 import unittest
 from src.models import ParkingLot, ParkingFloor, ParkingRow, ParkingSpot, PremiumCar, StandardCar
 
@@ -266,6 +268,152 @@ class TestParkingSpot(unittest.TestCase):
 
 
 
+class TestPlateIndex(unittest.TestCase):
+    def setUp(self):
+        self.p = ParkingLot(1)
+        self.s1 = self.p.add_spot({"id": 1, "spot_number": 1, "row_number": 2, "floor_number": 3})
+        self.s2 = self.p.add_spot({"id": 2, "spot_number": 2, "row_number": 2, "floor_number": 3})
+
+    def test_location(self):
+        self.assertEqual((self.s1.floor_number, self.s1.row_number, self.s1.spot_number), (3, 2, 1))
+        self.assertIsNone(ParkingSpot(3, 1).floor_number)
+
+    def test_enter_exit(self):
+        self.assertIsNone(self.p.find_car("ABC-123"))
+        self.s1.enter("ABC-123", False)
+        self.assertIs(self.p.find_car("ABC-123"), self.s1)
+        self.s1.exit("ABC-123")
+        self.assertIsNone(self.p.find_car("ABC-123"))
+
+    def test_book(self):
+        self.s2.book("PRE-456", True)
+        self.assertIs(self.p.find_car("PRE-456"), self.s2)
+        self.s2.enter("PRE-456", True)
+        self.assertIs(self.p.find_car("PRE-456"), self.s2)
+
+    def test_failed_operations(self):
+        self.s1.enter("ABC-123", False)
+        with self.assertRaises(AssertionError):
+            self.s1.enter("XYZ-789", False)
+        with self.assertRaises(AssertionError):
+            self.s1.exit("XYZ-789")
+        self.assertIs(self.p.find_car("ABC-123"), self.s1)
+        self.assertIsNone(self.p.find_car("XYZ-789"))
+
+    def test_remove_spot(self):
+        self.s1.enter("ABC-123", False)
+        self.p.remove_spot({"spot_number": 1, "row_number": 2, "floor_number": 3})
+        self.assertIsNone(self.p.find_car("ABC-123"))
+        self.s1.exit("ABC-123") # A removed spot doesn't update the lot anymore
+        self.assertEqual(len(self.p._plates_by_spot), 0)
+
+    def test_listeners(self):
+        events = []
+        listener = lambda event, spot: events.append((event, spot.id, spot.status))
+        self.p.add_listener(listener)
+        s3 = self.p.add_spot({"id": 3, "spot_number": 3, "row_number": 2, "floor_number": 3})
+        self.s1.enter("ABC-123", False)
+        self.s1.exit("ABC-123")
+        self.p.remove_spot({"spot_number": 3, "row_number": 2, "floor_number": 3})
+        self.p.remove_listener(listener)
+        self.s2.enter("DEF-456", False)
+        self.assertEqual(events, [("added", 3, "free"), ("changed", 1, "occupied"), ("changed", 1, "free"), ("removed", 3, "free")])
+        self.assertEqual((s3.floor_number, s3.row_number), (3, 2)) # Still known by the "removed" listeners
+
+class TestFreeSpotAllocation(unittest.TestCase):
+    def setUp(self):
+        self.p = ParkingLot(1)
+        for id, (floor_number, row_number, spot_number) in enumerate([(2, 1, 1), (1, 2, 1), (1, 1, 2), (-1, 1, 1), (0, 3, 5)], start=1):
+            self.p.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
+
+    def order(self):
+        return [(s.floor_number, s.row_number, s.spot_number) for s in self.p.free_spots()]
+
+    def test_order(self):
+        self.assertEqual(self.order(), [(0, 3, 5), (-1, 1, 1), (1, 1, 2), (1, 2, 1), (2, 1, 1)])
+        self.assertEqual(self.p.next_free_spot().id, 5)
+        self.assertEqual(self.p.free_spots_count(), 5)
+        self.assertEqual(self.p.free_spots_count(1), 2)
+
+    def test_enter_exit(self):
+        self.p.next_free_spot().enter("ABC-123", False)
+        self.assertEqual(self.p.next_free_spot().id, 4)
+        self.p.floors[-1].rows[1].spots[1].book("PRE-456", True)
+        self.assertEqual(self.p.next_free_spot().id, 3)
+        self.assertEqual(self.p.free_spots_count(), 3)
+        self.p.floors[0].rows[3].spots[5].exit("ABC-123")
+        self.assertEqual(self.p.next_free_spot().id, 5)
+        self.assertEqual(self.p.free_spots_count(0), 1)
+
+    def test_remove_spot(self):
+        self.p.remove_spot({"spot_number": 5, "row_number": 3, "floor_number": 0})
+        self.assertEqual(self.p.next_free_spot().id, 4)
+        self.assertEqual(self.p.free_spots_count(), 4)
+
+    def test_full(self):
+        for i in range(5):
+            self.p.next_free_spot().enter(f"CAR-{i}", False)
+        self.assertIsNone(self.p.next_free_spot())
+        self.assertEqual(self.p.free_spots(), [])
+
+    def test_churn(self):
+        spot = self.p.floors[2].rows[1].spots[1]
+        for i in range(1000):
+            spot.enter(f"CAR-{i}", False)
+            spot.exit(f"CAR-{i}")
+        self.assertLess(len(self.p._free_spots._heap), 100)
+        self.assertEqual(len(self.order()), 5)
+
+    def test_load_spots(self):
+        self.p.floors[1].rows[2].spots[1].enter("ABC-123", True)
+        loaded = ParkingLot(1)
+        spots = loaded.load_spots([(5, 5, 3, 0, None, False), (1, 1, 1, 2, None, False), (2, 1, 2, 1, "ABC-123", True),
+                                   (3, 2, 1, 1, None, False), (4, 1, 1, -1, None, False)])
+        self.assertEqual(str(loaded), str(self.p))
+        self.assertEqual(self.order(), [(s.floor_number, s.row_number, s.spot_number) for s in loaded.free_spots()])
+        self.assertIs(loaded.find_car("ABC-123"), spots[2])
+        self.assertIsInstance(spots[2].linked_car, PremiumCar)
+        spots[2].exit("ABC-123") # The loaded spots keep the lot indexes up to date
+        self.assertEqual(loaded.free_spots_count(1), 2)
+        with self.assertRaises(ValueError):
+            loaded.load_spots([(6, 5, 3, 0, None, False)])
+
+class TestMemoryFootprint(unittest.TestCase):
+    SPOTS_PER_ROW, ROWS, FLOORS = 50, 40, 5
+    BUDGET = 350 # Bytes per spot, including the floors/rows dicts and the lot indexes
+
+    def test_memory_per_spot(self):
+        # Interned beforehand : the interpreter-wide intern table may otherwise grow during the measurement
+        plates = [sys.intern(f"AB-{i:05d}") for i in range(self.SPOTS_PER_ROW * self.ROWS * self.FLOORS)]
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            p = ParkingLot(1)
+            id = 0
+            for floor_number in range(self.FLOORS):
+                for row_number in range(1, self.ROWS + 1):
+                    for spot_number in range(1, self.SPOTS_PER_ROW + 1):
+                        id += 1
+                        p.add_spot({"id": id, "spot_number": spot_number, "row_number": row_number, "floor_number": floor_number})
+            for i, spot in enumerate(p.free_spots()[::4]):
+                spot.enter(plates[i], i % 3 == 0)
+            per_spot = (tracemalloc.get_traced_memory()[0] - before) / id
+        finally:
+            tracemalloc.stop()
+        self.assertLess(per_spot, self.BUDGET)
+
+    def test_linked_car(self):
+        s1 = ParkingSpot(1, 1)
+        s1.enter("ABC-123", True)
+        self.assertIsInstance(s1.linked_car, PremiumCar)
+        self.assertEqual(s1.registration_plate, "ABC-123")
+        self.assertEqual(str(s1), "Spot 1 : occupied by ABC-123 (premium)")
+        with self.assertRaises(AttributeError):
+            s1.color = "red" # No __dict__
+        s1.exit("ABC-123")
+        self.assertIsNone(s1.linked_car)
+        self.assertIsNone(s1.registration_plate)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,68 @@
+import random
+import unittest
+from src import occupancy
+from src.occupancy import occupancy_statistics
+
+def brute_force(sessions, start, end, step):
+    """Occupancy sampled every second, per bucket : (average, peak)"""
+    averages, peaks = [], []
+    for bucket_start in range(start, end, step):
+        levels = []
+        for t in range(bucket_start, min(bucket_start + step, end)):
+            levels.append(sum(1 for entry, exit in sessions if entry <= t and (exit is None or t < exit)))
+        averages.append(sum(levels) / len(levels))
+        peaks.append(max(levels))
+    return averages, peaks
+
+class TestOccupancy(unittest.TestCase):
+    def random_usages(self, count, seed):
+        rng = random.Random(seed)
+        usages = []
+        for _ in range(count):
+            entry = rng.randrange(-50, 400)
+            exit = entry + rng.randrange(1, 150) if rng.random() < 0.8 else None
+            usages.append((rng.choice([-1, 0, 2]), entry, exit))
+        return usages
+
+    def check(self, use_numpy):
+        for seed in range(5):
+            usages = self.random_usages(60, seed)
+            end = 300 if seed % 2 else 290 # The last bucket is shorter when the period isn't a multiple of the step
+            stats = occupancy_statistics(usages, 0, end, 60, use_numpy=use_numpy)
+            sessions = [(entry, exit) for floor, entry, exit in usages]
+            averages, peaks = brute_force(sessions, 0, end, 60)
+            for got, expected in zip(stats["occupancy"]["all"], averages):
+                self.assertAlmostEqual(got, expected)
+            self.assertEqual(stats["peak_occupancy"]["all"], peaks)
+            for floor in (-1, 0, 2):
+                floor_sessions = [(entry, exit) for f, entry, exit in usages if f == floor]
+                self.assertEqual(stats["peak_occupancy"][floor], brute_force(floor_sessions, 0, end, 60)[1])
+
+    def test_sweep_python(self):
+        self.check(use_numpy=False)
+
+    @unittest.skipIf(occupancy.numpy is None, "NumPy is not installed")
+    def test_sweep_numpy(self):
+        self.check(use_numpy=True)
+
+    def test_summary(self):
+        usages = [(1, 0, 3600), (1, 1800, 5400), (2, 3600, None), (2, -100, -10)]
+        stats = occupancy_statistics(usages, 0, 7200, use_numpy=False)
+        self.assertEqual(stats["buckets"], ["1970-01-01 00:00", "1970-01-01 01:00"])
+        self.assertEqual(stats["occupancy"]["all"], [1.5, 1.5])
+        self.assertEqual(stats["occupancy"][2], [0.0, 1.0])
+        self.assertEqual(stats["peak"], 2)
+        self.assertEqual(stats["peak_time"], "1970-01-01 00:00")
+        self.assertEqual(stats["sessions"], 3)
+        self.assertEqual(stats["average_dwell_hours"], 1.0)
+
+    def test_shorter_last_bucket(self):
+        for use_numpy in [False] + ([True] if occupancy.numpy is not None else []):
+            stats = occupancy_statistics([(1, 0, 5400)], 0, 5400, 3600, use_numpy=use_numpy)
+            self.assertEqual(stats["occupancy"]["all"], [1.0, 1.0]) # Parked during the whole 30 minutes of the last bucket
+
+    def test_invalid_period(self):
+        self.assertRaises(ValueError, occupancy_statistics, [], 10, 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from src.controllers import DatabaseController, ParkingController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.occupancy_board import OccupancyBoardReader
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+class TestOccupancyBoard(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        for floor_number, row_number, spot_number in [(0, 1, 1), (0, 1, 2), (1, 1, 1), (1, 2, 1), (1, 2, 2)]:
+            self.db.create_parking_spot(floor_number, row_number, spot_number)
+        self.pc = ParkingController(db=self.db)
+        self.reader = OccupancyBoardReader(self.db.path)
+
+    def tearDown(self):
+        self.reader.close()
+        self.pc.board.close()
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_live_updates(self):
+        self.assertEqual(self.reader.free_count(), 5)
+        self.assertEqual(self.reader.floors(), {0: (2, 2), 1: (3, 3)})
+        sequence = self.reader.sequence
+        self.pc.new_entry(1, 2, 1, "ABC-123")
+        self.pc.new_entry(0, 1, 1, "DEF-456")
+        self.assertEqual(self.reader.free_count(), 3)
+        self.assertEqual(self.reader.free_count(1), 2)
+        self.assertEqual(self.reader.free_count(5), 0)
+        self.assertEqual(self.reader.sequence, sequence + 4)
+        self.pc.new_exit(1, 2, 1, "ABC-123")
+        self.assertEqual(self.reader.floors(), {0: (1, 2), 1: (3, 3)})
+
+    def test_statuses(self):
+        statuses = self.reader.statuses()
+        positions = [position[1:] for position in self.reader.spots()]
+        self.assertEqual(positions, [(0, 1, 1), (0, 1, 2), (1, 1, 1), (1, 2, 1), (1, 2, 2)])
+        self.pc.new_entry(1, 2, 1, "ABC-123")
+        self.assertEqual(bytes(statuses), b"\x00\x00\x00\x01\x00") # The view follows the file without being read again
+        statuses.release()
+
+    def test_layout_change(self):
+        sequence = self.reader.sequence
+        self.pc.create_new_spot(-1, 1, 1)
+        self.assertEqual(self.reader.floors(), {-1: (1, 1), 0: (2, 2), 1: (3, 3)}) # Maps the new file
+        self.pc.delete_spot(0, 1, 2)
+        self.assertEqual(self.reader.free_count(), 5)
+        self.assertGreater(self.reader.sequence, sequence)
+        # A new controller publishes a new file, the readers of the previous one follow
+        ParkingController(db=self.db).new_entry_auto("ABC-123")
+        self.assertEqual(self.reader.free_count(0), 0)
+
+    def test_other_process(self):
+        self.pc.new_entry(0, 1, 2, "ABC-123")
+        script = ("from controllers.occupancy_board import OccupancyBoardReader; "
+                  f"print(OccupancyBoardReader({self.db.path!r}).free_count())")
+        output = subprocess.run([sys.executable, "-c", script], env=dict(os.environ, PYTHONPATH=SRC),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "4")
+
+    def test_without_board(self):
+        self.assertIsNone(ParkingController(db=self.db, board=False).board)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
-from src.controllers import ParkingController
+from src.controllers import ParkingController, DatabaseController
+from src.controllers.connection_manager import ConnectionManager
 from src.models import PremiumCar, StandardCar
 
 class TestParkingController(unittest.TestCase):
@@ -66,5 +69,93 @@ class TestParkingController(unittest.TestCase):
         pc.parking_lot.add_spot({"id": 2, "spot_number": 2, "row_number": 1, "floor_number": 1})
         self.assertEqual(pc.new_exit(1, 1, 3, "XYZ-123"), "[Error] This spot does not exist")
 
+    def test_new_exit_by_plate(self):
+        pc = ParkingController(update_db=False)
+        pc.parking_lot.add_spot({"id": 1, "spot_number": 4, "row_number": 2, "floor_number": -1})
+        pc.new_entry(-1, 2, 4, "ABC-123")
+        self.assertEqual(pc.new_exit_by_plate("ABC-123"), "[NEW EXIT] Car ABC-123 was successfully parked out of floor -1 - row 2 - spot 4")
+        self.assertEqual(pc.parking_lot.floors[-1].rows[2].spots[4].status, "free")
+        self.assertEqual(pc.new_exit_by_plate("ABC-123"), "[Error] Car ABC-123 is not parked in this parking lot")
+
+    def test_new_entry_auto(self):
+        pc = ParkingController(update_db=False)
+        self.assertEqual(pc.new_entry_auto("ABC-123"), "[Error] The parking lot is full")
+        pc.parking_lot.add_spot({"id": 1, "spot_number": 1, "row_number": 1, "floor_number": 2})
+        pc.parking_lot.add_spot({"id": 2, "spot_number": 3, "row_number": 1, "floor_number": 0})
+        self.assertEqual(pc.get_available_spots(), [(2, 3, 1, 0), (1, 1, 1, 2)])
+        self.assertEqual(pc.new_entry_auto("ABC-123"), "[NEW ENTRY] Car ABC-123 was successfully parked at floor 0 - row 1 - spot 3")
+        self.assertEqual(pc.new_entry_auto("DEF-456"), "[NEW ENTRY] Car DEF-456 was successfully parked at floor 2 - row 1 - spot 1")
+        self.assertEqual(pc.get_available_spots(), [])
+
+class TestParkingControllerDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_fetch_parking_data(self):
+        free, occupied, premium = (self.db.create_parking_spot(1, 1, n)[0] for n in (1, 2, 3))
+        self.db.new_entry_visitor(free, "OLD-001")
+        self.db.new_exit(free, "OLD-001")
+        self.db.new_entry_visitor(occupied, "ABC-123")
+        self.db.add_premium_subscription("PRE-456")
+        self.db.new_entry_visitor(premium, "PRE-456")
+        spots = ParkingController(db=self.db).parking_lot.floors[1].rows[1].spots
+        self.assertEqual(spots[1].status, "free")
+        self.assertIsNone(spots[1].linked_car)
+        self.assertEqual(spots[2].status, "occupied")
+        self.assertEqual(str(spots[2].linked_car), "ABC-123 (standard)")
+        self.assertEqual(spots[3].status, "occupied")
+        self.assertEqual(str(spots[3].linked_car), "PRE-456 (premium)")
+
+    def test_entry_exit_round_trip(self):
+        self.db.create_parking_spot(2, 3, 4)
+        pc = ParkingController(db=self.db)
+        pc.new_entry(2, 3, 4, "ABC-123")
+        self.assertEqual(ParkingController(db=self.db).parking_lot.floors[2].rows[3].spots[4].status, "occupied")
+        pc.new_exit(2, 3, 4, "ABC-123")
+        self.assertEqual(ParkingController(db=self.db).parking_lot.floors[2].rows[3].spots[4].status, "free")
+        self.assertEqual(len(self.db.fetch_all_payments()), 1)
+
+    def test_bulk_entries_and_exits(self):
+        with self.db.transaction():
+            for n in range(1, 4):
+                self.db.create_parking_spot(1, 1, n)
+        self.db.add_premium_subscription("PRE-003")
+        pc = ParkingController(db=self.db)
+        self.assertEqual(pc.new_entries_bulk([(1, 1, 1, "ABC-001"), (1, 1, 1, "ABC-002"), (1, 1, 3, "PRE-003"), (1, 9, 1, "ABC-004")]), [
+            "[NEW ENTRY] Car ABC-001 was successfully parked at floor 1 - row 1 - spot 1",
+            "[Error] This spot is already occupied",
+            "[NEW ENTRY] Car PRE-003 was successfully parked at floor 1 - row 1 - spot 3",
+            "[Error] This spot does not exist",
+        ])
+        spots = ParkingController(db=self.db).parking_lot.floors[1].rows[1].spots
+        self.assertEqual(str(spots[1].linked_car), "ABC-001 (standard)")
+        self.assertEqual(spots[2].status, "free")
+        self.assertEqual(str(spots[3].linked_car), "PRE-003 (premium)")
+
+        self.assertEqual(pc.new_exits_bulk([(1, 1, 1, "ABC-001"), (1, 1, 2, "ABC-002"), (1, 1, 3, "XYZ-999"), (1, 1, 3, "PRE-003")]), [
+            "[NEW EXIT] Car ABC-001 was successfully parked out of floor 1 - row 1 - spot 1",
+            "[Error] This spot is unoccupied or the registration plates don't match",
+            "[Error] This spot is unoccupied or the registration plates don't match",
+            "[NEW EXIT] Car PRE-003 was successfully parked out of floor 1 - row 1 - spot 3",
+        ])
+        self.assertEqual(sorted(plate for _, plate, _ in self.db.fetch_all_payments()), ["ABC-001", "PRE-003"])
+        self.assertEqual(ParkingController(db=self.db).get_available_spots(), pc.get_available_spots())
+        self.assertEqual(len(pc.get_available_spots()), 3)
+
+    def test_bulk_entries_rollback(self):
+        self.db.create_parking_spot(1, 1, 1)
+        pc = ParkingController(db=self.db)
+        self.db.new_entries_bulk = None # Makes the write fail after the lot was updated
+        with self.assertRaises(TypeError):
+            pc.new_entries_bulk([(1, 1, 1, "ABC-001")])
+        self.assertEqual(pc.parking_lot.floors[1].rows[1].spots[1].status, "free")
+        self.assertIsNone(pc.parking_lot.find_car("ABC-001"))
+
 if __name__ == "__main__":
     unittest.main()
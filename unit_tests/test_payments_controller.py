@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from src.controllers import PaymentsController, DatabaseController
+from src.controllers.connection_manager import ConnectionManager
+
+class TestPaymentsController(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.pc = PaymentsController(None, db=self.db)
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def pay(self, usage_id, registration_plate, amount, paid_at):
+        with self.db.connect() as conn:
+            conn.execute("INSERT INTO Payments (usage_id, registration_plate, amount, paid_at) VALUES (?, ?, ?, ?)",
+                         (usage_id, registration_plate, amount, paid_at))
+
+    def test_empty(self):
+        self.assertEqual(self.pc.calculate_total_revenue(), 0.0)
+        self.assertEqual(self.pc.calculate_average_payment(), 0.0)
+        self.assertEqual(self.pc.generate_payment_summary()["payments"], 0)
+
+    def test_aggregates(self):
+        self.pay(1, "ABC-123", 6.0, "2024-03-01 10:00:00")
+        self.pay(2, "DEF-456", 3.0, "2024-03-01 23:59:59")
+        self.pay(3, "ABC-123", 9.0, "2024-03-02 08:30:00")
+        self.db.new_payment(4, "GHI-789", 2.0)
+        self.assertEqual(self.pc.calculate_total_revenue(), 20.0)
+        self.assertEqual(self.pc.calculate_average_payment(), 5.0)
+        summary = self.pc.generate_payment_summary("2024-03-01", "2024-03-02")
+        self.assertEqual(summary["payments"], 3)
+        self.assertEqual(summary["total_revenue"], 18.0)
+        self.assertEqual(summary["daily_revenue"], {"2024-03-01": 9.0, "2024-03-02": 9.0})
+        self.assertEqual([p.usage_id for p in self.pc.fetch_payments_by_date("2024-03-01", "2024-03-01")], [1, 2])
+        self.assertEqual([p.usage_id for p in self.pc.fetch_payments_by_registration_plate("ABC-123")], [1, 3])
+
+    def test_rollup_matches_payments(self):
+        for i in range(50):
+            self.pay(i + 1, f"CAR-{i}", float(i % 7), f"2024-01-{i % 28 + 1:02d} 12:00:00")
+        with self.db.connect() as conn:
+            expected = conn.execute("SELECT DATE(paid_at), COUNT(*), SUM(amount) FROM Payments GROUP BY DATE(paid_at) ORDER BY 1").fetchall()
+        self.assertEqual(self.db.fetch_daily_revenue(), expected)
+
+if __name__ == "__main__":
+    unittest.main()
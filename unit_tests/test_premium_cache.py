@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.controllers import DatabaseController, PremiumCarsController
+from src.controllers.connection_manager import ConnectionManager
+
+class TestPremiumCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.db.premium_cache.CHECK_INTERVAL = 0 # Checks the data version on every lookup
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def other_process(self, statement, parameters=()):
+        """Writes through a connection the pool doesn't know about, like another process would"""
+        conn = sqlite3.connect(self.db.path)
+        with conn:
+            conn.execute(statement, parameters)
+        conn.close()
+
+    def test_shared_and_write_through(self):
+        self.assertIs(DatabaseController(self.db.path).premium_cache, self.db.premium_cache)
+        self.assertFalse(self.db.is_premium("ABC-123"))
+        self.db.add_premium_subscription("ABC-123")
+        self.assertTrue(DatabaseController(self.db.path).is_premium("ABC-123"))
+        self.db.delete_premium_subscription("ABC-123")
+        self.assertFalse(self.db.is_premium("ABC-123"))
+
+    def test_other_process_changes(self):
+        self.assertFalse(self.db.is_premium("ABC-123"))
+        self.other_process("INSERT INTO PremiumCars (registration_plate) VALUES (?)", ("ABC-123",))
+        self.assertTrue(self.db.is_premium("ABC-123"))
+        self.other_process("DELETE FROM PremiumCars")
+        self.assertFalse(self.db.is_premium("ABC-123"))
+
+    def test_missing_version_counter(self):
+        self.other_process("DELETE FROM DataVersions WHERE name = 'PremiumCars'")
+        self.assertFalse(self.db.is_premium("ABC-123"))
+        self.other_process("INSERT INTO PremiumCars (registration_plate) VALUES (?)", ("ABC-123",)) # Bumps no counter
+        self.assertTrue(self.db.is_premium("ABC-123"))
+        self.db.delete_premium_subscription("ABC-123")
+        self.assertFalse(self.db.is_premium("ABC-123"))
+
+    def test_unrelated_changes_keep_the_set(self):
+        self.db.add_premium_subscription("ABC-123")
+        self.assertTrue(self.db.is_premium("ABC-123"))
+        plates = self.db.premium_cache._plates
+        self.other_process("INSERT INTO ParkingSpots (floor_number, row_number, spot_number) VALUES (1, 1, 1)")
+        self.assertTrue(self.db.is_premium("ABC-123"))
+        self.assertIs(self.db.premium_cache._plates, plates) # Not reloaded
+
+    def test_rolled_back_subscription(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.add_premium_subscription("ABC-123")
+                raise RuntimeError
+        self.assertFalse(self.db.is_premium("ABC-123"))
+
+    def test_premium_cars_controller(self):
+        controller = PremiumCarsController(None, db=self.db)
+        self.assertEqual(controller.new_premium_car("DEF-456"), "[NEW PREMIUM]DEF-456 was succesfully registered with premium status")
+        self.assertEqual(controller.new_premium_car("ABC-123"), "[NEW PREMIUM]ABC-123 was succesfully registered with premium status")
+        self.assertEqual(controller.new_premium_car("ABC-123"), "[Error] ABC-123 is already registered with premium status")
+        self.assertEqual(controller.premium_cars, ["ABC-123", "DEF-456"])
+        self.assertEqual(controller.delete_premium_car("DEF-456"), "[DELETE PREMIUM] DEF-456 was succesfully removed from premium list")
+        self.assertEqual(controller.premium_cars, ["ABC-123"])
+
+if __name__ == "__main__":
+    unittest.main()
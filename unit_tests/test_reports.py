@@ -0,0 +1,99 @@
+import csv
+import os
+import tempfile
+import tracemalloc
+import unittest
+from src.controllers import AnalyticsController, DatabaseController
+from src.controllers.connection_manager import ConnectionManager
+from src.reports import USAGE_COLUMNS, format_timestamp, iter_columnar_rows, read_columnar, write_report
+
+class TestReports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.db.create_parking_spot(0, 1, 1)
+        self.db.create_parking_spot(1, 2, 3)
+        self.db.create_parking_spot(2, 1, 1)
+        with self.db.connect() as conn:
+            conn.executemany("INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time, exit_time) VALUES (?, ?, ?, ?)",
+                             [(1, "ABC-123", "2024-03-01 08:00:00", "2024-03-01 10:30:00"),
+                              (2, "DEF-456", "2024-03-01 09:15:00", None),
+                              (3, "GHI-789", "2024-03-02 12:00:00", "2024-03-02 13:00:00"),
+                              (1, "ABC-123", "2024-02-29 23:59:59", "2024-03-01 00:10:00")])
+            conn.executemany("INSERT INTO Payments (usage_id, registration_plate, amount, paid_at) VALUES (?, ?, ?, ?)",
+                             [(1, "ABC-123", 7.5, "2024-03-01 10:30:00"), (3, "GHI-789", 3.25, "2024-03-02 13:00:00"),
+                              (4, "ABC-123", 1.5, "2024-03-01 00:10:00")])
+        self.db.delete_parking_spot(2, 1, 1) # Its usages keep being reported, without a position
+        self.analytics = AnalyticsController(None, db=self.db)
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_usage_csv(self):
+        message = self.analytics.generate_usage_report("2024-03-01", "2024-03-03", self.path("usages.csv"), chunk_size=2)
+        self.assertEqual(message, f"[REPORT] 3 parking usages exported to {self.path('usages.csv')}")
+        with open(self.path("usages.csv"), newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[0], [name for name, kind in USAGE_COLUMNS])
+        self.assertEqual(rows[1:], [["1", "1", "0", "1", "1", "ABC-123", "2024-03-01 08:00:00", "2024-03-01 10:30:00"],
+                                    ["2", "2", "1", "2", "3", "DEF-456", "2024-03-01 09:15:00", ""],
+                                    ["3", "3", "", "", "", "GHI-789", "2024-03-02 12:00:00", "2024-03-02 13:00:00"]])
+
+    def test_usage_columnar(self):
+        self.analytics.generate_usage_report("2024-01-01", "2025-01-01", self.path("usages.col"), "columnar", chunk_size=3)
+        self.assertEqual([len(group["id"]) for group in read_columnar(self.path("usages.col"))], [3, 1])
+        rows = list(iter_columnar_rows(self.path("usages.col")))
+        self.assertEqual(rows, list(self.db.iter_usage_chunks(0, self.analytics.to_timestamp("2100-01-01"), 10))[0])
+        self.assertEqual(rows[1][7], None)
+        self.assertEqual(rows[2][2:5], (None, None, None))
+        self.assertEqual(format_timestamp(rows[0][6]), "2024-03-01 08:00:00")
+
+    def test_payment_report(self):
+        self.analytics.generate_payment_report("2024-03-01 00:30:00", "2024-03-03", self.path("payments.csv"))
+        with open(self.path("payments.csv"), newline="") as file:
+            self.assertEqual(list(csv.reader(file))[1:], [["1", "ABC-123", "7.5", "2024-03-01 10:30:00"],
+                                                         ["3", "GHI-789", "3.25", "2024-03-02 13:00:00"]])
+        message = self.analytics.generate_payment_report("2024-01-01", "2025-01-01", self.path("payments.col"), "columnar")
+        self.assertEqual(message[:10], "[REPORT] 3")
+        self.assertEqual([row[2] for row in iter_columnar_rows(self.path("payments.col"))], [1.5, 7.5, 3.25])
+
+    def test_empty_period(self):
+        self.assertEqual(self.analytics.generate_usage_report("2020-01-01", "2020-01-02", self.path("empty.col"), "columnar")[:10], "[REPORT] 0")
+        self.assertEqual(list(iter_columnar_rows(self.path("empty.col"))), [])
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            self.analytics.generate_usage_report("2024-03-01", "2024-03-03", self.path("usages.xlsx"), "xlsx")
+        with self.assertRaises(ValueError):
+            list(read_columnar(os.path.join(os.path.dirname(__file__), "test_reports.py")))
+
+    def test_failed_export_keeps_previous_report(self):
+        write_report([[(1,)]], (("id", "i"),), self.path("report.csv"))
+        def chunks():
+            yield [(2,)]
+            raise RuntimeError("Connection lost")
+        with self.assertRaises(RuntimeError):
+            write_report(chunks(), (("id", "i"),), self.path("report.csv"))
+        with open(self.path("report.csv")) as file:
+            self.assertEqual(file.read().split(), ["id", "1"])
+        self.assertEqual(os.listdir(self.tmp.name).count("report.csv.tmp"), 0)
+
+    def test_constant_memory(self):
+        def peak(rows, format):
+            chunks = ([(i, i % 50, 0, 1, i % 50, f"PLATE-{i % 500}", 1700000000 + i, None) for i in range(start, min(start + 500, rows))]
+                      for start in range(0, rows, 500))
+            tracemalloc.start()
+            write_report(chunks, USAGE_COLUMNS, self.path(f"large.{format}"), format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+        for format in ("csv", "columnar"):
+            self.assertLess(peak(40000, format), peak(4000, format) * 1.5)
+
+if __name__ == "__main__":
+    unittest.main()
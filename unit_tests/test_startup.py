@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import unittest
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+# Cumulative import time of the interpreter startup and the core package, in microseconds.
+# About 35 ms when measured, the budget leaves room for slow machines but not for tkinter or pip's vendored packages
+IMPORT_BUDGET = 100_000
+
+CORE_IMPORT = "import models, controllers; from controllers import DatabaseController, ParkingController"
+
+def run_python(*args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+class TestStartup(unittest.TestCase):
+    def test_core_doesnt_load_the_gui(self):
+        loaded = run_python("-c", CORE_IMPORT + "; import sys; print(' '.join(sys.modules))").stdout.split()
+        for module in ("tkinter", "pip", "interface", "asyncio", "controllers.analytics_controller", "controllers.instrumentation"):
+            self.assertNotIn(module, loaded)
+
+    def test_import_time_budget(self):
+        # -X importtime writes "import time: self [us] | cumulative | imported package" to stderr
+        stderr = run_python("-X", "importtime", "-c", CORE_IMPORT).stderr
+        total = 0
+        for line in stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("  "):
+                total += int(fields[1]) # Top-level imports only, their cumulative time covers the rest
+        self.assertGreater(total, 0)
+        self.assertLess(total, IMPORT_BUDGET)
+
+if __name__ == "__main__":
+    unittest.main()
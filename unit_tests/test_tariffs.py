@@ -0,0 +1,215 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from src import tariffs
+from src.controllers import DatabaseController, ParkingController, PaymentsController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.write_queue import WriteQueue
+from src.tariffs import WEEKDAYS, WEEKEND, Tariff
+
+def ts(date: str) -> int:
+    return int(datetime.fromisoformat(date).replace(tzinfo=timezone.utc).timestamp())
+
+# 4/h in the day and 1/h at night on weekdays, 2/h on weekends, at most 20 per day
+BANDS = [(WEEKDAYS, 0, 480, 1.0), (WEEKDAYS, 480, 1080, 4.0), (WEEKDAYS, 1080, 1440, 1.0), (WEEKEND, 0, 1440, 2.0)]
+
+class TestTariff(unittest.TestCase):
+    def setUp(self):
+        self.tariff = Tariff("city", BANDS, daily_cap=20)
+
+    def test_bands(self):
+        self.assertEqual(self.tariff.price(ts("2024-03-04 07:00"), ts("2024-03-04 09:00")), 5.0) # Monday, across 8:00
+        self.assertEqual(self.tariff.price(ts("2024-03-04 08:00"), ts("2024-03-04 08:20")), 1.33)
+        self.assertEqual(self.tariff.price(ts("2024-03-02 10:00"), ts("2024-03-02 13:00")), 6.0) # Saturday
+        self.assertEqual(self.tariff.price(ts("2024-03-04 09:00"), ts("2024-03-04 09:00")), 0.0)
+        self.assertEqual(self.tariff.price(ts("2024-03-04 09:00"), ts("2024-03-04 08:00")), 0.0)
+
+    def test_daily_cap(self):
+        self.assertEqual(self.tariff.price(ts("2024-03-04 10:00"), ts("2024-03-04 20:00")), 20.0) # 34 without the cap
+        # Friday 17:00 to Monday 9:00 : 10 + 20 + 20 + 12
+        self.assertEqual(self.tariff.price(ts("2024-03-01 17:00"), ts("2024-03-04 09:00")), 62.0)
+        # Three full weeks : 5 weekdays and 2 weekend days at 20 each
+        self.assertEqual(self.tariff.price(ts("2024-03-04 00:00"), ts("2024-03-25 00:00")), 420.0)
+        self.assertEqual(self.tariff.price(ts("2024-03-04 00:00"), ts("2024-03-26 01:00")), 441.0)
+
+    def test_free_time_and_utc_offset(self):
+        tariff = Tariff("daytime", [(WEEKDAYS, 480, 1080, 3.0)], utc_offset=60)
+        self.assertEqual(tariff.price(ts("2024-03-04 05:00"), ts("2024-03-04 07:00")), 0.0) # 6:00 to 8:00 local time
+        self.assertEqual(tariff.price(ts("2024-03-04 07:00"), ts("2024-03-04 08:00")), 3.0)
+        self.assertEqual(tariff.price(ts("2024-03-02 07:00"), ts("2024-03-02 08:00")), 0.0) # Saturday
+        self.assertEqual(Tariff("empty", []).price(ts("2024-03-04 00:00"), ts("2024-03-11 00:00")), 0.0)
+
+    def test_invalid_bands(self):
+        with self.assertRaises(ValueError):
+            Tariff("overlap", [(WEEKDAYS, 0, 600, 1.0), (1, 540, 700, 2.0)])
+        with self.assertRaises(ValueError):
+            Tariff("too long", [(WEEKEND, 0, 1500, 1.0)])
+        Tariff("disjoint days", [(WEEKDAYS, 0, 600, 1.0), (WEEKEND, 540, 700, 2.0)])
+
+    def sessions(self, count=2000):
+        rng = random.Random(0)
+        entries = [ts("2024-01-01 00:00") + rng.randrange(0, 60 * 24 * 3600) for _ in range(count)]
+        return entries, [entry + rng.choice((rng.randrange(0, 4 * 3600), rng.randrange(0, 40 * 24 * 3600))) for entry in entries]
+
+    def brute_force(self, entry, exit):
+        """Minute by minute, each calendar day capped on its own"""
+        days = {}
+        for minute in range(entry // 60, exit // 60):
+            day, minute_of_day = divmod(minute, 24 * 60)
+            weekday = (day + 3) % 7
+            for days_mask, start, end, rate in BANDS:
+                if days_mask >> weekday & 1 and start <= minute_of_day < end:
+                    days[day] = days.get(day, 0.0) + rate / 60
+        return round(sum(min(total, 20) for total in days.values()), 2)
+
+    def test_against_brute_force(self):
+        entries, exits = self.sessions(300)
+        for entry, exit in zip(entries, exits):
+            entry, exit = entry // 60 * 60, exit // 60 * 60
+            self.assertAlmostEqual(self.tariff.price(entry, exit), self.brute_force(entry, exit), places=6)
+
+    def test_price_many(self):
+        entries, exits = self.sessions()
+        self.assertEqual(self.tariff.price_many(entries, exits, use_numpy=False), [self.tariff.price(*session) for session in zip(entries, exits)])
+        self.assertEqual(self.tariff.price_many([], [], use_numpy=False), [])
+
+    @unittest.skipIf(tariffs.numpy is None, "NumPy is not installed")
+    def test_price_many_numpy(self):
+        entries, exits = self.sessions()
+        self.assertEqual(self.tariff.price_many(entries, exits, use_numpy=True), self.tariff.price_many(entries, exits, use_numpy=False))
+
+class TestTariffDatabase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def backdate_entries(self, hours):
+        with self.db.connect() as conn:
+            conn.execute("UPDATE ParkingUsage SET entry_time = DATETIME(current_timestamp, ?) WHERE exit_time IS NULL", (f"-{hours} hours",))
+
+    def test_default_tariffs(self):
+        self.assertEqual([(name, cap) for name, cap, offset, bands in self.db.fetch_tariffs()], [("premium", None), ("standard", None)])
+        self.assertEqual(self.db.tariffs.get("standard").price(0, 3600), 3.0)
+        self.assertEqual(self.db.tariffs.get("premium").price(0, 3600), 2.0)
+        with self.assertRaises(KeyError):
+            self.db.tariffs.get("night")
+
+    def test_set_tariff(self):
+        self.db.tariffs.CHECK_INTERVAL = 0 # Checks the data version on every lookup
+        self.db.tariffs.get("standard")
+        self.db.set_tariff("standard", BANDS, daily_cap=20)
+        self.assertEqual(self.db.tariffs.get("standard").price(ts("2024-03-01 17:00"), ts("2024-03-04 09:00")), 62.0)
+        with self.assertRaises(ValueError):
+            self.db.set_tariff("standard", [(WEEKDAYS, 0, 600, 1.0), (WEEKDAYS, 500, 700, 2.0)])
+        self.assertEqual(self.db.tariffs.get("standard").daily_cap, 20.0) # Left unchanged
+        # Changed by another process : noticed once the counter is checked again
+        with self.db.connect() as conn:
+            conn.execute("UPDATE TariffBands SET hourly_rate = 2.5 WHERE tariff = 'premium'")
+        self.assertEqual(self.db.tariffs.get("premium").price(0, 3600), 2.5)
+
+    def test_missing_version_counter(self):
+        self.db.tariffs.CHECK_INTERVAL = 0 # Checks the data version on every lookup
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM DataVersions WHERE name = 'Tariffs'")
+        self.assertEqual(self.db.tariffs.get("standard").price(0, 3600), 3.0)
+        with self.db.connect() as conn:
+            conn.execute("UPDATE TariffBands SET hourly_rate = 4.0 WHERE tariff = 'standard'") # Bumps no counter
+        self.assertEqual(self.db.tariffs.get("standard").price(0, 3600), 4.0)
+
+    def test_exit_payments(self):
+        with self.db.transaction():
+            for n in range(1, 4):
+                self.db.create_parking_spot(1, 1, n)
+        self.db.add_premium_subscription("PRE-002")
+        self.db.set_tariff("standard", [(WEEKDAYS | WEEKEND, 0, 1440, 5.0)], daily_cap=12)
+        pc = ParkingController(db=self.db)
+        pc.new_entries_bulk([(1, 1, 1, "ABC-001"), (1, 1, 2, "PRE-002"), (1, 1, 3, "ABC-003")])
+        self.backdate_entries(3)
+        fee = pc.calculate_fee(1)
+        self.assertTrue(12.0 <= fee <= 15.01) # 15 capped to 12, unless the session spans midnight
+        pc.new_exit(1, 1, 1, "ABC-001")
+        pc.new_exits_bulk([(1, 1, 2, "PRE-002"), (1, 1, 3, "ABC-003"), (1, 1, 3, "ABC-003")])
+        amounts = {payment[1]: payment[2] for payment in self.db.fetch_all_payments()}
+        self.assertEqual(sorted(amounts), ["ABC-001", "ABC-003", "PRE-002"])
+        self.assertAlmostEqual(amounts["PRE-002"], 6.0, delta=0.01)
+        self.assertAlmostEqual(amounts["ABC-001"], fee, delta=0.01)
+        self.assertEqual(pc.calculate_fee(1), 0.0) # No open session
+
+    def check_exit_errors(self, pc):
+        with self.db.transaction():
+            for n in range(1, 3):
+                self.db.create_parking_spot(1, 1, n)
+        pc.fetch_parking_data()
+        pc.new_entry(1, 1, 1, "ABC-001")
+        pc.new_entry(1, 1, 2, "ABC-002")
+        pc.flush_writes()
+        with self.db.connect() as conn:
+            conn.execute("UPDATE ParkingUsage SET exit_time = current_timestamp WHERE spot_id = 1") # Closed behind the lot's back
+        self.assertEqual(pc.new_exit(1, 1, 1, "ABC-001"), "[Error] The exit couldn't be recorded : No open session of spot 1 in the database")
+        self.assertEqual(pc.parking_lot.floors[1].rows[1].spots[1].status, "occupied")
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM TariffBands WHERE tariff = 'standard'")
+            conn.execute("DELETE FROM Tariffs WHERE name = 'standard'")
+        self.assertEqual(pc.new_exit(1, 1, 2, "ABC-002"), "[Error] The exit couldn't be recorded : No tariff named 'standard'")
+        self.assertEqual(pc.parking_lot.floors[1].rows[1].spots[2].status, "occupied")
+        self.assertEqual(self.db.fetch_all_payments(), [])
+
+    def test_exit_errors(self):
+        self.db.tariffs.CHECK_INTERVAL = 0 # Checks the data version on every lookup
+        self.check_exit_errors(ParkingController(db=self.db, snapshot=False, board=False))
+
+    def test_exit_errors_with_write_queue(self):
+        self.db.tariffs.CHECK_INTERVAL = 0
+        write_queue = WriteQueue(self.db)
+        try:
+            self.check_exit_errors(ParkingController(db=self.db, write_queue=write_queue, snapshot=False, board=False))
+        finally:
+            write_queue.close()
+
+    def test_bulk_exit_errors(self):
+        self.db.tariffs.CHECK_INTERVAL = 0
+        self.db.add_premium_subscription("PRE-003")
+        with self.db.transaction():
+            for n in range(1, 4):
+                self.db.create_parking_spot(1, 1, n)
+        pc = ParkingController(db=self.db, snapshot=False, board=False)
+        pc.new_entries_bulk([(1, 1, 1, "ABC-001"), (1, 1, 2, "ABC-002"), (1, 1, 3, "PRE-003")])
+        with self.db.connect() as conn:
+            conn.execute("UPDATE ParkingUsage SET exit_time = current_timestamp WHERE spot_id = 1")
+        results = pc.new_exits_bulk([(1, 1, 1, "ABC-001"), (1, 1, 3, "PRE-003")])
+        self.assertEqual(results[0], "[Error] The exit couldn't be recorded : No open session of spot 1 in the database")
+        self.assertTrue(results[1].startswith("[NEW EXIT]"))
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM TariffBands WHERE tariff = 'standard'")
+            conn.execute("DELETE FROM Tariffs WHERE name = 'standard'")
+        self.assertEqual(pc.new_exits_bulk([(1, 1, 2, "ABC-002")]), ["[Error] The exit couldn't be recorded : No tariff named 'standard'"])
+        spots = pc.parking_lot.floors[1].rows[1].spots
+        self.assertEqual([spots[n].status for n in (1, 2, 3)], ["occupied", "occupied", "free"]) # Only the failed exits stay
+        self.assertEqual([plate for _, plate, _ in self.db.fetch_all_payments()], ["PRE-003"])
+
+    def test_audit_payments(self):
+        self.db.create_parking_spot(1, 1, 1)
+        pc = ParkingController(db=self.db)
+        for plate in ("ABC-001", "ABC-002"):
+            pc.new_entry(1, 1, 1, plate)
+            self.backdate_entries(2)
+            pc.new_exit(1, 1, 1, plate)
+        payments = PaymentsController(None, db=self.db)
+        period = ("2000-01-01", "2100-01-01")
+        self.assertEqual(payments.audit_payments(*period), [])
+        with self.db.connect() as conn:
+            conn.execute("UPDATE Payments SET amount = 1.0 WHERE registration_plate = 'ABC-002'")
+        usage_id, plate, paid, expected = payments.audit_payments(*period, chunk_size=1)[0]
+        self.assertEqual((plate, paid), ("ABC-002", 1.0))
+        self.assertAlmostEqual(expected, 6.0, delta=0.01)
+        self.assertEqual(payments.audit_payments("2000-01-01", "2000-01-02"), [])
+
+if __name__ == "__main__":
+    unittest.main()
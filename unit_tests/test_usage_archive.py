@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from src.controllers import AnalyticsController, DatabaseController
+from src.controllers.connection_manager import ConnectionManager
+
+class TestUsageArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        for spot_number in (1, 2, 3):
+            self.db.create_parking_spot(0, 1, spot_number)
+        # Two closed sessions every 20 days over 300 days, each paid on exit, plus an open one
+        with self.db.connect() as conn:
+            for days in range(300, 0, -20):
+                for spot_id in (1, 2):
+                    cursor = conn.execute("""INSERT INTO ParkingUsage (spot_id, registration_plate, entry_time, exit_time)
+                                             VALUES (?, ?, DATETIME('now', ?), DATETIME('now', ?))""",
+                                          (spot_id, f"OLD-{spot_id}", f"-{days} days", f"-{days} days", ))
+                    conn.execute("""UPDATE ParkingUsage SET exit_time = DATETIME(exit_time, '+2 hours') WHERE id = ?""", (cursor.lastrowid,))
+                    conn.execute("""INSERT INTO Payments (usage_id, registration_plate, amount, paid_at)
+                                    SELECT id, registration_plate, 10.0, exit_time FROM ParkingUsage WHERE id = ?""", (cursor.lastrowid,))
+        self.db.new_entry_visitor(3, "NEW-3")
+        self.analytics = AnalyticsController(None, db=self.db)
+
+    def tearDown(self):
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def count_live(self, table):
+        with self.db.connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def reads(self):
+        """Results of every read going through the archives, in a comparable order"""
+        start, end = self.analytics.to_timestamp("2000-01-01"), self.analytics.to_timestamp("2100-01-01")
+        return {
+            "usages": self.db.fetch_all_usages(),
+            "pages": [self.db.fetch_usages_page(after_id, 3) for after_id in range(0, 35, 3)],
+            "payments": self.db.fetch_all_payments(),
+            "payment_pages": [self.db.fetch_payments_page(after_id, 4) for after_id in range(0, 35, 4)],
+            "sessions": sorted(self.db.iter_sessions_between(start, end), key=repr),
+            "usage_rows": sorted(row for chunk in self.db.iter_usage_chunks(start, end, 5) for row in chunk),
+            "payment_rows": sorted(row for chunk in self.db.iter_payment_chunks(start, end, 5) for row in chunk),
+            "by_date": self.db.fetch_payments_by_date("2000-01-01", "2100-01-01"),
+            "by_plate": self.db.fetch_payments_by_registration_plate("OLD-1"),
+            "revenue": self.db.fetch_revenue_totals(),
+        }
+
+    def test_archive(self):
+        before = self.reads()
+        moved = self.db.archive.archive(max_age_days=90)
+        self.assertEqual(sum(moved.values()), 22) # Exits from 300 to 100 days ago
+        self.assertEqual(self.count_live("ParkingUsage"), 31 - 22)
+        self.assertEqual(self.count_live("Payments"), 30 - 22)
+        partitions = self.db.archive.fetch_partitions()
+        self.assertEqual([p[0] for p in partitions], sorted(moved))
+        self.assertEqual(sum(p[1] for p in partitions), 22)
+        self.assertTrue(all(os.path.exists(self.db.archive.path(p[0])) for p in partitions))
+        self.assertEqual(self.reads(), before)
+        self.assertEqual(self.db.archive.archive(max_age_days=90), {}) # Nothing left to move
+        self.assertEqual(self.reads(), before)
+
+    def test_period_reads_only_attach_the_overlapping_archives(self):
+        self.db.archive.archive(max_age_days=90)
+        start = self.analytics.to_timestamp("2000-01-01")
+        with self.db.connect() as conn:
+            conn.execute("INSERT INTO ArchivePartitions (month, usages) VALUES ('1999-01', 1)") # No file : attaching it would fail
+        rows = [row for chunk in self.db.iter_usage_chunks(start, start + 10 ** 10) for row in chunk]
+        self.assertEqual(len(rows), 31)
+
+    def test_many_archives(self):
+        with self.db.connect() as conn:
+            conn.execute("UPDATE ParkingUsage SET entry_time = DATETIME(entry_time, '-' || (id * 40) || ' days'), exit_time = DATETIME(exit_time, '-' || (id * 40) || ' days') WHERE exit_time IS NOT NULL")
+            conn.execute("UPDATE Payments SET paid_at = (SELECT exit_time FROM ParkingUsage WHERE id = usage_id)")
+        before = self.reads()
+        self.db.archive.archive(max_age_days=90)
+        self.assertGreater(len(self.db.archive.fetch_partitions()), 10) # More than SQLite attaches at once
+        self.assertEqual(self.reads(), before)
+
+    def test_crash_between_copy_and_delete(self):
+        before = self.reads()
+        del before["revenue"] # Inserting the payments again below counts them twice in the rollup
+        self.db.archive.archive(max_age_days=90)
+        month = self.db.archive.fetch_partitions()[0][0]
+        with self.db.connect() as conn: # Rows copied to the archive, the live ones not deleted yet
+            conn.execute("ATTACH DATABASE ? AS crashed", (self.db.archive.path(month),))
+            conn.commit()
+            conn.execute("INSERT INTO main.ParkingUsage SELECT * FROM crashed.ParkingUsage")
+            conn.execute("INSERT INTO main.Payments SELECT * FROM crashed.Payments")
+            conn.execute("UPDATE ArchivePartitions SET pending = 1 WHERE month = ?", (month,))
+            conn.commit()
+            conn.execute("DETACH DATABASE crashed")
+        self.assertEqual({k: v for k, v in self.reads().items() if k != "revenue"}, before)
+        self.assertEqual(list(self.db.archive.archive(max_age_days=90)), [month])
+        self.assertEqual(self.count_live("ParkingUsage"), 9)
+        self.assertEqual({k: v for k, v in self.reads().items() if k != "revenue"}, before)
+
+    def test_late_payment_stays_live(self):
+        with self.db.connect() as conn:
+            conn.execute("DELETE FROM Payments WHERE usage_id = 1")
+        self.db.archive.archive(max_age_days=90)
+        self.db.new_payment(1, "OLD-1", 5.0) # Paid once the session was archived
+        self.db.archive.archive(max_age_days=90)
+        self.assertEqual(self.count_live("Payments"), 30 - 22 + 1) # Its session isn't live anymore, it stays there
+        self.assertEqual([p[2] for p in self.db.fetch_payments_by_registration_plate("OLD-1")].count(5.0), 1)
+        self.assertEqual(self.db.fetch_payments_page(0, 1), [(1, "OLD-1", 5.0)])
+
+    def test_ids_are_never_reused(self):
+        with self.db.connect() as conn:
+            conn.execute("UPDATE ParkingUsage SET exit_time = DATETIME('now', '-200 days') WHERE exit_time IS NULL")
+        last_id = self.db.fetch_all_usages()[-1][0]
+        self.db.archive.archive(max_age_days=90)
+        self.assertEqual(self.count_live("ParkingUsage"), 8 + 1) # The last session stays, although it is old enough
+        self.db.new_entry_visitor(3, "NEW-4")
+        self.assertEqual(self.db.fetch_all_usages()[-1][0], last_id + 1)
+
+if __name__ == "__main__":
+    unittest.main()
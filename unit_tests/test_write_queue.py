@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from src.controllers import DatabaseController, ParkingController
+from src.controllers.connection_manager import ConnectionManager
+from src.controllers.write_queue import WriteQueue
+
+class TestWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseController(os.path.join(self.tmp.name, "parking_lot.db"))
+        self.db.init_database()
+        self.errors = []
+        self.queue = WriteQueue(self.db, on_error=self.errors.append)
+
+    def tearDown(self):
+        self.queue.close()
+        ConnectionManager.close_all_managers()
+        self.tmp.cleanup()
+
+    def test_result(self):
+        future = self.queue.submit(self.db.create_parking_spot, 1, 2, 3)
+        id = future.result(timeout=5)[0]
+        self.assertEqual(self.db.fetch_all_parking_spots(), [(id, 3, 2, 1)])
+
+    def test_group_commit_in_order(self):
+        release = threading.Event()
+        self.queue.submit(release.wait) # Holds the writer so the next writes pile up
+        futures = [self.queue.submit(self.db.create_parking_spot, 1, 1, n) for n in range(1, 51)]
+        release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        ids = [future.result()[0] for future in futures]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(self.db.fetch_all_parking_spots()), 50)
+
+    def test_failing_write_is_isolated(self):
+        release = threading.Event()
+        self.queue.submit(release.wait)
+        first = self.queue.submit(self.db.create_parking_spot, 1, 1, 1)
+        duplicate = self.queue.submit(self.db.create_parking_spot, 1, 1, 1) # Violates the unique position index
+        last = self.queue.submit(self.db.create_parking_spot, 1, 1, 2)
+        release.set()
+        self.assertTrue(self.queue.flush(timeout=5))
+        self.assertIsNotNone(first.result())
+        self.assertIsInstance(duplicate.exception(), sqlite3.IntegrityError)
+        self.assertIsNotNone(last.result())
+        self.assertEqual(len(self.errors), 1)
+        self.assertEqual(len(self.db.fetch_all_parking_spots()), 2)
+
+    def test_close_flushes(self):
+        for n in range(1, 11):
+            self.queue.submit(self.db.create_parking_spot, 1, 1, n)
+        self.assertTrue(self.queue.close(timeout=5))
+        self.assertEqual(len(self.db.fetch_all_parking_spots()), 10)
+        with self.assertRaises(RuntimeError):
+            self.queue.submit(self.db.create_parking_spot, 1, 1, 11)
+
+    def test_parking_controller(self):
+        pc = ParkingController(db=self.db, write_queue=self.queue)
+        pc.create_new_spot(1, 1, 1)
+        pc.new_entry(1, 1, 1, "ABC-123")
+        self.assertEqual(pc.parking_lot.floors[1].rows[1].spots[1].status, "occupied")
+        pc.new_exit(1, 1, 1, "ABC-123")
+        self.assertEqual(pc.parking_lot.floors[1].rows[1].spots[1].status, "free")
+        pc.new_entry(1, 1, 1, "DEF-456")
+        self.assertEqual(str(ParkingController(db=self.db, write_queue=self.queue).parking_lot.floors[1].rows[1].spots[1].linked_car), "DEF-456 (standard)")
+        self.assertEqual([plate for _, plate, _ in self.db.fetch_all_payments()], ["ABC-123"])
+        self.assertEqual(self.errors, [])
+
+if __name__ == "__main__":
+    unittest.main()